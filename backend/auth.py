@@ -1,9 +1,10 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import hashlib
+import hmac
 import os
 from dotenv import load_dotenv
 
@@ -16,6 +17,8 @@ load_dotenv()
 SECRET_KEY = os.getenv("JWT_SECRET", "your-super-secret-jwt-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRES_IN", 86400)) // 60  # Convert seconds to minutes
+# Operator credential for worker internals (profiling); admin endpoints that need it are closed when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
 # Password hashing using hashlib (simpler approach)
 def _hash_password_simple(password: str, salt: str = "shelfmind_salt") -> str:
@@ -163,6 +166,18 @@ async def get_current_manager(current_user: dict = Depends(require_role("manager
     """Get current manager user."""
     return current_user
 
+async def get_current_admin(
+    current_user: dict = Depends(get_current_manager),
+    x_admin_token: Optional[str] = Header(None)
+) -> dict:
+    """Get current manager who also presents the operator ADMIN_TOKEN in X-Admin-Token."""
+    if not ADMIN_TOKEN or not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
+    return current_user
+
 async def get_current_associate(current_user: dict = Depends(require_role("associate"))) -> dict:
     """Get current associate user."""
     return current_user
\ No newline at end of file
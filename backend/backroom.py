@@ -0,0 +1,225 @@
+"""
+Backroom inventory for ShelfMind.
+
+Backroom counts live in the backroom_stock collection, one document per
+store, location (bay and level) and SKU. Each store's counts are also held in
+an in-memory SKU -> {location: quantity} index. The index is loaded with one
+query on first use and then updated from the result of every receive and
+pick, so restock-vs-transfer decisions for a whole batch of tasks need no
+per-task query. Loads, receives, picks and bulk loads of a store take the
+store's lock, so a change made while the index loads is not lost.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReplaceOne, ReturnDocument
+
+from change_feed import change_feed
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+BACKROOM_COLLECTION = "backroom_stock"
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def location_code(bay: str, level: str) -> str:
+    """Location code printed on backroom labels, e.g. BR-A3-T1."""
+    return f"BR-{bay}-{level}"
+
+
+class BackroomIndex:
+    """SKU -> {location: quantity} for one store; only positive quantities are kept."""
+
+    def __init__(self, docs: Iterable[dict] = ()):
+        self.locations: Dict[str, Dict[str, int]] = {}
+        for doc in docs:
+            self.set(doc["sku"], doc["location"], doc["quantity"])
+
+    def set(self, sku: str, location: str, quantity: int) -> None:
+        if quantity > 0:
+            self.locations.setdefault(sku, {})[location] = quantity
+            return
+        sku_locations = self.locations.get(sku)
+        if sku_locations is not None:
+            sku_locations.pop(location, None)
+            if not sku_locations:
+                del self.locations[sku]
+
+    def available(self, sku: str) -> int:
+        return sum(self.locations.get(sku, {}).values())
+
+    def best_location(self, sku: str, units: int) -> Optional[str]:
+        """Location to pick from: the smallest one holding `units`, else the fullest one."""
+        sku_locations = self.locations.get(sku)
+        if not sku_locations:
+            return None
+        enough = [(quantity, location) for location, quantity in sku_locations.items() if quantity >= units]
+        if enough:
+            return min(enough)[1]
+        return max(sku_locations.items(), key=lambda item: item[1])[0]
+
+    def plan(self, sku: str, units: int) -> dict:
+        """Restock from the backroom when it holds any stock of the SKU, otherwise transfer."""
+        available = self.available(sku)
+        location = self.best_location(sku, units)
+        return {
+            "sku": sku,
+            "units_needed": units,
+            "type": "restock" if location else "transfer",
+            "backroom_location": location,
+            "backroom_available": available,
+            "short_by": max(units - available, 0),
+        }
+
+
+class BackroomInventory:
+    """Per-store backroom indexes, kept in step with the collection."""
+
+    def __init__(self):
+        self._indexes: Dict[str, BackroomIndex] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._invalidations: Dict[str, int] = {}  # per store, so a load that raced one is not cached
+
+    def _lock(self, store_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(store_id, asyncio.Lock())
+
+    def invalidate(self, store_id: Optional[str] = None) -> None:
+        if store_id is None:
+            self._indexes.clear()
+            for key in self._invalidations:
+                self._invalidations[key] += 1
+        else:
+            self._indexes.pop(store_id, None)
+            self._invalidations[store_id] = self._invalidations.get(store_id, 0) + 1
+
+    async def index(self, store_id: str) -> BackroomIndex:
+        """The store's index, loaded with a single query on first use."""
+        index = self._indexes.get(store_id)
+        if index is not None:
+            return index
+        async with self._lock(store_id):
+            index = self._indexes.get(store_id)
+            if index is None:
+                invalidations = self._invalidations.get(store_id, 0)
+                db = await get_database(store_id)
+                cursor = db[BACKROOM_COLLECTION].find(
+                    {"store_id": store_id, "quantity": {"$gt": 0}}, {"sku": 1, "location": 1, "quantity": 1}
+                )
+                index = BackroomIndex([doc async for doc in cursor])
+                if self._invalidations.get(store_id, 0) == invalidations:
+                    self._indexes[store_id] = index
+            return index
+
+    def _apply(self, store_id: str, doc: dict) -> None:
+        index = self._indexes.get(store_id)
+        if index is not None:
+            index.set(doc["sku"], doc["location"], doc["quantity"])
+
+    async def receive(self, store_id: str, sku: str, bay: str, level: str, quantity: int) -> dict:
+        """Record units put away at a backroom location."""
+        db = await get_database(store_id)
+        location = location_code(bay, level)
+        async with self._lock(store_id):
+            doc = await db[BACKROOM_COLLECTION].find_one_and_update(
+                {"store_id": store_id, "location": location, "sku": sku},
+                {"$inc": {"quantity": quantity}, "$set": {"bay": bay, "level": level, "updated_at": datetime.utcnow()}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self._apply(store_id, doc)
+        await change_feed.publish("backroom", store_id)
+        return doc
+
+    async def pick(self, store_id: str, sku: str, quantity: int, location: Optional[str] = None) -> dict:
+        """Record units taken from a backroom location (the best one when not given)."""
+        if location is None:
+            location = (await self.index(store_id)).best_location(sku, quantity)
+            if location is None:
+                raise InsufficientStock(f"No backroom stock of {sku}")
+        db = await get_database(store_id)
+        async with self._lock(store_id):
+            doc = await db[BACKROOM_COLLECTION].find_one_and_update(
+                {"store_id": store_id, "location": location, "sku": sku, "quantity": {"$gte": quantity}},
+                {"$inc": {"quantity": -quantity}, "$set": {"updated_at": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                raise InsufficientStock(f"Fewer than {quantity} units of {sku} at {location}")
+            self._apply(store_id, doc)
+        await change_feed.publish("backroom", store_id)
+        return doc
+
+    async def bulk_load(self, store_id: str, counts: List[dict]) -> BackroomIndex:
+        """Replace a store's whole backroom with a full count.
+
+        Counted locations are upserted first and only then are the ones missing from the count deleted,
+        so the backroom is never seen empty, and a failure part way leaves the old counts of what was not
+        yet written rather than nothing. Only records last changed before the load started are deleted: a
+        receive or pick that another worker writes during the load is kept, and its invalidation stops this
+        worker from caching an index built from the count alone.
+        """
+        now = datetime.utcnow()
+        load_id = uuid.uuid4().hex
+        docs = {}
+        for count in counts:
+            location = location_code(count["bay"], count["level"])
+            key = (location, count["sku"])
+            if key in docs:
+                docs[key]["quantity"] += count["quantity"]
+                continue
+            docs[key] = {
+                "store_id": store_id,
+                "location": location,
+                "bay": count["bay"],
+                "level": count["level"],
+                "sku": count["sku"],
+                "quantity": count["quantity"],
+                "load_id": load_id,
+                "updated_at": now,
+            }
+        db = await get_database(store_id)
+        async with self._lock(store_id):
+            invalidations = self._invalidations.get(store_id, 0)
+            if docs:
+                await db[BACKROOM_COLLECTION].bulk_write([
+                    ReplaceOne({"store_id": store_id, "location": location, "sku": sku}, doc, upsert=True)
+                    for (location, sku), doc in docs.items()
+                ], ordered=False)
+            await db[BACKROOM_COLLECTION].delete_many(
+                {"store_id": store_id, "load_id": {"$ne": load_id}, "updated_at": {"$lt": now}}
+            )
+            index = BackroomIndex(docs.values())
+            if self._invalidations.get(store_id, 0) == invalidations:
+                self._indexes[store_id] = index
+            else:
+                self._indexes.pop(store_id, None)
+        await change_feed.publish("backroom", store_id)
+        logger.info("Loaded %d backroom counts for store %s", len(docs), store_id)
+        return index
+
+    async def plan(self, store_id: str, needs: List[dict]) -> List[dict]:
+        """Restock-or-transfer decision for each {sku, units_needed}, from the in-memory index."""
+        index = await self.index(store_id)
+        return [index.plan(need["sku"], need["units_needed"]) for need in needs]
+
+    async def locations(self, store_id: str, sku: str) -> Dict[str, int]:
+        index = await self.index(store_id)
+        return dict(index.locations.get(sku, {}))
+
+
+# Process-wide backroom inventory
+backroom_inventory = BackroomInventory()
+change_feed.subscribe("backroom", backroom_inventory.invalidate)
+
+
+async def create_backroom_indexes(db) -> None:
+    await db[BACKROOM_COLLECTION].create_index([("store_id", 1), ("location", 1), ("sku", 1)], unique=True)
+    await db[BACKROOM_COLLECTION].create_index([("store_id", 1), ("sku", 1)])
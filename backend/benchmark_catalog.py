@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the in-memory product catalog.
+Builds a 200k-SKU catalog and reports memory per SKU plus lookup and
+typeahead search latency.
+"""
+
+import random
+import time
+import tracemalloc
+
+from catalog import CatalogSnapshot
+
+# Configuration
+SKU_COUNT = 200_000
+QUERIES = 2_000
+
+CATEGORIES = ["Beverages", "Dairy", "Bakery", "Produce", "Snacks", "Frozen", "Cleaning", "Canned Goods", "Cereal"]
+WORDS = ["organic", "premium", "whole", "fresh", "classic", "coffee", "milk", "bread", "apple", "chocolate",
+         "juice", "yogurt", "cheese", "pasta", "tomato", "banana", "cereal", "soap", "pizza", "chips",
+         "vanilla", "roasted", "sparkling", "greek", "wheat", "family", "value", "light", "spicy", "honey"]
+
+def generate_records(rng):
+    for i in range(SKU_COUNT):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        name = " ".join(rng.choice(WORDS) for _ in range(3)) + f" {rng.randint(100, 999)}g"
+        yield {
+            "sku": f"{category[:3].upper()}-{i:06d}",
+            "name": name.title(),
+            "category": category,
+            "unit_price": f"{rng.uniform(1, 30):.2f}",
+            "image_url": ""
+        }
+
+def percentile(timings, fraction):
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+def time_queries(label, fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    print(f"{label:<24} p50 {percentile(timings, 0.5):8.1f} us   p99 {percentile(timings, 0.99):8.1f} us")
+
+def main():
+    start = time.perf_counter()
+    CatalogSnapshot(generate_records(random.Random(7)))
+    build_seconds = time.perf_counter() - start
+
+    # Records are generated inside the traced block so name strings count towards the catalog
+    rng = random.Random(7)
+    tracemalloc.start()
+    snapshot = CatalogSnapshot(generate_records(rng))
+    catalog_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("ShelfMind Product Catalog Benchmark")
+    print("=" * 50)
+    print(f"SKUs: {len(snapshot):,}")
+    print(f"Build time: {build_seconds:.2f} s")
+    print(f"Memory: {catalog_bytes / 1024 / 1024:.1f} MiB ({catalog_bytes / len(snapshot):.0f} bytes/SKU)")
+    print("-" * 50)
+
+    skus = [rng.choice(snapshot.skus) for _ in range(QUERIES)]
+    time_queries("SKU lookup", snapshot.get, skus)
+    time_queries("SKU prefix search", lambda q: snapshot.search(q, 10), [sku[:6] for sku in skus])
+    time_queries("Name prefix (1 word)", lambda q: snapshot.search(q, 10),
+                 [rng.choice(WORDS)[:rng.randint(1, 4)] for _ in range(QUERIES)])
+    time_queries("Name prefix (2 words)", lambda q: snapshot.search(q, 10),
+                 [f"{rng.choice(WORDS)} {rng.choice(WORDS)[:3]}" for _ in range(QUERIES)])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the seasonal demand forecast on synthetic sales.
+
+Generates hourly sales for a store's SKUs with hour-of-day and weekday
+seasonality (each SKU peaks at its own hour, up to several times its
+overnight rate), with some hours missing as if no scan came in. Then:
+- fits every SKU with forecast.fit_demand (batched solves) and, as a baseline, one
+  ridge solve per SKU, and checks they agree;
+- reports the fit's peak memory above its inputs;
+- compares hourly forecast error on a held-out week against the flat
+  velocity (each SKU's mean rate);
+- compares time-to-empty error of the forecast and of the flat velocity,
+  from random shelf levels and times, against the true rates;
+- times a velocity lookup.
+
+Usage:
+    python benchmark_forecast.py --skus 2000 --days 28
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import forecast
+from forecast import COEFFICIENTS, DemandModel, features, fit_demand, local_hour, week_slot
+
+# Configuration
+HOLDOUT_DAYS = 7
+MISSING_FRACTION = 0.1
+LEVEL_SAMPLES = 2_000
+
+
+def true_rates(skus: int, rng) -> np.ndarray:
+    """Units per hour of every SKU for each of the 168 hours of the week, (S, 168)."""
+    hour = np.arange(168) % 24
+    weekday = np.arange(168) // 24
+    base = rng.gamma(2.0, 1.5, skus)[:, None]
+    peak = rng.integers(7, 21, skus)[:, None]
+    amplitude = rng.uniform(0.5, 2.0, skus)[:, None]
+    daily = 0.3 + amplitude * np.exp(-0.5 * ((hour - peak) / 2.5) ** 2)  # quiet nights, a peak per SKU
+    weekly = np.where(weekday >= 5, rng.uniform(1.0, 1.6, skus)[:, None], 1.0)  # busier weekends
+    return base * daily * weekly
+
+
+def per_sku_fit(first_hour: int, sold: np.ndarray, observed: np.ndarray, alpha: float) -> np.ndarray:
+    x = features(np.arange(first_hour, first_hour + sold.shape[0]))
+    out = np.zeros((sold.shape[1], COEFFICIENTS), dtype=np.float32)
+    for s in range(sold.shape[1]):
+        rows = observed[:, s]
+        y = sold[rows, s].astype(np.float64)
+        mean = y.mean() if len(y) else 0.0
+        xs = x[rows]
+        effects = np.linalg.solve(xs.T @ xs + alpha * np.eye(x.shape[1]), xs.T @ (y - mean))
+        out[s] = np.concatenate([[mean], effects])
+    return out
+
+
+def true_time_to_empty(rates: np.ndarray, start_slot: int, level: float, horizon: int) -> float:
+    sold = np.cumsum(rates[(start_slot + np.arange(horizon)) % 168])
+    hour = int(np.searchsorted(sold, level))
+    if hour >= horizon:
+        return float(horizon)
+    before = sold[hour - 1] if hour else 0.0
+    return hour + (level - before) / rates[(start_slot + hour) % 168]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark seasonal demand forecasting on synthetic sales")
+    parser.add_argument("--skus", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=forecast.FORECAST_HISTORY_DAYS)
+    parser.add_argument("--alpha", type=float, default=forecast.FORECAST_RIDGE_ALPHA)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    rates = true_rates(args.skus, rng)
+    start = datetime(2024, 1, 1)  # a Monday
+    first_hour = local_hour(start)
+    hours = args.days * 24
+    slots = week_slot(np.arange(first_hour, first_hour + hours + HOLDOUT_DAYS * 24))
+    sales = rng.poisson(rates[:, slots].T).astype(np.float32)  # (T, S)
+    sold, holdout = sales[:hours], sales[hours:]
+    observed = rng.random(sold.shape) >= MISSING_FRACTION
+
+    print("ShelfMind Demand Forecast Benchmark")
+    print("=" * 50)
+    print(f"{args.skus:,} SKUs, {args.days} days of hourly history, {MISSING_FRACTION:.0%} of hours missing")
+
+    started = time.perf_counter()
+    coefficients = fit_demand(first_hour, sold, observed, args.alpha)
+    batched = time.perf_counter() - started
+    started = time.perf_counter()
+    baseline = per_sku_fit(first_hour, sold, observed, args.alpha)
+    looped = time.perf_counter() - started
+    agree = np.allclose(coefficients, baseline, atol=1e-3)
+    tracemalloc.start()
+    fit_demand(first_hour, sold, observed, args.alpha)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"Fit, batched solves: {batched * 1000:,.0f} ms")
+    print(f"Fit, one SKU at a time: {looped * 1000:,.0f} ms ({looped / batched:.1f}x slower)")
+    print(f"Fit peak memory: {peak / 2**20:,.0f} MB ({forecast.FORECAST_BLOCK_SKUS:,} SKUs per solve)")
+
+    model = DemandModel([f"SKU{i:05d}" for i in range(args.skus)], coefficients, start + timedelta(days=args.days))
+    holdout_slots = slots[hours:]
+    seasonal = model.weekly[:, holdout_slots].T
+    flat = np.broadcast_to(coefficients[:, 0], seasonal.shape)
+    seasonal_mae = np.abs(seasonal - holdout).mean()
+    flat_mae = np.abs(flat - holdout).mean()
+    print(f"\nHeld-out week, mean absolute error per SKU-hour:")
+    print(f"  flat velocity: {flat_mae:.3f} units")
+    print(f"  seasonal:      {seasonal_mae:.3f} units ({(1 - seasonal_mae / flat_mae) * 100:.0f}% lower)")
+
+    horizon = forecast.FORECAST_HORIZON_HOURS
+    sample_skus = rng.integers(0, args.skus, LEVEL_SAMPLES)
+    offsets = rng.integers(0, HOLDOUT_DAYS * 24, LEVEL_SAMPLES)
+    levels = rng.integers(1, 40, LEVEL_SAMPLES)
+    seasonal_err, flat_err = [], []
+    for s, offset, level in zip(sample_skus, offsets, levels):
+        at = start + timedelta(days=args.days, hours=int(offset))
+        truth = true_time_to_empty(rates[s], int(week_slot(local_hour(at))), level, horizon)
+        mean = max(float(coefficients[s, 0]), 1e-9)
+        seasonal_err.append(abs(model.time_to_empty(f"SKU{s:05d}", level, at) - truth))
+        flat_err.append(abs(min(level / mean, horizon) - truth))
+    print(f"\nTime to empty, mean absolute error ({LEVEL_SAMPLES:,} shelves):")
+    print(f"  flat velocity: {np.mean(flat_err):.2f} h")
+    print(f"  seasonal:      {np.mean(seasonal_err):.2f} h")
+
+    at = start + timedelta(days=args.days, hours=18)
+    lookups = [f"SKU{i:05d}" for i in rng.integers(0, args.skus, 100_000)]
+    started = time.perf_counter()
+    for sku in lookups:
+        model.velocity(sku, at)
+    per_lookup = (time.perf_counter() - started) / len(lookups)
+    print(f"\nVelocity lookup: {per_lookup * 1e6:.2f} us")
+
+    if not agree:
+        print("[ERROR] Batched fit differs from the per-SKU fit")
+        sys.exit(1)
+    if seasonal_mae >= flat_mae or np.mean(seasonal_err) >= np.mean(flat_err):
+        print("[ERROR] Seasonal forecast is no better than the flat velocity")
+        sys.exit(1)
+    print("[SUCCESS] Seasonal forecast beats the flat velocity")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the Monte Carlo lost-sales engine.
+Simulates a full store and checks it finishes within the one-second budget.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from lost_sales import simulate_lost_sales, DEFAULT_SCENARIOS
+
+# Configuration
+SKU_COUNT = 30_000
+AISLES = 24
+AT_RISK_FRACTION = 0.08  # share of SKUs close enough to empty to be simulated
+BUDGET_SECONDS = 1.0
+
+def build_store(rng):
+    velocity = rng.gamma(2.0, 2.0, SKU_COUNT)
+    # Most SKUs are comfortably stocked; a slice is near empty
+    stock = velocity * rng.uniform(6.0, 40.0, SKU_COUNT)
+    near_empty = rng.random(SKU_COUNT) < AT_RISK_FRACTION
+    stock[near_empty] = np.floor(velocity[near_empty] * rng.uniform(0.0, 2.0, near_empty.sum()))
+    eta = np.where(rng.random(SKU_COUNT) < 0.5, rng.uniform(0.2, 3.0, SKU_COUNT), np.inf)
+    return {
+        "stock": np.floor(stock),
+        "velocity_mean": velocity,
+        "velocity_std": velocity * rng.uniform(0.1, 0.6, SKU_COUNT),
+        "restock_eta": eta,
+        "price": rng.uniform(1.0, 20.0, SKU_COUNT),
+        "aisle_codes": rng.integers(0, AISLES, SKU_COUNT),
+        "aisle_count": AISLES
+    }
+
+def main():
+    store = build_store(np.random.default_rng(3))
+    simulate_lost_sales(**store, scenarios=100, seed=1)  # warm up
+
+    start = time.perf_counter()
+    result = simulate_lost_sales(**store, scenarios=DEFAULT_SCENARIOS, seed=1)
+    elapsed = time.perf_counter() - start
+
+    low, high = np.percentile(result["store_totals"], (5, 95))
+    print("ShelfMind Lost Sales Simulation Benchmark")
+    print("=" * 50)
+    print(f"SKUs: {SKU_COUNT:,}, aisles: {AISLES}, scenarios: {DEFAULT_SCENARIOS:,}")
+    print(f"Simulated SKUs at risk: {(result['stockout_probability'] > 0).sum():,}")
+    print(f"Store expected loss: ${result['store_totals'].mean():,.0f} (90% band ${low:,.0f} - ${high:,.0f})")
+    print(f"Elapsed: {elapsed * 1000:.0f} ms (budget {BUDGET_SECONDS * 1000:.0f} ms)")
+
+    if elapsed > BUDGET_SECONDS:
+        print("[ERROR] Lost sales simulation exceeded its budget")
+        sys.exit(1)
+    print("[SUCCESS] Lost sales simulation within budget")
+
+if __name__ == "__main__":
+    main()
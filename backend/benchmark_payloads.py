@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark for task list payloads.
+Compares response bytes and server CPU per request for the full task list and
+the sparse fieldsets used by the associate and manager views, uncompressed,
+gzip and (when installed) Brotli.
+"""
+
+import json
+import random
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+import compression
+from models.task import TaskResponse
+from routers.tasks import parse_fields
+
+# Configuration
+TASK_COUNT = 300
+ROUNDS = 20
+
+VIEWS = {
+    "full": None,
+    "associate": "id,status,priority,type,estimated_time,backroom_location,"
+                 "product.name,product.aisle,product.shelf,product.current_stock,product.max_capacity,product.image_url",
+    "manager": "id,status,priority,assigned_to,urgency_score,updated_at,"
+               "product.sku,product.name,product.status,product.revenue_impact",
+}
+
+def build_tasks(rng):
+    tasks = []
+    for i in range(TASK_COUNT):
+        current, capacity = rng.randint(0, 10), rng.randint(20, 60)
+        tasks.append({
+            "id": f"task-{i:08x}",
+            "product_id": f"prod-{i}",
+            "store_id": "STORE001",
+            "status": rng.choice(["pending", "in_progress", "completed"]),
+            "type": rng.choice(["restock", "transfer"]),
+            "priority": rng.choice(["high", "medium", "low"]),
+            "assigned_to": f"associate-{rng.randint(1, 12):08x}",
+            "estimated_time": rng.randint(5, 32),
+            "urgency_score": rng.randint(20, 100),
+            "instructions": "Restock from backroom, rotate older stock to the front of the shelf.",
+            "backroom_location": f"BR-{rng.randint(1, 40)}-{rng.choice('ABCD')}",
+            "created_at": datetime(2024, 5, 1, 8, rng.randint(0, 59)),
+            "updated_at": datetime(2024, 5, 1, 9, rng.randint(0, 59)),
+            "version": i + 1,
+            "product": {
+                "id": f"prod-{i}",
+                "name": f"Organic Product Number {i} Family Size",
+                "sku": f"SKU-{i:06d}",
+                "current_stock": current,
+                "max_capacity": capacity,
+                "category": rng.choice(["Dairy", "Bakery", "Produce", "Beverages"]),
+                "aisle": f"A{rng.randint(1, 24)}",
+                "shelf": str(rng.randint(1, 6)),
+                "last_restocked": "2024-05-01T06:30:00Z",
+                "trend": "down",
+                "status": "critical" if current < 3 else "low",
+                "sales_velocity": round(rng.uniform(1, 15), 2),
+                "time_to_empty": round(rng.uniform(0, 4), 2),
+                "revenue_impact": round(rng.uniform(5, 120), 2),
+                "backroom_location": None,
+                "nearby_stores": [f"STORE{rng.randint(2, 99):03d}" for _ in range(4)],
+                "image_url": f"https://cdn.shelfmind.example/images/{i:064x}.jpg",
+            },
+        })
+    return tasks
+
+def project(doc, projection):
+    """Apply an inclusion projection the way MongoDB would."""
+    out = {}
+    for path in projection:
+        if path == "_id":
+            continue
+        head, _, rest = path.partition(".")
+        if head not in doc:
+            continue
+        if rest:
+            out.setdefault(head, {})[rest] = doc[head][rest]
+        else:
+            out[head] = doc[head]
+    return out
+
+def render(tasks, fields):
+    """Serialize a task list the way the endpoint does."""
+    projection = parse_fields(fields)
+    if projection is None:
+        body = jsonable_encoder([TaskResponse(**task) for task in tasks])
+    else:
+        body = jsonable_encoder([project(task, projection) for task in tasks])
+    return json.dumps(body, separators=(",", ":")).encode()
+
+def measure(tasks, fields, encoding):
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        payload = render(tasks, fields)
+        if encoding:
+            payload = compression._Compressor(encoding).finish(payload)
+    cpu_ms = (time.process_time() - start) / ROUNDS * 1000
+    return len(payload), cpu_ms
+
+def main():
+    tasks = build_tasks(random.Random(7))
+    encodings = [None, "gzip"] + (["br"] if compression.brotli is not None else [])
+
+    print("ShelfMind Task List Payload Benchmark")
+    print("=" * 50)
+    print(f"Tasks per list: {TASK_COUNT}, rounds: {ROUNDS}")
+    print(f"{'view':<10} {'encoding':<9} {'bytes':>10} {'cpu ms/request':>15}")
+    baseline = None
+    for view, fields in VIEWS.items():
+        for encoding in encodings:
+            size, cpu_ms = measure(tasks, fields, encoding)
+            baseline = baseline or size
+            print(f"{view:<10} {encoding or 'identity':<9} {size:>10,} {cpu_ms:>15.2f}"
+                  f"  ({size / baseline:.0%} of full)")
+    if compression.brotli is None:
+        print("Brotli not installed; only gzip was measured")
+
+if __name__ == "__main__":
+    main()
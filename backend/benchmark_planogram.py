@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark for planogram matching.
+Matches 1,000 detected boxes against a 5,000-slot aisle map and checks the
+batch stays under the 10 ms budget.
+"""
+
+import random
+import sys
+import time
+
+from planogram import PlanogramIndex
+
+# Configuration
+SHELVES = 10
+SLOTS_PER_SHELF = 500
+DETECTIONS = 1000
+BUDGET_MS = 10.0
+ROUNDS = 50
+
+def build_aisle():
+    """Build a 5,000-slot aisle: 10 shelves of 500 slots, 20 SKUs."""
+    slots = []
+    for shelf in range(SHELVES):
+        for slot in range(SLOTS_PER_SHELF):
+            slots.append({
+                "shelf": str(shelf + 1),
+                "slot": slot + 1,
+                "sku": f"SKU-{(shelf * SLOTS_PER_SHELF + slot) % 20:03d}",
+                "x": slot * 10.0,
+                "y": shelf * 50.0,
+                "width": 10.0,
+                "height": 45.0,
+                "facings": 2
+            })
+    return slots
+
+def build_detections(rng):
+    detections = []
+    for _ in range(DETECTIONS):
+        shelf = rng.randrange(SHELVES)
+        slot = rng.randrange(SLOTS_PER_SHELF)
+        detections.append({
+            "sku": f"SKU-{(shelf * SLOTS_PER_SHELF + slot) % 20:03d}",
+            "count": rng.randint(0, 2),
+            "position": {"x": slot * 10.0 + 1, "y": shelf * 50.0 + 5, "width": 8.0, "height": 30.0}
+        })
+    return detections
+
+def main():
+    rng = random.Random(42)
+    index = PlanogramIndex("A3", build_aisle())
+    detections = build_detections(rng)
+    index.match(detections)  # warm up
+
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = index.match(detections)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    median = timings[len(timings) // 2]
+
+    print("ShelfMind Planogram Matching Benchmark")
+    print("=" * 50)
+    print(f"Slots: {index.slot_count}, detections: {DETECTIONS}, matched: {result['matched']}")
+    print(f"Median: {median:.2f} ms, p95: {timings[int(len(timings) * 0.95)]:.2f} ms (budget {BUDGET_MS} ms)")
+
+    if median > BUDGET_MS:
+        print("[ERROR] Planogram matching exceeded its budget")
+        sys.exit(1)
+    print("[SUCCESS] Planogram matching within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Benchmark of read-preference routing on a local replica set.
+
+Runs the same mix twice against one store: associates moving tasks through
+the state machine (primary writes) while managers load dashboards
+(productivity replay, lost-sales inputs, stock history and regional
+partials). The first run reads everything from the primary, the second
+sends the dashboard reads to secondaries. Operation counters of every member
+show how much load moved off the primary. Every task update is followed by a
+read of its transitions, which must include it (read-your-writes through the
+causal session).
+
+Needs a replica set with secondaries, e.g. three mongod processes on one host:
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 --bind_ip localhost &
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 --bind_ip localhost &
+    mongod --replSet rs0 --port 27019 --dbpath /tmp/rs0-2 --bind_ip localhost &
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [{_id: 0, host: "localhost:27017"},
+        {_id: 1, host: "localhost:27018"}, {_id: 2, host: "localhost:27019"}]})'
+
+Usage:
+    python benchmark_read_routing.py --uri "mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0"
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import uri_parser
+
+import database
+from database import close_mongo_connection, connect_to_mongo, get_database
+from rollups import get_store_partial
+from task_state import TaskConflict, update_task
+from timeseries import create_stock_collections, get_history, get_store_levels, get_store_velocity_stats, stock_writer
+from transitions import get_task_transitions, replay_store, transition_log
+
+# Configuration
+STORE_ID = "BENCH001"
+TASKS = 400
+SKUS = 2_000
+HOURS = 24
+NEXT_STATUS = {"pending": "in_progress", "in_progress": "on_hold", "on_hold": "pending"}
+
+
+async def seed(db):
+    await create_stock_collections(db)
+
+    now = datetime.utcnow()
+    await db.tasks.insert_many([
+        {"id": f"task-{i:05d}", "store_id": STORE_ID, "status": "pending", "assigned_to": None, "version": 0,
+         "priority": "medium", "type": "restock", "product": {"sku": f"SKU{i % SKUS:05d}", "aisle": f"A{i % 24}"},
+         "created_at": now, "updated_at": now}
+        for i in range(TASKS)
+    ])
+    rng = np.random.default_rng(7)
+    for hour in range(HOURS, 0, -1):
+        ts = now - timedelta(hours=hour)
+        levels = rng.integers(0, 40, SKUS)
+        await stock_writer.add(STORE_ID, [
+            {"sku": f"SKU{i:05d}", "level": int(level), "timestamp": ts} for i, level in enumerate(levels)
+        ])
+        await stock_writer.flush()
+
+
+async def member_counters(uri: str) -> dict:
+    """Reads and commands served so far by every member, keyed by host, plus which one is primary."""
+    counters = {}
+    for host, port in uri_parser.parse_uri(uri)["nodelist"]:
+        client = AsyncIOMotorClient(host, port, directConnection=True)
+        try:
+            status = await client.admin.command("serverStatus")
+            hello = await client.admin.command("hello")
+            ops = status["opcounters"]
+            counters[f"{host}:{port}"] = {
+                "primary": hello.get("isWritablePrimary", False),
+                "reads": ops["query"] + ops["getmore"] + ops["command"],
+            }
+        finally:
+            client.close()
+    return counters
+
+
+async def associate(worker: int, workers: int, deadline: float, stats: dict):
+    """Cycle this associate's share of the tasks through pending -> in_progress -> on_hold."""
+    user = {"id": f"associate-bench{worker:02d}", "role": "associate"}
+    db = await get_database(STORE_ID)
+    rng = random.Random(worker)
+    task_ids = [f"task-{i:05d}" for i in range(worker, TASKS, workers)]
+    while time.perf_counter() < deadline:
+        task = await db.tasks.find_one({"store_id": STORE_ID, "id": rng.choice(task_ids)})
+        status = NEXT_STATUS[task["status"]]
+        started = time.perf_counter()
+        try:
+            await update_task(STORE_ID, task["id"], user, task.get("version", 0), {"status": status})
+        except TaskConflict:
+            stats["conflicts"] += 1
+            continue
+        stats["write_ms"].append((time.perf_counter() - started) * 1000)
+        transitions = await get_task_transitions(STORE_ID, task["id"])
+        if not transitions or transitions[-1]["to_status"] != status:
+            stats["stale_reads"] += 1
+
+
+async def manager(deadline: float, stats: dict):
+    now = datetime.utcnow()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await replay_store(STORE_ID)
+        await get_store_levels(STORE_ID)
+        await get_store_velocity_stats(STORE_ID)
+        await get_history(STORE_ID, "SKU00001", now - timedelta(hours=HOURS), now)
+        await get_store_partial(STORE_ID, max_age=5)
+        stats["dashboard_ms"].append((time.perf_counter() - started) * 1000)
+
+
+async def run(uri: str, read_preference: str, managers: int, associates: int, seconds: float) -> dict:
+    database.ANALYTICS_READ_PREFERENCE = read_preference
+    stats = {"write_ms": [], "dashboard_ms": [], "conflicts": 0, "stale_reads": 0}
+    before = await member_counters(uri)
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(associate(i, associates, deadline, stats) for i in range(associates)),
+        *(manager(deadline, stats) for _ in range(managers)),
+    )
+    await transition_log.flush()
+    after = await member_counters(uri)
+    stats["members"] = {
+        host: {"primary": after[host]["primary"], "reads_per_s": (after[host]["reads"] - before[host]["reads"]) / seconds}
+        for host in after
+    }
+    return stats
+
+
+def report(label: str, stats: dict):
+    writes, dashboards = np.array(stats["write_ms"]), np.array(stats["dashboard_ms"])
+    print(f"\n{label}")
+    print("-" * 50)
+    for host, member in sorted(stats["members"].items()):
+        role = "primary" if member["primary"] else "secondary"
+        print(f"  {host:<20} {role:<10} {member['reads_per_s']:>9,.0f} reads+commands/s")
+    if len(writes):
+        print(f"  Task updates: {len(writes):,} (p50 {np.percentile(writes, 50):.1f} ms, "
+              f"p95 {np.percentile(writes, 95):.1f} ms), {stats['conflicts']} conflicts")
+    if len(dashboards):
+        print(f"  Dashboards:   {len(dashboards):,} (p50 {np.percentile(dashboards, 50):.0f} ms, "
+              f"p95 {np.percentile(dashboards, 95):.0f} ms)")
+    print(f"  Transition reads missing the caller's own update: {stats['stale_reads']}")
+
+
+def primary_load(stats: dict) -> float:
+    return sum(m["reads_per_s"] for m in stats["members"].values() if m["primary"])
+
+
+async def main_async(args) -> int:
+    database.MONGO_URI = args.uri
+    database.MONGO_DB_NAME = f"shelfmind_bench_{uuid.uuid4().hex[:6]}"
+    await connect_to_mongo()
+    db = await get_database(STORE_ID)
+    try:
+        await seed(db)
+        baseline = await run(args.uri, "primary", args.managers, args.associates, args.seconds)
+        routed = await run(args.uri, "secondaryPreferred", args.managers, args.associates, args.seconds)
+    finally:
+        await db.client.drop_database(database.MONGO_DB_NAME)
+        await close_mongo_connection()
+
+    print("ShelfMind Read Routing Benchmark")
+    print("=" * 50)
+    print(f"{args.associates} associates, {args.managers} managers, {args.seconds:.0f}s per run")
+    report("All reads on the primary", baseline)
+    report(f"Dashboard reads on secondaries (maxStalenessSeconds={database.ANALYTICS_MAX_STALENESS_SECONDS})", routed)
+
+    base, moved = primary_load(baseline), primary_load(routed)
+    print(f"\nPrimary load: {base:,.0f} -> {moved:,.0f} reads+commands/s"
+          + (f" ({(1 - moved / base) * 100:.0f}% less)" if base else ""))
+    if routed["stale_reads"] or baseline["stale_reads"]:
+        print("[ERROR] A transition read missed the caller's own update")
+        return 1
+    if not any(not m["primary"] for m in routed["members"].values()):
+        print("[ERROR] No secondaries found; start a replica set with at least one secondary")
+        return 1
+    print("[SUCCESS] Dashboard reads moved off the primary with read-your-writes intact")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard read routing on a replica set")
+    parser.add_argument("--uri", default="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--managers", type=int, default=8)
+    parser.add_argument("--associates", type=int, default=16)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark: import time of the app and time to its first request.
+
+Each measurement runs in a fresh interpreter, like a cold worker:
+- import time of `main`, best and median of several runs;
+- heavy subsystems (NumPy, pyarrow, httpx, Pillow) must not be loaded by the
+  import; they are deferred until first use;
+- time from launching uvicorn to the first successful `/health` response
+  (needs the configured MongoDB; skip with --no-server).
+
+Fails when any of them regresses past its budget.
+
+Usage:
+    python benchmark_startup.py --import-budget 1.5 --first-request-budget 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+# Configuration
+RUNS = 5
+HEAVY_MODULES = ["numpy", "pyarrow", "httpx", "PIL"]
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_PROBE = f"""
+import sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+loaded = [name for name in {HEAVY_MODULES!r}
+          if name in sys.modules and type(sys.modules[name]).__name__ != "_LazyModule"]
+print(elapsed, ",".join(loaded))
+"""
+
+
+def measure_import():
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, capture_output=True,
+                            text=True, check=True).stdout.split()
+    return float(output[0]), output[1].split(",") if len(output) > 1 else []
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(timeout: float = 60) -> float:
+    port = free_port()
+    env = dict(os.environ, SCHEDULER_ENABLED="false", PARTITIONING_ENABLED="false")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving a request; is MongoDB running?")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"No response within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start time of the ShelfMind backend")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--import-budget", type=float, default=1.5, help="Seconds allowed for `import main`")
+    parser.add_argument("--first-request-budget", type=float, default=5.0,
+                        help="Seconds allowed from launch to the first response")
+    parser.add_argument("--no-server", action="store_true", help="Only measure imports (no MongoDB needed)")
+    args = parser.parse_args()
+
+    print("ShelfMind Cold Start Benchmark")
+    print("=" * 50)
+    failures = []
+
+    import_times, eager = [], set()
+    for _ in range(args.runs):
+        elapsed, loaded = measure_import()
+        import_times.append(elapsed)
+        eager.update(loaded)
+    best = min(import_times)
+    print(f"import main: best {best * 1000:.0f} ms, median {statistics.median(import_times) * 1000:.0f} ms "
+          f"(budget {args.import_budget * 1000:.0f} ms)")
+    if best > args.import_budget:
+        failures.append("import time over budget")
+    if eager:
+        print(f"Loaded eagerly: {', '.join(sorted(eager))}")
+        failures.append("heavy modules imported at startup")
+    else:
+        print(f"Deferred until first use: {', '.join(HEAVY_MODULES)}")
+
+    if not args.no_server:
+        try:
+            first = [measure_first_request() for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+        best_first = min(first)
+        print(f"Launch to first request: best {best_first * 1000:.0f} ms, median {statistics.median(first) * 1000:.0f} ms "
+              f"(budget {args.first_request_budget * 1000:.0f} ms)")
+        if best_first > args.first_request_budget:
+            failures.append("time to first request over budget")
+
+    if failures:
+        print(f"[ERROR] Startup regressed: {'; '.join(failures)}")
+        sys.exit(1)
+    print("[SUCCESS] Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
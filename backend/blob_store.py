@@ -0,0 +1,214 @@
+"""
+Content-addressed storage for uploaded shelf scan images.
+
+Images live on the local data disk under their SHA-256 digest, so uploading
+the same photo twice stores it once. Thumbnails are rendered a single time in
+a process pool and cached next to the originals. Files are served with strong
+ETags and Range support, and handed to the server for zero-copy transmission
+when it advertises the ASGI zero-copy or pathsend extensions.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+IMAGE_DIR = os.path.join(DATA_DIR, "images")
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 2))
+
+# Accepted upload types and the extension they are stored under
+IMAGE_TYPES = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+
+# Thumbnail name -> longest edge in pixels
+THUMBNAIL_SIZES = {"sm": 160, "md": 480}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLarge(Exception):
+    """Raised when an upload exceeds MAX_IMAGE_BYTES."""
+
+
+def _render_thumbnail(source: str, target: str, edge: int) -> bool:
+    """Resize `source` to fit within `edge` pixels and save it as JPEG (runs in a worker process)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+
+    with Image.open(source) as image:
+        image.thumbnail((edge, edge))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        with os.fdopen(fd, "wb") as out:
+            image.save(out, "JPEG", quality=80, optimize=True)
+    os.replace(tmp_path, target)
+    return True
+
+
+class ImageBlobStore:
+    """Stores images by content hash and renders their thumbnails once."""
+
+    def __init__(self, root: str = IMAGE_DIR, workers: int = THUMBNAIL_WORKERS):
+        self.root = root
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def filename(digest: str, content_type: str) -> str:
+        return f"{digest}.{IMAGE_TYPES[content_type]}"
+
+    def path_for(self, name: str) -> str:
+        """Path of an original image, e.g. name = '<sha256>.jpg'."""
+        return os.path.join(self.root, "orig", name[:2], name)
+
+    def thumbnail_path_for(self, name: str, size: str) -> str:
+        digest = name.split(".", 1)[0]
+        return os.path.join(self.root, "thumbs", size, digest[:2], f"{digest}.jpg")
+
+    def _store_file(self, source, content_type: str) -> tuple:
+        """Copy a file object into the store, hashing as it goes. Returns (name, size, created)."""
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > MAX_IMAGE_BYTES:
+                        raise ImageTooLarge(f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            name = self.filename(digest.hexdigest(), content_type)
+            target = self.path_for(name)
+            if os.path.exists(target):
+                os.unlink(tmp_path)
+                return name, size, False
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+            return name, size, True
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def put(self, source, content_type: str) -> tuple:
+        """Store an uploaded file object. Returns (name, size, created)."""
+        if content_type not in IMAGE_TYPES:
+            raise ValueError(f"Unsupported image type: {content_type}")
+        return await asyncio.to_thread(self._store_file, source, content_type)
+
+    def exists(self, name: str) -> bool:
+        return os.path.isfile(self.path_for(name))
+
+    async def thumbnail(self, name: str, size: str) -> str:
+        """Path of a thumbnail, rendering it first if needed. Falls back to the original."""
+        target = self.thumbnail_path_for(name, size)
+        if os.path.isfile(target):
+            return target
+
+        # Concurrent requests for the same thumbnail share one render
+        key = f"{size}/{name}"
+        future = self._pending.get(key)
+        if future is None:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(loop.run_in_executor(
+                self._executor(), _render_thumbnail, self.path_for(name), target, THUMBNAIL_SIZES[size]
+            ))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        try:
+            rendered = await asyncio.shield(future)
+        except Exception as e:
+            logger.error(f"Thumbnail rendering failed for {name}: {e}")
+            rendered = False
+        if not rendered:
+            logger.warning("Pillow unavailable or render failed, serving original for %s", name)
+            return self.path_for(name)
+        return target
+
+    async def render_thumbnails(self, name: str) -> None:
+        """Render every thumbnail size for an image (used after upload)."""
+        await asyncio.gather(*(self.thumbnail(name, size) for size in THUMBNAIL_SIZES))
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Process-wide image store
+image_store = ImageBlobStore()
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """FileResponse that lets the server send file bytes without copying them through Python.
+
+    Uses the ASGI `http.response.zerocopy` extension for full and single-range
+    responses, or `http.response.pathsend` for full responses, and falls back
+    to Starlette's chunked reads when the server supports neither.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self._extensions = scope.get("extensions") or {}
+        await super().__call__(scope, receive, send)
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if send_header_only:
+            return await super()._handle_simple(send, send_header_only)
+        if "http.response.zerocopy" in self._extensions:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await self._send_zerocopy(send, 0, None)
+        elif "http.response.pathsend" in self._extensions:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+        else:
+            await super()._handle_simple(send, send_header_only)
+
+    async def _handle_single_range(
+        self, send: Send, start: int, end: int, file_size: int, send_header_only: bool
+    ) -> None:
+        if send_header_only or "http.response.zerocopy" not in self._extensions:
+            return await super()._handle_single_range(send, start, end, file_size, send_header_only)
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        await self._send_zerocopy(send, start, end - start)
+
+    async def _send_zerocopy(self, send: Send, offset: int, count: Optional[int]) -> None:
+        with open(self.path, "rb") as file:
+            message = {"type": "http.response.zerocopy", "file": file, "offset": offset, "more_body": False}
+            if count is not None:
+                message["count"] = count
+            await send(message)
+
+
+def etag_for(name: str, size: Optional[str] = None) -> str:
+    """Strong ETag: the content hash (plus thumbnail size) identifies the bytes exactly."""
+    digest = name.split(".", 1)[0]
+    return f'"{digest}-{size}"' if size else f'"{digest}"'
@@ -0,0 +1,250 @@
+"""
+In-memory product catalog for ShelfMind.
+
+The whole SKU master is held in compact parallel arrays: one row per SKU,
+category codes instead of repeated strings, and interned search tokens.
+SKU lookup is a dict probe; typeahead search is a binary search over sorted
+token and SKU arrays. Reloads build a new snapshot off the event loop and
+swap it in with a single reference assignment, so requests never block.
+"""
+
+import asyncio
+import bisect
+import csv
+import json
+import logging
+import math
+import os
+import re
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from change_feed import change_feed
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+CATALOG_FILE = os.getenv("CATALOG_FILE", os.path.join(DATA_DIR, "catalog.csv"))
+
+DEFAULT_CATEGORY = "General"
+LOGGED_SKIPS = 20  # bad rows logged individually per load
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def clean_record(record) -> Tuple[str, str, str, float, Optional[str]]:
+    """Validate one bulk file record; returns (sku, name, category, unit_price, image_url) or raises ValueError."""
+    if isinstance(record, json.JSONDecodeError):
+        raise ValueError(f"invalid JSON ({record.msg})")
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    sku = record.get("sku")
+    if not isinstance(sku, str) or not sku.strip():
+        raise ValueError("missing sku")
+    sku = sku.strip()
+    try:
+        unit_price = float(record.get("unit_price") or 0.0)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid unit_price {record.get('unit_price')!r}")
+    if not math.isfinite(unit_price):
+        raise ValueError(f"invalid unit_price {record.get('unit_price')!r}")
+    name = str(record.get("name") or sku)
+    category = str(record.get("category") or DEFAULT_CATEGORY)
+    image_url = record.get("image_url") or None
+    return sku, name, category, unit_price, None if image_url is None else str(image_url)
+
+
+class CatalogSnapshot:
+    """Immutable, compact view of the SKU master."""
+
+    def __init__(self, records: Iterable[dict], source: Optional[str] = None):
+        self.source = source
+        self.loaded_at = datetime.utcnow()
+        self.skus: List[str] = []
+        self.names: List[str] = []
+        self.image_urls: List[Optional[str]] = []
+        self.categories: List[str] = []
+        self.category_codes = array("I")
+        self.unit_prices = array("f")
+        self.by_sku: Dict[str, int] = {}
+        self.skipped = 0
+
+        category_of: Dict[str, int] = {}
+        tokens = []
+        for number, record in enumerate(records, 1):
+            try:
+                sku, name, category, unit_price, image_url = clean_record(record)
+            except ValueError as e:
+                self.skipped += 1
+                if self.skipped <= LOGGED_SKIPS:
+                    logger.warning("Skipping catalog record %d of %s: %s", number, source or "catalog", e)
+                continue
+            if sku in self.by_sku:
+                continue
+            row = len(self.skus)
+            code = category_of.get(category)
+            if code is None:
+                code = category_of[category] = len(self.categories)
+                self.categories.append(sys.intern(category))
+
+            self.by_sku[sku] = row
+            self.skus.append(sku)
+            self.names.append(name)
+            self.image_urls.append(image_url)
+            self.category_codes.append(code)
+            self.unit_prices.append(unit_price)
+            for token in set(tokenize(name)):
+                tokens.append((sys.intern(token), row))
+
+        if self.skipped > LOGGED_SKIPS:
+            logger.warning("Skipped %d invalid records of %s", self.skipped, source or "catalog")
+
+        # Sorted token -> row arrays for name prefix search
+        tokens.sort()
+        self.token_keys: List[str] = [token for token, _ in tokens]
+        self.token_rows = array("I", (row for _, row in tokens))
+
+        # Sorted lowercase SKU -> row arrays for SKU prefix search
+        sku_order = sorted(range(len(self.skus)), key=lambda row: self.skus[row].lower())
+        self.sku_keys: List[str] = [self.skus[row].lower() for row in sku_order]
+        self.sku_rows = array("I", sku_order)
+
+    def __len__(self) -> int:
+        return len(self.skus)
+
+    def record(self, row: int) -> dict:
+        return {
+            "sku": self.skus[row],
+            "name": self.names[row],
+            "category": self.categories[self.category_codes[row]],
+            "unit_price": round(self.unit_prices[row], 2),
+            "image_url": self.image_urls[row],
+        }
+
+    def get(self, sku: str) -> Optional[dict]:
+        """O(1) lookup by exact SKU."""
+        row = self.by_sku.get(sku)
+        return None if row is None else self.record(row)
+
+    @staticmethod
+    def _prefix_range(keys: List[str], prefix: str) -> range:
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + "\uffff", lo=start)
+        return range(start, end)
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """Typeahead search: SKU prefix matches first, then names with a word starting with each query word."""
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        rows: List[int] = []
+        seen = set()
+        for i in self._prefix_range(self.sku_keys, query):
+            row = self.sku_rows[i]
+            rows.append(row)
+            seen.add(row)
+            if len(rows) >= limit:
+                return [self.record(row) for row in rows]
+
+        words = tokenize(query)
+        if words:
+            # Walk the most selective word's prefix range and check the other words per row
+            ranges = sorted(((word, self._prefix_range(self.token_keys, word)) for word in words),
+                            key=lambda item: len(item[1]))
+            others = [word for word, _ in ranges[1:]]
+            for i in ranges[0][1]:
+                row = self.token_rows[i]
+                if row in seen:
+                    continue
+                seen.add(row)
+                if others:
+                    name_tokens = tokenize(self.names[row])
+                    if not all(any(token.startswith(word) for token in name_tokens) for word in others):
+                        continue
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+        return [self.record(row) for row in rows]
+
+
+def _parse_line(line: str):
+    """One NDJSON record, or the decode error for CatalogSnapshot to skip and count."""
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return e
+
+
+def read_catalog_file(path: str) -> list:
+    """Read a bulk SKU file: CSV with a header row, or NDJSON (one record per line)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            return [_parse_line(line) for line in f if line.strip()]
+        reader = csv.DictReader(f)
+        if reader.fieldnames is not None and "sku" not in reader.fieldnames:
+            raise ValueError("The header has no sku column")
+        return list(reader)
+
+
+def resolve_catalog_path(path: str) -> str:
+    """Resolve a bulk file path, refusing anything outside DATA_DIR other than CATALOG_FILE."""
+    if path == CATALOG_FILE:
+        return path
+    root = os.path.realpath(DATA_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError("Catalog files must live under DATA_DIR")
+    return resolved
+
+
+def load_snapshot(path: str) -> CatalogSnapshot:
+    return CatalogSnapshot(read_catalog_file(path), source=path)
+
+
+class ProductCatalog:
+    """Holds the current snapshot and swaps in reloaded ones atomically."""
+
+    def __init__(self):
+        self.snapshot = CatalogSnapshot([])
+        self._reload_lock = asyncio.Lock()
+        self._peer_reload: Optional[asyncio.Task] = None
+
+    async def reload(self, path: str = CATALOG_FILE, broadcast: bool = True) -> CatalogSnapshot:
+        """Build a snapshot from a bulk file in a worker thread, then swap it in."""
+        async with self._reload_lock:
+            snapshot = await asyncio.to_thread(load_snapshot, path)
+            self.snapshot = snapshot
+            logger.info("Loaded %d SKUs into catalog from %s (%d invalid records skipped)",
+                        len(snapshot), path, snapshot.skipped)
+        if broadcast:
+            await change_feed.publish("catalog", path)
+        return snapshot
+
+    def reload_from_peer(self, path: str) -> None:
+        """Another worker reloaded the catalog: load the same file in the background."""
+        async def reload():
+            try:
+                await self.reload(path, broadcast=False)
+            except Exception as e:
+                logger.error(f"Failed to reload catalog from {path}: {e}")
+        self._peer_reload = asyncio.create_task(reload())
+
+    async def load_if_present(self) -> None:
+        """Startup hook: load CATALOG_FILE when it exists."""
+        if os.path.isfile(CATALOG_FILE):
+            try:
+                await self.reload(CATALOG_FILE, broadcast=False)
+            except Exception as e:
+                logger.error(f"Failed to load catalog from {CATALOG_FILE}: {e}")
+
+
+# Process-wide catalog
+product_catalog = ProductCatalog()
+change_feed.subscribe("catalog", product_catalog.reload_from_peer)
@@ -0,0 +1,191 @@
+"""
+Cross-worker cache invalidation.
+
+Every process keeps in-memory caches (store versions, planogram indexes, the
+product catalog, backroom indexes, regional rollups). When one worker changes
+the underlying data it publishes an invalidation (a topic and a key) to the
+cache_invalidations outbox collection. Every other worker follows that
+collection and runs the handlers subscribed to the topic.
+
+Workers follow the outbox with a MongoDB change stream where the deployment
+supports it (replica sets and sharded clusters). On a standalone mongod they
+poll it every CHANGE_FEED_POLL_SECONDS, so delivery delay stays bounded
+either way. Propagation lag (publish to handler) is tracked per worker.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CHANGE_FEED_MODE = os.getenv("CHANGE_FEED_MODE", "auto")  # auto, change_stream or polling
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", 0.5))
+CHANGE_FEED_RETENTION_SECONDS = int(os.getenv("CHANGE_FEED_RETENTION_SECONDS", 3600))
+POLL_OVERLAP_SECONDS = 2.0  # re-read window for inserts that become visible out of _id order
+LAG_SAMPLES = 1000
+
+OUTBOX_COLLECTION = "cache_invalidations"
+
+Handler = Callable[[str], Union[None, Awaitable[None]]]
+
+
+class ChangeFeed:
+    """Publishes invalidations to the outbox and dispatches those of other workers."""
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.mode = "stopped"
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._seen: Dict[ObjectId, None] = {}  # dispatched ids inside the re-read window, oldest first
+        self._lags = deque(maxlen=LAG_SAMPLES)
+        self.published = 0
+        self.received: Dict[str, int] = {}
+        self.last_received_at: Optional[datetime] = None
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        """Run `handler(key)` when another worker publishes on `topic`."""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def publish(self, topic: str, key: str = "") -> None:
+        """Tell the other workers to drop cached data for `key`; the caller updates its own cache."""
+        if self._db is None:
+            return
+        try:
+            await self._db[OUTBOX_COLLECTION].insert_one({
+                "topic": topic,
+                "key": key,
+                "origin": self.worker_id,
+                "created_at": datetime.utcnow(),
+            })
+            self.published += 1
+        except PyMongoError as e:
+            logger.error(f"Failed to publish {topic} invalidation for {key!r}: {e}")
+
+    async def start(self, db) -> None:
+        self._db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._db = None
+        self._seen.clear()
+        self.mode = "stopped"
+
+    async def _run(self) -> None:
+        since = datetime.utcnow()
+        if CHANGE_FEED_MODE in ("auto", "change_stream"):
+            try:
+                await self._follow_change_stream()
+                return
+            except OperationFailure as e:
+                # Standalone servers have no oplog to stream from
+                logger.info(f"Change streams unavailable ({e.code}), polling {OUTBOX_COLLECTION} instead")
+            except PyMongoError as e:
+                logger.warning(f"Change stream failed, polling {OUTBOX_COLLECTION} instead: {e}")
+        if self._seen:
+            # Pick up from the last invalidation the stream delivered, so none published since are lost
+            since = max(self._seen).generation_time.replace(tzinfo=None)
+        await self._poll(since)
+
+    async def _follow_change_stream(self) -> None:
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        async with self._db[OUTBOX_COLLECTION].watch(pipeline) as stream:
+            self.mode = "change_stream"
+            logger.info("Following cache invalidations with a change stream")
+            async for change in stream:
+                doc = change["fullDocument"]
+                self._seen[doc["_id"]] = None
+                self._prune_seen(self._window_start(doc["_id"].generation_time.replace(tzinfo=None)))
+                await self._dispatch(doc)
+
+    async def _poll(self, since: datetime) -> None:
+        self.mode = "polling"
+        last_seen = since
+        while True:
+            try:
+                start = self._window_start(last_seen)
+                self._prune_seen(start)
+                cursor = self._db[OUTBOX_COLLECTION].find({"_id": {"$gt": start}}).sort("_id", 1)
+                async for doc in cursor:
+                    if doc["_id"] in self._seen:
+                        continue
+                    self._seen[doc["_id"]] = None
+                    last_seen = max(last_seen, doc["_id"].generation_time.replace(tzinfo=None))
+                    await self._dispatch(doc)
+            except PyMongoError as e:
+                logger.error(f"Polling {OUTBOX_COLLECTION} failed: {e}")
+            await asyncio.sleep(CHANGE_FEED_POLL_SECONDS)
+
+    @staticmethod
+    def _window_start(last_seen: datetime) -> ObjectId:
+        """Lowest _id still re-read after seeing invalidations up to `last_seen`."""
+        return ObjectId.from_datetime(last_seen - timedelta(seconds=POLL_OVERLAP_SECONDS))
+
+    def _prune_seen(self, start: ObjectId) -> None:
+        """Forget ids at or below `start`; the window never moves back, so they are not read again."""
+        while self._seen:
+            oldest = next(iter(self._seen))
+            if oldest > start:
+                break
+            del self._seen[oldest]
+
+    async def _dispatch(self, doc: dict) -> None:
+        if doc.get("origin") == self.worker_id:
+            return
+        topic, key = doc["topic"], doc.get("key", "")
+        now = datetime.utcnow()
+        # Publish time comes from the publishing host's clock; skew can only be clamped, not removed
+        self._lags.append(max((now - doc["created_at"]).total_seconds() * 1000, 0.0))
+        self.received[topic] = self.received.get(topic, 0) + 1
+        self.last_received_at = now
+        for handler in self._handlers.get(topic, []):
+            try:
+                result = handler(key)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Invalidation handler for {topic} failed: {e}")
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+
+        def percentile(p: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(int(p / 100 * len(lags)), len(lags) - 1)], 1)
+
+        return {
+            "worker_id": self.worker_id,
+            "mode": self.mode,
+            "poll_seconds": CHANGE_FEED_POLL_SECONDS if self.mode == "polling" else None,
+            "published": self.published,
+            "received": dict(self.received),
+            "last_received_at": self.last_received_at,
+            "lag_ms": {"p50": percentile(50), "p95": percentile(95), "max": percentile(100), "samples": len(lags)},
+        }
+
+
+# Process-wide change feed
+change_feed = ChangeFeed()
+
+
+async def create_change_feed_indexes(db) -> None:
+    await db[OUTBOX_COLLECTION].create_index("created_at", expireAfterSeconds=CHANGE_FEED_RETENTION_SECONDS)
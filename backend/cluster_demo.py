@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Local check of store partitioning with several worker processes.
+
+Starts N uvicorn workers on consecutive ports against the configured MongoDB,
+then checks that:
+- every worker agrees on the owner of each store;
+- store requests are served by the owner, whichever worker they hit;
+- when one worker stops, only its stores move to the others.
+
+Usage:
+    python cluster_demo.py --workers 3 --base-port 8101
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+STORES = [f"STORE{i:03d}" for i in range(1, 41)]
+
+
+def start_worker(port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        PARTITIONING_ENABLED="true",
+        WORKER_URL=f"http://127.0.0.1:{port}",
+        PARTITION_HEARTBEAT_SECONDS="1",
+        PARTITION_MEMBER_TIMEOUT_SECONDS="3",
+        SCHEDULER_ENABLED="false",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+def wait_healthy(client: httpx.Client, urls, timeout: float = 30):
+    deadline = time.time() + timeout
+    for url in urls:
+        while True:
+            try:
+                if client.get(f"{url}/health", timeout=1).is_success:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError(f"{url} did not start")
+            time.sleep(0.3)
+
+
+def register_manager(client: httpx.Client, url: str) -> str:
+    response = client.post(f"{url}/api/auth/register", json={
+        "email": f"cluster-{uuid.uuid4().hex[:8]}@example.com",
+        "password": "cluster1",
+        "name": "Cluster Check",
+        "role": "manager",
+        "store_id": STORES[0],
+        "store_name": "Cluster Check Store",
+    })
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def owners(client: httpx.Client, url: str, token: str) -> dict:
+    response = client.get(f"{url}/api/admin/partitioning", params={"store_id": STORES},
+                          headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return response.json()
+
+
+def converged(client: httpx.Client, urls, token, members: int) -> list:
+    """Poll until every worker sees `members` workers; returns each worker's view."""
+    for _ in range(50):
+        views = [owners(client, url, token) for url in urls]
+        if all(len(view["members"]) == members for view in views):
+            return views
+        time.sleep(0.5)
+    raise RuntimeError("Workers did not converge on membership")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check store partitioning across local workers")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=8101)
+    args = parser.parse_args()
+
+    urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.workers)]
+    processes = [start_worker(args.base_port + i) for i in range(args.workers)]
+    failures = 0
+    client = httpx.Client(timeout=30.0)
+    try:
+        wait_healthy(client, urls)
+        token = register_manager(client, urls[0])
+        views = converged(client, urls, token, args.workers)
+
+        print("ShelfMind Partitioning Check")
+        print("=" * 50)
+        agree = all(view["owners"] == views[0]["owners"] for view in views)
+        print(f"{'[SUCCESS]' if agree else '[ERROR]'} {args.workers} workers agree on owners of {len(STORES)} stores")
+        failures += not agree
+
+        owner = views[0]["owners"][STORES[0]]
+        for url in urls:
+            response = client.get(f"{url}/api/tasks", headers={"Authorization": f"Bearer {token}"})
+            served_by = response.headers.get("X-ShelfMind-Served-By") or owners(client, url, token)["worker_id"]
+            ok = response.is_success and served_by == owner
+            failures += not ok
+            print(f"{'[SUCCESS]' if ok else '[ERROR]'} {url}/api/tasks served by {served_by}")
+
+        before = views[0]["owners"]
+        leaving = views[-1]["worker_id"]
+        processes[-1].terminate()
+        processes[-1].wait()
+        after = converged(client, urls[:-1], token, args.workers - 1)[0]["owners"]
+        moved = {store for store in STORES if before[store] != after[store]}
+        only_leavers = all(before[store] == leaving for store in moved)
+        failures += not only_leavers
+        print(f"{'[SUCCESS]' if only_leavers else '[ERROR]'} {len(moved)} stores moved after {leaving} left, "
+              f"all previously owned by it")
+    finally:
+        client.close()
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
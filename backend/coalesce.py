@@ -0,0 +1,117 @@
+"""
+Single-flight coalescing of identical concurrent queries.
+
+At shift start every associate of a store opens the dashboard within seconds,
+and each request runs the same store-scoped queries. Requests are keyed on
+(endpoint, store_id, params). The first request with a key runs the query and
+every identical request that arrives while it is in flight awaits the same
+result. The query runs in its own task, so a caller that disconnects does not
+cancel it for the others. Afterwards the result can be kept for a short
+micro-cache window (COALESCE_CACHE_SECONDS).
+
+Results are shared between requests and must not be mutated by callers.
+Per-endpoint counts of executed, coalesced and cached requests are kept for
+the admin API.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Configuration
+COALESCE_CACHE_SECONDS = float(os.getenv("COALESCE_CACHE_SECONDS", 1.0))
+COALESCE_CACHE_ENTRIES = int(os.getenv("COALESCE_CACHE_ENTRIES", 2048))
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.failures = 0
+
+    def as_dict(self) -> dict:
+        shared = self.coalesced + self.cache_hits
+        return {
+            "requests": self.requests,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+            "shared_fraction": round(shared / self.requests, 3) if self.requests else None,
+        }
+
+
+class SingleFlight:
+    def __init__(self, cache_seconds: float = COALESCE_CACHE_SECONDS, max_entries: int = COALESCE_CACHE_ENTRIES):
+        self.cache_seconds = cache_seconds
+        self.max_entries = max_entries
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self._cache: Dict[Tuple, Tuple[float, Any]] = {}
+        self._stats: Dict[str, EndpointStats] = {}
+
+    async def do(self, endpoint: str, store_id: str, params: Tuple[Hashable, ...],
+                 query: Callable[[], Awaitable[Any]], cache_seconds: Optional[float] = None) -> Any:
+        """Result of `query()`, shared with identical concurrent (and, briefly, recent) calls."""
+        key = (endpoint, store_id, params)
+        stats = self._stats.setdefault(endpoint, EndpointStats())
+        stats.requests += 1
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                stats.cache_hits += 1
+                return cached[1]
+            del self._cache[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            stats.coalesced += 1
+            return await asyncio.shield(task)
+
+        stats.executed += 1
+        task = self._inflight[key] = asyncio.create_task(query())
+        task.add_done_callback(lambda done: self._finish(key, done, stats, cache_seconds))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Tuple, task: asyncio.Task, stats: EndpointStats, cache_seconds: Optional[float]) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            stats.failures += 1
+            return
+        ttl = self.cache_seconds if cache_seconds is None else cache_seconds
+        if ttl > 0:
+            if len(self._cache) >= self.max_entries:
+                self._evict()
+            self._cache[key] = (time.monotonic() + ttl, task.result())
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
+        while len(self._cache) >= self.max_entries:
+            del self._cache[next(iter(self._cache))]  # oldest insert first
+
+    def stats(self) -> dict:
+        total = EndpointStats()
+        for stats in self._stats.values():
+            total.requests += stats.requests
+            total.executed += stats.executed
+            total.coalesced += stats.coalesced
+            total.cache_hits += stats.cache_hits
+            total.failures += stats.failures
+        return {
+            "cache_seconds": self.cache_seconds,
+            "in_flight": len(self._inflight),
+            "cached": len(self._cache),
+            "total": total.as_dict(),
+            "endpoints": {endpoint: stats.as_dict() for endpoint, stats in sorted(self._stats.items())},
+        }
+
+
+# Process-wide coalescer
+single_flight = SingleFlight()
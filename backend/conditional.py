@@ -0,0 +1,56 @@
+"""
+Conditional GET and delta support for dashboard endpoints.
+
+Store-scoped collection endpoints derive a strong ETag from the store's
+committed change count, which is cached in memory, so a matching
+If-None-Match is answered with 304 before any query runs. Delta requests
+(`since=<version>`) return only records changed after a version, together
+with the cursor to pass next time.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+# Dashboards must revalidate, but may keep the body and send If-None-Match
+REVALIDATE = "private, no-cache"
+# Responses that only change with a deploy
+STATIC_MAX_AGE = 86400
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def collection_etag(request: Request, *parts) -> str:
+    """Strong ETag for a response determined by `parts` and the request's path and query."""
+    variant = f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+    return '"' + "-".join(str(part) for part in parts) + f'-{digest}"'
+
+
+def not_modified(request: Request, etag: str, cache_control: str = REVALIDATE) -> Optional[Response]:
+    """A 304 response when the client already holds `etag`, else None."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
+
+
+def delta_cursor(since: int, versions: dict, page_last: Optional[int] = None) -> int:
+    """Version a client can resume from after reading changes newer than `since`.
+
+    `versions` must have been read before the changes were queried. Only versions below the oldest
+    write still in flight are safe to skip past; changes above it are delivered again next time.
+    When the changes were cut off at a full page ending at `page_last`, the cursor moves up to it.
+    """
+    safe = versions.get("safe")
+    if safe is None:
+        safe = since
+    if page_last is not None:
+        safe = min(safe, page_last)
+    return max(safe, since)
@@ -1,20 +1,55 @@
 import os
+import time
+import asyncio
+import hashlib
+import uuid
+from contextlib import asynccontextmanager
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, uri_parser
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
 from pymongo.errors import ConnectionFailure
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 import logging
 
+from change_feed import change_feed
+
 load_dotenv()
 
 # MongoDB configuration
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "shelfmind")
+STORE_VERSION_CACHE_SECONDS = float(os.getenv("STORE_VERSION_CACHE_SECONDS", 5))
+# A reservation still open after this long is assumed to belong to a worker that died mid-write
+STORE_VERSION_LEASE_SECONDS = float(os.getenv("STORE_VERSION_LEASE_SECONDS", 60))
+
+# Store shards, e.g. "s0=mongodb://host-a:27017/shelfmind_s0,s1=mongodb://host-b:27017/shelfmind_s1".
+# Empty keeps every store in MONGO_DB_NAME.
+STORE_SHARDS = dict(
+    entry.strip().split("=", 1) for entry in os.getenv("STORE_SHARDS", "").split(",") if entry.strip()
+)
+SHARD_DIRECTORY_COLLECTION = "store_shards"
+
+# Dashboard, rollup and export reads may be served by secondaries at most this stale;
+# auth and task state are always read from the primary. MongoDB's minimum staleness is 90s.
+ANALYTICS_READ_PREFERENCE = os.getenv("ANALYTICS_READ_PREFERENCE", "secondaryPreferred")
+ANALYTICS_MAX_STALENESS_SECONDS = int(os.getenv("ANALYTICS_MAX_STALENESS_SECONDS", 90))
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
 
 # Global variables for database connection
 client: Optional[AsyncIOMotorClient] = None
 database = None
+_clients: Dict[tuple, AsyncIOMotorClient] = {}  # one connection pool per cluster
+shard_databases: Dict[str, object] = {}
+_store_shards: Dict[str, str] = {}  # store_id -> shard name, cached from the directory
+_causal_tokens: Dict[int, tuple] = {}  # id(client) -> (cluster time, operation time) of this process's last tracked write
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,17 +59,31 @@ class MongoDB:
     client: Optional[AsyncIOMotorClient] = None
     database = None
 
+def _cluster_key(uri: str) -> tuple:
+    """Identity of the cluster a URI points at, ignoring the database name."""
+    parsed = uri_parser.parse_uri(uri)
+    return (tuple(sorted(f"{host}:{port}" for host, port in parsed["nodelist"])), parsed["username"],
+            tuple(sorted((key, repr(value)) for key, value in parsed["options"].items())))
+
+def _client_for(uri: str) -> AsyncIOMotorClient:
+    key = _cluster_key(uri)
+    if key not in _clients:
+        _clients[key] = AsyncIOMotorClient(uri)
+    return _clients[key]
+
 # MongoDB connection functions
 async def connect_to_mongo():
     """Create database connection"""
     global client, database
     try:
-        client = AsyncIOMotorClient(MONGO_URI)
+        client = _client_for(MONGO_URI)
         database = client[MONGO_DB_NAME]
+        for name, uri in STORE_SHARDS.items():
+            shard_databases[name] = _client_for(uri)[uri_parser.parse_uri(uri)["database"] or f"{MONGO_DB_NAME}_{name}"]
         
         # Test the connection
-        await client.admin.command('ping')
-        logger.info("Successfully connected to MongoDB")
+        await asyncio.gather(*(pool.admin.command('ping') for pool in _clients.values()))
+        logger.info("Successfully connected to MongoDB" + (f" with {len(shard_databases)} store shards" if shard_databases else ""))
         
         # Create indexes for better performance
         await create_indexes()
@@ -47,12 +96,89 @@ async def close_mongo_connection():
     """Close database connection"""
     global client
     if client:
-        client.close()
+        for pool in _clients.values():
+            pool.close()
+        _clients.clear()
+        shard_databases.clear()
+        _store_shards.clear()
+        _causal_tokens.clear()
         logger.info("Disconnected from MongoDB")
 
-async def get_database():
-    """Get database instance"""
-    return database
+async def get_database(store_id: Optional[str] = None):
+    """Get database instance; with a store_id, the database of that store's shard"""
+    if store_id is None or not shard_databases:
+        return database
+    return shard_databases[await shard_for_store(store_id)]
+
+def analytics_read_preference():
+    """Read preference for dashboard, rollup and export reads"""
+    mode = READ_PREFERENCES.get(ANALYTICS_READ_PREFERENCE)
+    if mode is None:
+        raise ValueError(f"Unknown ANALYTICS_READ_PREFERENCE {ANALYTICS_READ_PREFERENCE!r}")
+    return mode() if mode is Primary else mode(max_staleness=ANALYTICS_MAX_STALENESS_SECONDS)
+
+async def get_analytics_database(store_id: Optional[str] = None):
+    """Like get_database, but reads go to secondaries within ANALYTICS_MAX_STALENESS_SECONDS"""
+    db = await get_database(store_id)
+    return db.with_options(read_preference=analytics_read_preference()) if db is not None else None
+
+@asynccontextmanager
+async def causal_session(db):
+    """Causally consistent session on db's cluster that starts after this process's last tracked write.
+
+    Writes made with the session are tracked, so a later secondary read in a causal session
+    waits until the secondary has applied them (read-your-writes).
+    """
+    key = id(db.client)
+    async with await db.client.start_session(causal_consistency=True) as session:
+        token = _causal_tokens.get(key)
+        if token is not None:
+            session.advance_cluster_time(token[0])
+            session.advance_operation_time(token[1])
+        yield session
+        operation_time = session.operation_time  # None on a standalone mongod, which has no secondaries
+        latest = _causal_tokens.get(key)
+        if operation_time is not None and (latest is None or operation_time > latest[1]):
+            _causal_tokens[key] = (session.cluster_time, operation_time)
+
+def default_shard(store_id: str) -> str:
+    """Shard a new store is placed on: a stable hash over the configured shards"""
+    names = sorted(shard_databases)
+    return names[int(hashlib.md5(store_id.encode()).hexdigest(), 16) % len(names)]
+
+async def shard_for_store(store_id: str) -> str:
+    """Shard holding a store's data, from the store_shards directory (new stores are placed by hash)"""
+    shard = _store_shards.get(store_id)
+    if shard is None:
+        doc = await database[SHARD_DIRECTORY_COLLECTION].find_one_and_update(
+            {"store_id": store_id},
+            {"$setOnInsert": {"shard": default_shard(store_id), "created_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        shard = doc["shard"]
+        if shard not in shard_databases:
+            raise RuntimeError(f"Store {store_id} is on shard {shard!r}, which is not configured in STORE_SHARDS")
+        _store_shards[store_id] = shard
+    return shard
+
+def store_databases() -> List:
+    """Every database holding store data: each shard, or the main database when unsharded"""
+    return list(shard_databases.values()) or [database]
+
+async def group_by_database(items: List, store_of: Callable[[object], str]) -> List[Tuple[object, List]]:
+    """Split store-scoped items into (database, items) groups, one per shard holding them"""
+    if not shard_databases:
+        return [(database, items)] if items else []
+    groups: Dict[int, Tuple[object, List]] = {}
+    for item in items:
+        db = await get_database(store_of(item))
+        groups.setdefault(id(db), (db, []))[1].append(item)
+    return list(groups.values())
+
+async def fan_out(operation: Callable[..., Awaitable]) -> list:
+    """Run `operation(db)` concurrently on every store database"""
+    return await asyncio.gather(*(operation(db) for db in store_databases()))
 
 async def create_indexes():
     """Create database indexes for better performance"""
@@ -62,6 +188,15 @@ async def create_indexes():
             await database.users.create_index("email", unique=True)
             await database.users.create_index("id", unique=True, sparse=True)
             await database.users.create_index([("store_id", 1), ("role", 1)])
+
+            # Create indexes on tasks collection
+            for store_db in store_databases():
+                await store_db.tasks.create_index("id", unique=True)
+                await store_db.tasks.create_index([("store_id", 1), ("status", 1)])
+                await store_db.tasks.create_index([("store_id", 1), ("product.sku", 1)])
+                await store_db.tasks.create_index([("store_id", 1), ("version", 1)])
+                await store_db.store_versions.create_index("store_id", unique=True)
+            await database[SHARD_DIRECTORY_COLLECTION].create_index("store_id", unique=True)
             
             logger.info("Database indexes created successfully")
         except Exception as e:
@@ -120,6 +255,155 @@ class UserDocument:
         cursor = database.users.find({"store_id": store_id})
         return await cursor.to_list(length=None)
 
+# Per-store change versions
+# `version` counts reserved change versions and `committed` counts those whose
+# writes have finished. Each open reservation is a `pending` entry with the
+# lowest version it holds and a lease, so a store with no pending entry has no
+# write in flight, and everything below the oldest entry's `low` is committed.
+_store_versions: Dict[str, Tuple[float, dict]] = {}
+
+def _safe_version(doc: dict) -> Optional[int]:
+    """Highest version up to which every write has finished, or None while that is not yet known."""
+    pending = doc.get("pending") or []
+    if not pending:
+        return doc.get("version", 0)
+    # Reservations are pushed in version order, so the first one holds the lowest versions
+    low = pending[0].get("low")
+    return low - 1 if low is not None else None
+
+def _remember_store_versions(doc: dict) -> dict:
+    versions = {"version": doc.get("version", 0), "committed": doc.get("committed", 0), "safe": _safe_version(doc)}
+    _store_versions[doc["store_id"]] = (time.monotonic(), versions)
+    return versions
+
+async def _release_store_versions(db, store_id: str, reservation: str, count: int) -> Optional[dict]:
+    """Mark a reservation committed once; None if it was already released."""
+    return await db.store_versions.find_one_and_update(
+        {"store_id": store_id, "pending.id": reservation},
+        {"$pull": {"pending": {"id": reservation}}, "$inc": {"committed": count}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def _reclaim_store_versions(db, doc: dict) -> dict:
+    """Release the reservations of writers that died mid-write, returning the store's versions after."""
+    now = datetime.utcnow()
+    expired = [entry for entry in doc.get("pending") or [] if entry["expires_at"] <= now]
+    for entry in expired:
+        logger.warning(f"Releasing versions of {doc['store_id']} reserved until {entry['expires_at']}")
+        await _release_store_versions(db, doc["store_id"], entry["id"], entry["count"])
+    if not doc.get("pending"):
+        # Leaked before reservations were tracked; with none open, no write can still be running
+        await db.store_versions.update_one(
+            {"store_id": doc["store_id"], "version": doc["version"], "pending.0": {"$exists": False}},
+            {"$set": {"committed": doc["version"]}},
+        )
+    elif not expired:
+        return doc
+    return await db.store_versions.find_one({"store_id": doc["store_id"]})
+
+@asynccontextmanager
+async def reserve_store_versions(store_id: str, count: int = 1):
+    """Reserve `count` change versions for a store, yielding the highest one.
+
+    The versions are marked committed when the block exits, whether or not its writes succeeded.
+    If the process dies first, they are released once STORE_VERSION_LEASE_SECONDS have passed.
+    """
+    db = await get_database(store_id)
+    reservation = uuid.uuid4().hex
+    entry = {"id": reservation, "count": count,
+             "expires_at": datetime.utcnow() + timedelta(seconds=STORE_VERSION_LEASE_SECONDS)}
+    doc = await db.store_versions.find_one_and_update(
+        {"store_id": store_id},
+        {"$inc": {"version": count}, "$push": {"pending": entry}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    try:
+        # Until `low` is set, readers treat the reservation as covering every uncommitted version
+        await db.store_versions.update_one(
+            {"store_id": store_id, "pending.id": reservation},
+            {"$set": {"pending.$.low": doc["version"] - count + 1}},
+        )
+        yield doc["version"]
+    finally:
+        doc = await _release_store_versions(db, store_id, reservation, count)
+        if doc is None:
+            doc = await db.store_versions.find_one({"store_id": store_id})
+        _remember_store_versions(doc)
+        await change_feed.publish("store_versions", store_id)
+
+async def get_store_versions(store_id: str, max_age: float = STORE_VERSION_CACHE_SECONDS) -> dict:
+    """Reserved and committed change counts of a store, cached for up to `max_age` seconds"""
+    cached = _store_versions.get(store_id)
+    if cached and time.monotonic() - cached[0] <= max_age:
+        return cached[1]
+    db = await get_database(store_id)
+    doc = await db.store_versions.find_one({"store_id": store_id})
+    if doc is not None and doc.get("version", 0) != doc.get("committed", 0):
+        doc = await _reclaim_store_versions(db, doc)
+    return _remember_store_versions(doc or {"store_id": store_id})
+
+def forget_store_versions(store_id: Optional[str] = None) -> None:
+    """Drop cached store versions so the next read goes to the database"""
+    if store_id is None:
+        _store_versions.clear()
+    else:
+        _store_versions.pop(store_id, None)
+
+# Changes made by other workers
+change_feed.subscribe("store_versions", forget_store_versions)
+
+# Task document operations
+OPEN_TASK_STATUSES = ["pending", "in_progress"]
+
+class TaskDocument:
+    @staticmethod
+    async def create_task(task_data: dict) -> dict:
+        """Create a new task document"""
+        task_data["created_at"] = datetime.utcnow()
+        task_data["updated_at"] = task_data["created_at"]
+        task_data.setdefault("status", "pending")
+        db = await get_database(task_data["store_id"])
+        async with reserve_store_versions(task_data["store_id"]) as version:
+            task_data["version"] = version
+            result = await db.tasks.insert_one(task_data)
+        task_data["_id"] = result.inserted_id
+        return task_data
+    
+    @staticmethod
+    async def get_task(store_id: str, task_id: str) -> Optional[dict]:
+        """Get a task of a store by ID"""
+        db = await get_database(store_id)
+        return await db.tasks.find_one({"store_id": store_id, "id": task_id})
+    
+    @staticmethod
+    async def get_tasks_by_store(store_id: str, status: Optional[str] = None, assigned_to: Optional[str] = None,
+                                 projection: Optional[dict] = None) -> list:
+        """Get the tasks of a store, optionally filtered by status and assignee"""
+        query = {"store_id": store_id}
+        if status is not None:
+            query["status"] = status
+        if assigned_to is not None:
+            query["assigned_to"] = assigned_to
+        db = await get_database(store_id)
+        cursor = db.tasks.find(query, projection).sort("created_at", -1)
+        return await cursor.to_list(length=None)
+    
+    @staticmethod
+    async def get_open_tasks_by_store(store_id: str, projection: Optional[dict] = None) -> list:
+        """Get pending and in-progress tasks of a store"""
+        db = await get_database(store_id)
+        cursor = db.tasks.find({"store_id": store_id, "status": {"$in": OPEN_TASK_STATUSES}}, projection)
+        return await cursor.to_list(length=None)
+    
+    @staticmethod
+    async def get_task_changes(store_id: str, since_version: int, limit: Optional[int] = None,
+                               projection: Optional[dict] = None) -> list:
+        """Get the tasks of a store changed after `since_version`, oldest change first"""
+        db = await get_database(store_id)
+        cursor = db.tasks.find({"store_id": store_id, "version": {"$gt": since_version}}, projection).sort("version", 1)
+        return await cursor.to_list(length=limit)
+
 # Database dependency for FastAPI
 async def get_db():
     """Dependency to get database instance"""
@@ -0,0 +1,329 @@
+"""
+Streaming bulk export of tasks, shelf scans and stock readings.
+
+An export reads one Mongo cursor in (time, _id) order, EXPORT_BATCH_SIZE
+documents at a time, and encodes each batch as soon as it is read, so memory
+use does not grow with the size of the export. Only the selected columns are
+projected in the query. Rows are flat: nested fields become dotted columns
+and each reading of a scan becomes its own row.
+
+Every row carries an opaque `export_cursor` naming its source document.
+Passing the last cursor received as `after` resumes an interrupted export
+with the next document; documents updated during the export may be exported
+again, but none are skipped.
+
+CSV and NDJSON are always available; Arrow IPC (stream format) needs pyarrow.
+"""
+
+import base64
+import csv
+import heapq
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from lazy_imports import lazy_import
+from scans import SCANS_COLLECTION
+from timeseries import RAW_COLLECTION, to_utc_naive
+
+pa = lazy_import("pyarrow", optional=True)  # optional; CSV and NDJSON are always available
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 5000))
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson", "arrow": "application/vnd.apache.arrow.stream"}
+CURSOR_COLUMN = "export_cursor"
+
+
+class Dataset:
+    """An exportable collection: columns as (name, document path, kind) and the field exports are ordered by."""
+
+    def __init__(self, collection: str, time_field: str, store_field: str,
+                 columns: List[Tuple[str, str, str]], unwind: Optional[str] = None):
+        self.collection = collection
+        self.time_field = time_field
+        self.store_field = store_field
+        self.columns = columns
+        self.unwind = unwind  # array field whose elements become one row each
+
+    @property
+    def column_names(self) -> List[str]:
+        return [name for name, _, _ in self.columns]
+
+    def select(self, fields: Optional[Iterable[str]]) -> List[Tuple[str, str, str]]:
+        """The selected columns in dataset order; raises ValueError for unknown names."""
+        selected = set(fields or ())
+        if not selected:
+            return self.columns
+        unknown = selected - set(self.column_names)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return [column for column in self.columns if column[0] in selected]
+
+    def projection(self, columns: List[Tuple[str, str, str]]) -> dict:
+        return {self.time_field: 1, **{path: 1 for _, path, _ in columns}}
+
+    def rows(self, doc: dict, columns: List[Tuple[str, str, str]]) -> List[dict]:
+        if self.unwind is None:
+            return [{name: _convert(_lookup(doc, path), kind) for name, path, kind in columns}]
+        prefix = f"{self.unwind}."
+        rows = []
+        for element in doc.get(self.unwind) or []:
+            rows.append({
+                name: _convert(_lookup(element, path[len(prefix):]) if path.startswith(prefix) else _lookup(doc, path), kind)
+                for name, path, kind in columns
+            })
+        return rows
+
+
+DATASETS: Dict[str, Dataset] = {
+    "tasks": Dataset("tasks", "updated_at", "store_id", [
+        ("id", "id", "str"),
+        ("store_id", "store_id", "str"),
+        ("status", "status", "str"),
+        ("type", "type", "str"),
+        ("priority", "priority", "str"),
+        ("assigned_to", "assigned_to", "str"),
+        ("estimated_time", "estimated_time", "int"),
+        ("urgency_score", "urgency_score", "float"),
+        ("product.sku", "product.sku", "str"),
+        ("product.name", "product.name", "str"),
+        ("product.category", "product.category", "str"),
+        ("product.aisle", "product.aisle", "str"),
+        ("product.shelf", "product.shelf", "str"),
+        ("product.current_stock", "product.current_stock", "int"),
+        ("product.max_capacity", "product.max_capacity", "int"),
+        ("product.status", "product.status", "str"),
+        ("product.sales_velocity", "product.sales_velocity", "float"),
+        ("product.revenue_impact", "product.revenue_impact", "float"),
+        ("backroom_location", "backroom_location", "str"),
+        ("transfer_store", "transfer_store", "str"),
+        ("image_session_id", "image_session_id", "str"),
+        ("version", "version", "int"),
+        ("created_at", "created_at", "datetime"),
+        ("updated_at", "updated_at", "datetime"),
+    ]),
+    "scans": Dataset(SCANS_COLLECTION, "created_at", "store_id", [
+        ("scan_id", "id", "str"),
+        ("store_id", "store_id", "str"),
+        ("aisle", "aisle", "str"),
+        ("shelf", "shelf", "str"),
+        ("scanned_by", "scanned_by", "str"),
+        ("accepted", "accepted", "bool"),
+        ("scan_confidence", "confidence", "float"),
+        ("created_at", "created_at", "datetime"),
+        ("sku", "readings.sku", "str"),
+        ("name", "readings.name", "str"),
+        ("count", "readings.count", "int"),
+        ("gap_detected", "readings.gap_detected", "bool"),
+        ("confidence", "readings.confidence", "float"),
+    ], unwind="readings"),
+    "stock": Dataset(RAW_COLLECTION, "ts", "meta.store_id", [
+        ("store_id", "meta.store_id", "str"),
+        ("sku", "meta.sku", "str"),
+        ("level", "level", "int"),
+        ("ts", "ts", "datetime"),
+    ]),
+}
+
+_KINDS = {"str": str, "int": int, "float": float, "bool": bool, "datetime": lambda value: value}
+
+
+def _lookup(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _convert(value, kind: str):
+    return None if value is None else _KINDS[kind](value)
+
+
+def encode_cursor(ts: datetime, object_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{object_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Raises ValueError for a cursor that was not produced by an export."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, object_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), ObjectId(object_id)
+    except (ValueError, UnicodeDecodeError, InvalidId):
+        raise ValueError(f"Invalid export cursor: {cursor!r}")
+
+
+def export_query(dataset: Dataset, store_ids: Optional[List[str]] = None, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, after: Optional[str] = None) -> dict:
+    clauses = []
+    if store_ids:
+        clauses.append({dataset.store_field: {"$in": list(store_ids)}})
+    time_range = {}
+    if start is not None:
+        time_range["$gte"] = to_utc_naive(start)
+    if end is not None:
+        time_range["$lt"] = to_utc_naive(end)
+    if time_range:
+        clauses.append({dataset.time_field: time_range})
+    if after:
+        ts, object_id = decode_cursor(after)
+        clauses.append({"$or": [
+            {dataset.time_field: {"$gt": ts}},
+            {dataset.time_field: ts, "_id": {"$gt": object_id}},
+        ]})
+    return {"$and": clauses} if clauses else {}
+
+
+async def _merged(cursors: list, key: Callable[[dict], tuple]) -> AsyncIterator[dict]:
+    """Documents of several cursors, each already sorted by `key`, in one sorted sequence."""
+    if len(cursors) == 1:
+        async for doc in cursors[0]:
+            yield doc
+        return
+    heap = []
+
+    async def advance(i: int) -> None:
+        try:
+            doc = await cursors[i].__anext__()
+        except StopAsyncIteration:
+            return
+        heapq.heappush(heap, (key(doc), i, doc))
+
+    for i in range(len(cursors)):
+        await advance(i)
+    while heap:
+        _, i, doc = heapq.heappop(heap)
+        yield doc
+        await advance(i)
+
+
+async def export_batches(db, dataset: Dataset, columns: List[Tuple[str, str, str]], store_ids: Optional[List[str]] = None,
+                         start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         after: Optional[str] = None, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[dict]]:
+    """Yield lists of flat rows, each with its export_cursor, in (time, _id) order.
+
+    `db` may be a list of store shard databases; their documents are merged into one ordered stream.
+    A document's rows are never split across batches, so the last cursor of a batch is a safe resume point.
+    """
+    query = export_query(dataset, store_ids, start, end, after)
+    cursors = [
+        store_db[dataset.collection].find(query, dataset.projection(columns))
+        .sort([(dataset.time_field, 1), ("_id", 1)]).batch_size(batch_size)
+        for store_db in (db if isinstance(db, list) else [db])
+    ]
+    batch: List[dict] = []
+    async for doc in _merged(cursors, key=lambda doc: (doc[dataset.time_field], doc["_id"])):
+        token = encode_cursor(doc[dataset.time_field], doc["_id"])
+        for row in dataset.rows(doc, columns):
+            row[CURSOR_COLUMN] = token
+            batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+class CsvEncoder:
+    def __init__(self, columns: List[Tuple[str, str, str]], header: bool = True):
+        self.names = [name for name, _, _ in columns] + [CURSOR_COLUMN]
+        self._header = header
+
+    def encode(self, rows: List[dict]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, self.names, extrasaction="ignore")
+        if self._header:
+            writer.writeheader()
+            self._header = False
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+
+    def close(self) -> bytes:
+        return b"" if not self._header else ",".join(self.names).encode() + b"\r\n"
+
+
+class NdjsonEncoder:
+    def __init__(self, columns: List[Tuple[str, str, str]], header: bool = True):
+        self.names = [name for name, _, _ in columns] + [CURSOR_COLUMN]
+
+    def encode(self, rows: List[dict]) -> bytes:
+        return "".join(json.dumps(row, default=_json_default, separators=(",", ":")) + "\n" for row in rows).encode()
+
+    def close(self) -> bytes:
+        return b""
+
+
+class ArrowEncoder:
+    """Arrow IPC stream: the schema, then one record batch per export batch."""
+
+    TYPES = {"str": "string", "int": "int64", "float": "float64", "bool": "bool_"}
+
+    def __init__(self, columns: List[Tuple[str, str, str]], header: bool = True):
+        if pa is None:
+            raise RuntimeError("Arrow export needs the pyarrow package")
+        fields = [
+            pa.field(name, pa.timestamp("ms") if kind == "datetime" else getattr(pa, self.TYPES[kind])())
+            for name, _, kind in columns
+        ]
+        self.schema = pa.schema(fields + [pa.field(CURSOR_COLUMN, pa.string())])
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def encode(self, rows: List[dict]) -> bytes:
+        self._writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=self.schema))
+        return self._drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "arrow": ArrowEncoder}
+
+
+def format_available(fmt: str) -> bool:
+    return fmt != "arrow" or pa is not None
+
+
+async def stream_export(db, dataset: Dataset, columns: List[Tuple[str, str, str]], fmt: str,
+                        **filters) -> AsyncIterator[bytes]:
+    """Encoded export, one chunk per batch; stops early (resumable from the last cursor) on a read error."""
+    encoder = ENCODERS[fmt](columns)
+    rows = 0
+    try:
+        async for batch in export_batches(db, dataset, columns, **filters):
+            rows += len(batch)
+            yield encoder.encode(batch)
+    except Exception as e:
+        logger.error(f"Export of {dataset.collection} stopped after {rows} rows: {e}")
+        raise
+    yield encoder.close()
+    logger.info("Exported %d rows from %s as %s", rows, dataset.collection, fmt)
+
+
+async def create_export_indexes(db) -> None:
+    await db.tasks.create_index([("store_id", 1), ("updated_at", 1), ("_id", 1)])
+    await db[SCANS_COLLECTION].create_index([("store_id", 1), ("created_at", 1), ("_id", 1)])
+    await db[RAW_COLLECTION].create_index([("meta.store_id", 1), ("ts", 1)])
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Export tasks, scan readings or raw stock readings straight from MongoDB.
+
+Streams the export in batches to a CSV, NDJSON or Arrow IPC file. After each
+batch is written, the cursor of its last row is saved next to the output
+(`<out>.cursor`), so an interrupted export can be continued with --resume:
+CSV and NDJSON output is appended to, and Arrow output goes to a new
+`<out>.partN` file since an Arrow stream cannot be reopened for appending.
+With STORE_SHARDS set, the shards are read together and merged in order.
+
+Usage:
+    python export_data.py tasks --store STORE001 --start 2024-01-01 --format csv --out tasks.csv
+    python export_data.py stock --format arrow --out stock.arrow --resume
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from database import analytics_read_preference, close_mongo_connection, connect_to_mongo, get_database, store_databases
+from export import DATASETS, ENCODERS, format_available, export_batches
+
+
+def output_path(out: str, fmt: str, resume: bool) -> str:
+    if not (resume and fmt == "arrow" and os.path.exists(out)):
+        return out
+    part = 1
+    while os.path.exists(f"{out}.part{part}"):
+        part += 1
+    return f"{out}.part{part}"
+
+
+async def run(args) -> int:
+    dataset = DATASETS[args.dataset]
+    columns = dataset.select(name.strip() for name in (args.fields or "").split(",") if name.strip())
+    cursor_path = f"{args.out}.cursor"
+    after = None
+    if args.resume and os.path.exists(cursor_path):
+        with open(cursor_path) as f:
+            after = f.read().strip() or None
+    elif os.path.exists(cursor_path):
+        os.remove(cursor_path)
+    appending = after is not None and args.format != "arrow" and os.path.exists(args.out)
+    path = output_path(args.out, args.format, after is not None)
+
+    encoder = ENCODERS[args.format](columns, header=not appending)
+    await connect_to_mongo()
+    if args.store:
+        databases = list({id(db): db for db in [await get_database(store_id) for store_id in args.store]}.values())
+    else:
+        databases = store_databases()
+    databases = [db.with_options(read_preference=analytics_read_preference()) for db in databases]
+    rows = 0
+    with open(path, "ab" if appending else "wb") as out:
+        async for batch in export_batches(databases, dataset, columns, store_ids=args.store, start=args.start,
+                                          end=args.end, after=after, batch_size=args.batch_size):
+            out.write(encoder.encode(batch))
+            out.flush()
+            with open(cursor_path, "w") as f:
+                f.write(batch[-1]["export_cursor"])
+            rows += len(batch)
+            print(f"\r{rows:,} rows", end="", file=sys.stderr)
+        out.write(encoder.close())
+    await close_mongo_connection()
+    print(f"\rExported {rows:,} rows to {path}" + (" (resumed)" if after else ""), file=sys.stderr)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a ShelfMind export from MongoDB to a file")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--format", choices=sorted(ENCODERS), default="csv")
+    parser.add_argument("--store", action="append", help="Store id to export (repeatable; default all stores)")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Only records at or after this UTC time")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Only records before this UTC time")
+    parser.add_argument("--fields", help="Comma-separated columns to export")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--resume", action="store_true", help="Continue from the cursor saved by an earlier run")
+    args = parser.parse_args()
+    if not format_available(args.format):
+        parser.error("Arrow export needs the pyarrow package")
+    try:
+        asyncio.run(run(args))
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Seasonal demand forecasts per SKU.
+
+A flat sales velocity cannot tell that milk sells three times faster at 6pm
+than at 6am. A nightly job fits a demand model for every SKU of a store from
+the last FORECAST_HISTORY_DAYS of hourly stock rollups:
+
+    units sold per hour = mean + hour_of_day[h] + weekday[d]
+
+The effects are fitted by ridge regression (regularized least squares) on
+one-hot hour and weekday features, centred on the SKU's mean rate, so SKUs
+with little history shrink towards a flat velocity. Hours without readings
+are left out rather than counted as hours without sales. The features only
+depend on time, so all SKUs of a store are fitted at once: every SKU's normal
+equations come from one matrix product of the observed-hours mask with the
+hour-of-week indicators, and are solved as one batched linear solve in the
+scheduler's process pool.
+
+Memory stays bounded however many SKUs a store has: the job works through
+the store's SKUs in blocks of FORECAST_BLOCK_SKUS, reading each block's
+history from the rollup cursor in batches straight into (hours x SKUs)
+arrays, and fitting it with float32 temporaries.
+
+A store's model is a header document (demand_models) and one document per
+block (demand_model_blocks) holding the block's SKUs and a float32 array of
+32 coefficients per SKU (mean, 24 hour effects, 7 weekday effects), so no
+document nears the 16 MB limit. A refit writes a new generation of blocks
+and then switches the header to it. Workers cache the model as a table of
+the forecast rate for each of the 168 hours of the week, so the velocity of
+a SKU at a given time is one array read. Hours are store-local,
+FORECAST_UTC_OFFSET_HOURS from UTC.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bson import Binary
+from pymongo import ASCENDING
+
+from change_feed import change_feed
+from database import get_analytics_database, get_database
+from lazy_imports import lazy_import
+from timeseries import ROLLUP_COLLECTIONS, RESOLUTIONS, bucket_start
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", 28))
+FORECAST_RIDGE_ALPHA = float(os.getenv("FORECAST_RIDGE_ALPHA", 2.0))
+FORECAST_HORIZON_HOURS = int(os.getenv("FORECAST_HORIZON_HOURS", 48))  # time to empty is capped here
+FORECAST_UTC_OFFSET_HOURS = int(os.getenv("FORECAST_UTC_OFFSET_HOURS", 0))
+FORECAST_BLOCK_SKUS = int(os.getenv("FORECAST_BLOCK_SKUS", 4000))  # SKUs loaded, solved and stored together
+FORECAST_LOAD_BATCH = 10_000  # rollup documents read per cursor batch
+FORECAST_MISS_CACHE_SECONDS = float(os.getenv("FORECAST_MISS_CACHE_SECONDS", 300))  # recheck stores without a model
+
+MODELS_COLLECTION = "demand_models"
+MODEL_BLOCKS_COLLECTION = "demand_model_blocks"
+HOURS_PER_WEEK = 168
+COEFFICIENTS = 1 + 24 + 7  # mean, hour of day, weekday
+_EPOCH = datetime(1970, 1, 1)  # a Thursday
+
+
+def local_hour(at: datetime) -> int:
+    """Store-local hours since the epoch."""
+    return int((at - _EPOCH).total_seconds() // 3600) + FORECAST_UTC_OFFSET_HOURS
+
+
+def week_slot(hours):
+    """Hour of the week, Monday 00:00 first, of store-local epoch hours."""
+    return (hours + 3 * 24) % HOURS_PER_WEEK
+
+
+def features(hours) -> np.ndarray:
+    """One-hot hour-of-day and weekday features of store-local epoch hours, (T, 31)."""
+    slots = week_slot(np.asarray(hours))
+    x = np.zeros((len(slots), COEFFICIENTS - 1))
+    rows = np.arange(len(slots))
+    x[rows, slots % 24] = 1.0
+    x[rows, 24 + slots // 24] = 1.0
+    return x
+
+
+def fit_demand(first_hour: int, sold: np.ndarray, observed: np.ndarray, alpha: float = FORECAST_RIDGE_ALPHA) -> np.ndarray:
+    """Ridge fit of every SKU of a store at once; runs in the scheduler's process pool.
+
+    `sold` and `observed` are (T, S): units sold by each SKU in T consecutive hours starting at
+    store-local epoch hour `first_hour`, and whether the SKU had readings in the hour.
+    Returns (S, COEFFICIENTS) float32 coefficients. SKUs are solved FORECAST_BLOCK_SKUS at a time.
+    """
+    hours, skus = sold.shape
+    slots = np.zeros((hours, HOURS_PER_WEEK), dtype=np.float32)
+    slots[np.arange(hours), week_slot(np.arange(first_hour, first_hour + hours))] = 1.0
+    coefficients = np.empty((skus, COEFFICIENTS), dtype=np.float32)
+    for start in range(0, skus, FORECAST_BLOCK_SKUS):
+        block = slice(start, start + FORECAST_BLOCK_SKUS)
+        coefficients[block] = _fit_block(slots, sold[:, block], observed[:, block], alpha)
+    return coefficients
+
+
+def _fit_block(slots: np.ndarray, sold: np.ndarray, observed: np.ndarray, alpha: float) -> np.ndarray:
+    # The (T, S) temporaries are float32: counts are exact, and sums of hourly units lose nothing that matters
+    skus = sold.shape[1]
+    mask = observed.astype(np.float32)
+    n = mask.sum(axis=0, dtype=np.float64)
+    mean = np.divide((sold * mask).sum(axis=0, dtype=np.float64), n, out=np.zeros(skus), where=n > 0)
+    residual = (sold - mean.astype(np.float32)) * mask
+
+    # Features are one-hot, so each SKU's X' diag(mask) X only holds its observed-hour counts per hour of
+    # the week: hour-of-day and weekday totals on the diagonal, the (weekday, hour) counts off it
+    counts = (mask.T @ slots).astype(np.float64).reshape(skus, 7, 24)
+    k = COEFFICIENTS - 1
+    gram = np.zeros((skus, k, k))
+    diagonal = np.arange(k)
+    gram[:, diagonal, diagonal] = np.hstack([counts.sum(axis=1), counts.sum(axis=2)]) + alpha
+    gram[:, 24:, :24] = counts
+    gram[:, :24, 24:] = counts.transpose(0, 2, 1)
+    rhs = (residual.T @ slots).astype(np.float64).reshape(skus, 7, 24)
+    rhs = np.hstack([rhs.sum(axis=1), rhs.sum(axis=2)])
+    effects = np.linalg.solve(gram, rhs[:, :, None])[:, :, 0]
+    return np.hstack([mean[:, None], effects]).astype(np.float32)
+
+
+class DemandModel:
+    """A store's fitted demand forecasts, as a table of hourly rates over the week."""
+
+    def __init__(self, skus: List[str], coefficients: np.ndarray, fitted_at: Optional[datetime] = None):
+        self.rows: Dict[str, int] = {sku: i for i, sku in enumerate(skus)}
+        self.coefficients = coefficients
+        self.fitted_at = fitted_at
+        slots = np.arange(HOURS_PER_WEEK)
+        self.weekly = np.maximum(
+            coefficients[:, :1] + coefficients[:, 1 + slots % 24] + coefficients[:, 25 + slots // 24], 0.0
+        )
+
+    def __contains__(self, sku: str) -> bool:
+        return sku in self.rows
+
+    def velocity(self, sku: str, at: datetime) -> float:
+        """Forecast units sold per hour at `at`."""
+        return float(self.weekly[self.rows[sku], week_slot(local_hour(at))])
+
+    def rates(self, sku: str, at: datetime, hours: int) -> np.ndarray:
+        """Forecast units per hour for the `hours` hours starting with the one holding `at`."""
+        return self.weekly[self.rows[sku], week_slot(local_hour(at) + np.arange(hours))]
+
+    def time_to_empty(self, sku: str, level: float, at: datetime) -> float:
+        """Hours until `level` units sell at the forecast rates, at most FORECAST_HORIZON_HOURS."""
+        if level <= 0:
+            return 0.0
+        rates = self.rates(sku, at, FORECAST_HORIZON_HOURS)
+        durations = np.ones(FORECAST_HORIZON_HOURS)
+        durations[0] = 1.0 - (at - bucket_start(at, RESOLUTIONS["1h"])).total_seconds() / 3600
+        sold = np.cumsum(rates * durations)
+        hour = int(np.searchsorted(sold, level))
+        if hour >= FORECAST_HORIZON_HOURS:
+            return float(FORECAST_HORIZON_HOURS)
+        before = sold[hour - 1] if hour else 0.0
+        return float(durations[:hour].sum() + (level - before) / rates[hour])
+
+    @classmethod
+    def from_documents(cls, header: dict, blocks: List[dict]) -> "DemandModel":
+        """Model from its header and block documents, in block order."""
+        skus = [sku for block in blocks for sku in block["skus"]]
+        coefficients = np.frombuffer(b"".join(block["coefficients"] for block in blocks), dtype="<f4")
+        return cls(skus, coefficients.reshape(len(skus), COEFFICIENTS), header.get("fitted_at"))
+
+
+def forecast_demand(model: Optional[DemandModel], sku: str, level: int, velocity: float,
+                    at: datetime) -> Tuple[float, float]:
+    """(velocity, time to empty) of a SKU at `at`: from the model if it has the SKU, else from the flat `velocity`.
+
+    Without a model or any sales, a stocked shelf never empties (inf) and an empty one already has (0).
+    """
+    if model is not None and sku in model:
+        return model.velocity(sku, at), model.time_to_empty(sku, level, at)
+    return velocity, level / velocity if velocity > 0 else (0.0 if level <= 0 else float("inf"))
+
+
+def history_window(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """The whole hours a fit reads: FORECAST_HISTORY_DAYS up to the current, incomplete hour."""
+    end = bucket_start(now or datetime.utcnow(), RESOLUTIONS["1h"])
+    return end - timedelta(days=FORECAST_HISTORY_DAYS), end
+
+
+async def list_demand_skus(store_id: str, now: Optional[datetime] = None) -> List[str]:
+    """SKUs of a store with sales history in the window, sorted."""
+    db = await get_analytics_database(store_id)
+    start, end = history_window(now)
+    skus = await db[ROLLUP_COLLECTIONS["1h"]].distinct("sku", {"store_id": store_id, "bucket": {"$gte": start, "$lt": end}})
+    return sorted(skus)
+
+
+async def load_demand_history(store_id: str, skus: List[str], now: Optional[datetime] = None):
+    """Hourly units sold by `skus` over the history window: (first hour, sold, observed)."""
+    db = await get_analytics_database(store_id)
+    start, end = history_window(now)
+    hours = int((end - start).total_seconds() // 3600)
+    columns = {sku: i for i, sku in enumerate(skus)}
+    sold = np.zeros((hours, len(skus)), dtype=np.float32)
+    observed = np.zeros((hours, len(skus)), dtype=bool)
+    cursor = db[ROLLUP_COLLECTIONS["1h"]].find(
+        {"store_id": store_id, "sku": {"$in": skus}, "bucket": {"$gte": start, "$lt": end}},
+        {"_id": 0, "sku": 1, "bucket": 1, "depleted_units": 1},
+        batch_size=FORECAST_LOAD_BATCH,
+    )
+    while True:
+        batch = await cursor.to_list(length=FORECAST_LOAD_BATCH)
+        if not batch:
+            break
+        rows = np.fromiter((int((doc["bucket"] - start).total_seconds() // 3600) for doc in batch), np.int64, len(batch))
+        cols = np.fromiter((columns[doc["sku"]] for doc in batch), np.int64, len(batch))
+        sold[rows, cols] = np.fromiter((doc.get("depleted_units", 0) for doc in batch), np.float32, len(batch))
+        observed[rows, cols] = True
+    return local_hour(start), sold, observed
+
+
+async def save_demand_model(store_id: str, blocks: List[Tuple[List[str], np.ndarray]]) -> DemandModel:
+    """Store a fitted model given as (SKUs, coefficients) per block, and make it the store's current one."""
+    fitted_at = datetime.utcnow()
+    generation = uuid.uuid4().hex
+    db = await get_database(store_id)
+    await db[MODEL_BLOCKS_COLLECTION].insert_many([
+        {
+            "store_id": store_id,
+            "generation": generation,
+            "block": i,
+            "skus": skus,
+            "coefficients": Binary(coefficients.astype("<f4").tobytes()),
+        }
+        for i, (skus, coefficients) in enumerate(blocks)
+    ])
+    await db[MODELS_COLLECTION].replace_one(
+        {"store_id": store_id},
+        {"store_id": store_id, "generation": generation, "blocks": len(blocks), "fitted_at": fitted_at},
+        upsert=True,
+    )
+    await db[MODEL_BLOCKS_COLLECTION].delete_many({"store_id": store_id, "generation": {"$ne": generation}})
+
+    skus = [sku for block_skus, _ in blocks for sku in block_skus]
+    model = DemandModel(skus, np.vstack([coefficients for _, coefficients in blocks]), fitted_at)
+    _model_cache[store_id] = model
+    _model_misses.pop(store_id, None)
+    await change_feed.publish("demand_models", store_id)
+    logger.info("Fitted demand model of %s for %d SKUs in %d blocks", store_id, len(skus), len(blocks))
+    return model
+
+
+# Loaded models keyed by store_id, and when stores without one were last checked (monotonic seconds)
+_model_cache: Dict[str, DemandModel] = {}
+_model_misses: Dict[str, float] = {}
+
+
+def forget_demand_model(store_id: Optional[str] = None) -> None:
+    """Drop a store's (or every store's) cached model after another worker refitted it."""
+    if store_id is None:
+        _model_cache.clear()
+        _model_misses.clear()
+    else:
+        _model_cache.pop(store_id, None)
+        _model_misses.pop(store_id, None)
+
+
+change_feed.subscribe("demand_models", forget_demand_model)
+
+
+async def get_demand_model(store_id: str) -> Optional[DemandModel]:
+    """Cached demand model of a store, loaded from the database on first use.
+
+    A store without a model is checked again after FORECAST_MISS_CACHE_SECONDS, so a model fitted on another
+    worker is picked up even if its change-feed message was missed.
+    """
+    model = _model_cache.get(store_id)
+    if model is not None:
+        return model
+    checked = _model_misses.get(store_id)
+    if checked is not None and time.monotonic() - checked < FORECAST_MISS_CACHE_SECONDS:
+        return None
+    db = await get_database(store_id)
+    model = None
+    for _ in range(2):  # a refit may replace the blocks between reading the header and reading them
+        header = await db[MODELS_COLLECTION].find_one({"store_id": store_id})
+        if header is None:
+            break
+        blocks = await db[MODEL_BLOCKS_COLLECTION].find(
+            {"store_id": store_id, "generation": header.get("generation")}
+        ).sort("block", 1).to_list(length=None)
+        if len(blocks) == header.get("blocks"):
+            model = DemandModel.from_documents(header, blocks)
+            break
+    else:
+        logger.warning("Demand model of %s is incomplete; using flat velocities until the next fit", store_id)
+    if model is None:
+        _model_misses[store_id] = time.monotonic()
+    else:
+        _model_cache[store_id] = model
+        _model_misses.pop(store_id, None)
+    return model
+
+
+async def create_forecast_indexes(db) -> None:
+    await db[MODELS_COLLECTION].create_index("store_id", unique=True)
+    await db[MODEL_BLOCKS_COLLECTION].create_index(
+        [("store_id", ASCENDING), ("generation", ASCENDING), ("block", ASCENDING)], unique=True
+    )
@@ -0,0 +1,119 @@
+"""
+Background jobs registered with the scheduler.
+
+- store-partials (per store, every PARTIAL_REFRESH_SECONDS): recompute each
+  store's partial aggregate so regional rollups rarely wait on a refresh.
+- rollup-retention (singleton, nightly): delete fine-grained stock rollups
+  past their retention.
+- index-maintenance (singleton, weekly): re-apply the index definitions, so
+  indexes added in a release appear without a manual migration.
+- transition-compaction (singleton, nightly): fold months of task transitions
+  past their raw retention into per-store replay snapshots.
+- active-count-reconcile (singleton, nightly): recount each associate's
+  in-progress tasks for the team leaderboard, repairing counter drift.
+- demand-forecast (per store, nightly): refit the store's seasonal demand
+  model from its hourly stock rollups; the fit runs in the process pool.
+"""
+
+import logging
+import os
+
+from backroom import create_backroom_indexes
+from database import create_indexes, fan_out, get_database
+from export import create_export_indexes
+from forecast import (
+    FORECAST_BLOCK_SKUS, create_forecast_indexes, fit_demand, list_demand_skus, load_demand_history, save_demand_model
+)
+from planogram import create_planogram_indexes
+from rollups import compute_store_partial, create_region_indexes, create_rollup_indexes
+from scans import create_scan_indexes
+from scheduler import CronTrigger, IntervalTrigger, scheduler
+from sync import create_sync_indexes
+from team_stats import create_team_stats_indexes, reconcile_active_counts
+from timeseries import create_stock_collections, sweep_rollups
+from transitions import compact_transitions, create_transition_indexes, transition_log
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+PARTIAL_REFRESH_SECONDS = int(os.getenv("PARTIAL_REFRESH_SECONDS", 240))
+ROLLUP_RETENTION_CRON = os.getenv("ROLLUP_RETENTION_CRON", "15 3 * * *")
+INDEX_MAINTENANCE_CRON = os.getenv("INDEX_MAINTENANCE_CRON", "30 4 * * 0")
+TRANSITION_COMPACTION_CRON = os.getenv("TRANSITION_COMPACTION_CRON", "45 2 * * *")
+ACTIVE_RECONCILE_CRON = os.getenv("ACTIVE_RECONCILE_CRON", "0 3 * * *")
+DEMAND_FORECAST_CRON = os.getenv("DEMAND_FORECAST_CRON", "30 1 * * *")
+
+
+async def refresh_store_partial(store_id: str) -> None:
+    await compute_store_partial(store_id)
+
+
+async def sweep_stock_rollups() -> None:
+    deleted = await fan_out(sweep_rollups)
+    logger.info("Rollup retention sweep deleted %s", deleted)
+
+
+# Collections and indexes of each store database, created at startup and by index-maintenance
+STORE_INDEX_CREATORS = (
+    create_stock_collections,
+    create_planogram_indexes,
+    create_rollup_indexes,
+    create_sync_indexes,
+    create_backroom_indexes,
+    create_scan_indexes,
+    create_export_indexes,
+    create_transition_indexes,
+    create_team_stats_indexes,
+    create_forecast_indexes,
+)
+
+
+async def create_store_indexes(db) -> None:
+    for create in STORE_INDEX_CREATORS:
+        await create(db)
+
+
+async def maintain_indexes() -> None:
+    await create_indexes()
+    await create_region_indexes(await get_database())
+    await fan_out(create_store_indexes)
+
+
+async def compact_task_transitions() -> None:
+    compacted = await compact_transitions()
+    if compacted:
+        logger.info("Compacted %d months of task transitions", compacted)
+
+
+async def reconcile_active_task_counts() -> None:
+    await transition_log.flush()  # pending gauge deltas would otherwise be applied on top of the recount
+    counted = await fan_out(reconcile_active_counts)
+    logger.info("Recounted in-progress tasks of %d associates", sum(counted))
+
+
+async def refit_demand_model(store_id: str) -> None:
+    skus = await list_demand_skus(store_id)
+    if not skus:
+        return
+    # One block of SKUs in memory at a time, however many the store has
+    blocks = []
+    for start in range(0, len(skus), FORECAST_BLOCK_SKUS):
+        block = skus[start:start + FORECAST_BLOCK_SKUS]
+        first_hour, sold, observed = await load_demand_history(store_id, block)
+        blocks.append((block, await scheduler.run_in_process(fit_demand, first_hour, sold, observed)))
+    await save_demand_model(store_id, blocks)
+
+
+def register_jobs() -> None:
+    scheduler.add_job("store-partials", refresh_store_partial, IntervalTrigger(PARTIAL_REFRESH_SECONDS),
+                      jitter=30, mode="per_store", timeout=120)
+    scheduler.add_job("rollup-retention", sweep_stock_rollups, CronTrigger(ROLLUP_RETENTION_CRON),
+                      jitter=60, mode="singleton")
+    scheduler.add_job("index-maintenance", maintain_indexes, CronTrigger(INDEX_MAINTENANCE_CRON),
+                      jitter=60, mode="singleton")
+    scheduler.add_job("transition-compaction", compact_task_transitions, CronTrigger(TRANSITION_COMPACTION_CRON),
+                      jitter=60, mode="singleton")
+    scheduler.add_job("active-count-reconcile", reconcile_active_task_counts, CronTrigger(ACTIVE_RECONCILE_CRON),
+                      jitter=60, mode="singleton")
+    scheduler.add_job("demand-forecast", refit_demand_model, CronTrigger(DEMAND_FORECAST_CRON),
+                      jitter=300, mode="per_store", timeout=600)
@@ -0,0 +1,32 @@
+"""
+Deferred imports for heavy subsystems.
+
+NumPy, pyarrow and httpx together add a large share of the app's import time,
+yet most requests never touch them. `lazy_import` returns a module whose code
+only runs on first attribute access, so a cold start pays for them on the
+first request that needs them instead. Annotations naming lazy modules must
+not be evaluated at import (`from __future__ import annotations`).
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Optional
+
+
+def lazy_import(name: str, optional: bool = False) -> Optional[ModuleType]:
+    """Module `name`, loaded on first use; None when `optional` and it is not installed."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        if optional:
+            return None
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
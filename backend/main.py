@@ -1,7 +1,8 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import os
+import asyncio
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 
@@ -9,17 +10,74 @@ from contextlib import asynccontextmanager
 load_dotenv()
 
 # Import database functions
-from database import connect_to_mongo, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, forget_store_versions, get_database, store_databases
+from timeseries import stock_writer
+from blob_store import image_store
+from catalog import product_catalog
+from planogram import forget_planograms
+from backroom import backroom_inventory
+from forecast import forget_demand_model
+from rollups import create_region_indexes, get_all_store_ids
+from transitions import transition_log
+from change_feed import change_feed, create_change_feed_indexes
+from scheduler import scheduler, create_scheduler_indexes
+from jobs import create_store_indexes, register_jobs
+from partitioning import HashRing, store_partitioner, route_to_store_owner, create_partitioning_indexes, ForwardedResponse
+from compression import CompressionMiddleware
+from profiling import ProfilingMiddleware, profiler
 
 # Import routers
 from routers.auth import router as auth_router
+from routers.stock import router as stock_router
+from routers.images import router as images_router
+from routers.planograms import router as planograms_router
+from routers.catalog import router as catalog_router
+from routers.regions import router as regions_router
+from routers.tasks import router as tasks_router
+from routers.predictions import router as predictions_router
+from routers.sync import router as sync_router
+from routers.backroom import router as backroom_router
+from routers.scans import router as scans_router
+from routers.exports import router as exports_router
+from routers.admin import router as admin_router
+
+def hand_off_stores(old: HashRing, new: HashRing) -> None:
+    """Stores changed owner: drop cached per-store state, which may have missed changes made by the previous owner."""
+    forget_store_versions()
+    forget_planograms()
+    forget_demand_model()
+    backroom_inventory.invalidate()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    for store_db in store_databases():
+        await create_store_indexes(store_db)
+    db = await get_database()
+    await create_region_indexes(db)
+    await create_change_feed_indexes(db)
+    await change_feed.start(db)
+    await create_scheduler_indexes(db)
+    register_jobs()
+    await scheduler.start(db, get_all_store_ids, store_partitioner.is_local)
+    await create_partitioning_indexes(db)
+    store_partitioner.on_rebalance(hand_off_stores)
+    await store_partitioner.start(db)
+    await stock_writer.start()
+    await transition_log.start()
+    profiler.start()
+    catalog_load = asyncio.create_task(product_catalog.load_if_present())
     yield
     # Shutdown
+    catalog_load.cancel()
+    await store_partitioner.stop()
+    await scheduler.stop()
+    await change_feed.stop()
+    await stock_writer.stop()
+    await transition_log.stop()
+    profiler.stop()
+    image_store.shutdown()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -45,8 +103,33 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Compress large responses (br/gzip) for mobile clients
+app.add_middleware(CompressionMiddleware)
+
+# Slow-request tracking and on-demand profiling; outermost so it times the whole request
+app.add_middleware(ProfilingMiddleware)
+
+# Requests carrying per-store state are served by the worker that owns the store
+@app.exception_handler(ForwardedResponse)
+async def forwarded_response_handler(request, exc: ForwardedResponse):
+    return exc.response
+
+store_routed = [Depends(route_to_store_owner)]
+
 # Include routers
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
+app.include_router(stock_router, prefix="/api/stock", tags=["Stock"], dependencies=store_routed)
+app.include_router(images_router, prefix="/api/images", tags=["Images"])
+app.include_router(planograms_router, prefix="/api/planograms", tags=["Planograms"])
+app.include_router(catalog_router, prefix="/api/catalog", tags=["Catalog"])
+app.include_router(regions_router, prefix="/api/regions", tags=["Regions"])
+app.include_router(tasks_router, prefix="/api/tasks", tags=["Tasks"], dependencies=store_routed)
+app.include_router(predictions_router, prefix="/api/predictions", tags=["Predictions"], dependencies=store_routed)
+app.include_router(sync_router, prefix="/api/sync", tags=["Sync"], dependencies=store_routed)
+app.include_router(backroom_router, prefix="/api/backroom", tags=["Backroom"], dependencies=store_routed)
+app.include_router(scans_router, prefix="/api/scans", tags=["Scans"], dependencies=store_routed)
+app.include_router(exports_router, prefix="/api/exports", tags=["Exports"])
+app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
 
 @app.get("/")
 async def root():
@@ -15,6 +15,65 @@ from .user import (
     RegisterRequest,
     RegisterResponse
 )
+from .stock import (
+    StockReading,
+    StockReadingBatch,
+    StockIngestResponse,
+    StockHistoryPoint,
+    StockHistoryResponse,
+    StockTrendResponse,
+    ForecastPoint,
+    StockForecastResponse
+)
+from .image import ImageUploadResponse
+from .scan import BoundingBox, DetectedProduct, ScanCreate, ScanDiff, ScanResult
+from .planogram import (
+    PlanogramSlot,
+    PlanogramUpload,
+    PlanogramSummary,
+    PlanogramMatchRequest,
+    SlotShortage,
+    SkuFacings,
+    PlanogramMatchResponse
+)
+from .catalog import (
+    CatalogProduct,
+    CatalogSearchResponse,
+    CatalogReloadRequest,
+    CatalogStatus
+)
+from .region import (
+    AtRiskSku,
+    StoreRollupSummary,
+    RegionRollupResponse,
+    RegionStoresUpdate
+)
+from .task import (
+    Product,
+    TaskCreate,
+    TaskUpdate,
+    TaskResponse,
+    TaskTransition,
+    AssociateTimings,
+    ProductivityResponse,
+    LeaderboardEntry,
+    LeaderboardResponse
+)
+from .prediction import LossBand, AisleLoss, SkuLoss, LostSalesResponse
+from .sync import TaskMutation, SyncRequest, MutationResult, SyncResponse
+from .backroom import (
+    BackroomCount,
+    BackroomBulkLoad,
+    BackroomLoadSummary,
+    BackroomReceive,
+    BackroomPick,
+    BackroomStock,
+    BackroomLocations,
+    ReplenishmentNeed,
+    ReplenishmentPlanRequest,
+    ReplenishmentPlan,
+    ReplenishmentPlanResponse
+)
 
 __all__ = [
     "UserBase",
@@ -24,5 +83,62 @@ __all__ = [
     "Token",
     "TokenData",
     "RegisterRequest",
-    "RegisterResponse"
+    "RegisterResponse",
+    "StockReading",
+    "StockReadingBatch",
+    "StockIngestResponse",
+    "StockHistoryPoint",
+    "StockHistoryResponse",
+    "StockTrendResponse",
+    "ForecastPoint",
+    "StockForecastResponse",
+    "ImageUploadResponse",
+    "BoundingBox",
+    "DetectedProduct",
+    "ScanCreate",
+    "ScanDiff",
+    "ScanResult",
+    "PlanogramSlot",
+    "PlanogramUpload",
+    "PlanogramSummary",
+    "PlanogramMatchRequest",
+    "SlotShortage",
+    "SkuFacings",
+    "PlanogramMatchResponse",
+    "CatalogProduct",
+    "CatalogSearchResponse",
+    "CatalogReloadRequest",
+    "CatalogStatus",
+    "AtRiskSku",
+    "StoreRollupSummary",
+    "RegionRollupResponse",
+    "RegionStoresUpdate",
+    "Product",
+    "TaskCreate",
+    "TaskUpdate",
+    "TaskResponse",
+    "TaskTransition",
+    "AssociateTimings",
+    "ProductivityResponse",
+    "LeaderboardEntry",
+    "LeaderboardResponse",
+    "LossBand",
+    "AisleLoss",
+    "SkuLoss",
+    "LostSalesResponse",
+    "TaskMutation",
+    "SyncRequest",
+    "MutationResult",
+    "SyncResponse",
+    "BackroomCount",
+    "BackroomBulkLoad",
+    "BackroomLoadSummary",
+    "BackroomReceive",
+    "BackroomPick",
+    "BackroomStock",
+    "BackroomLocations",
+    "ReplenishmentNeed",
+    "ReplenishmentPlanRequest",
+    "ReplenishmentPlan",
+    "ReplenishmentPlanResponse"
 ]
\ No newline at end of file
@@ -0,0 +1,56 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Literal
+
+# Pydantic models for backroom inventory
+class BackroomCount(BaseModel):
+    bay: str = Field(min_length=1, max_length=20)  # e.g. "A3"
+    level: str = Field(min_length=1, max_length=20)  # e.g. "T1"
+    sku: str
+    quantity: int = Field(ge=0)
+
+class BackroomBulkLoad(BaseModel):
+    counts: List[BackroomCount] = Field(max_length=200000)
+
+class BackroomLoadSummary(BaseModel):
+    sku_count: int
+    location_count: int
+    total_units: int
+
+class BackroomReceive(BaseModel):
+    sku: str
+    bay: str = Field(min_length=1, max_length=20)
+    level: str = Field(min_length=1, max_length=20)
+    quantity: int = Field(gt=0)
+
+class BackroomPick(BaseModel):
+    sku: str
+    quantity: int = Field(gt=0)
+    location: Optional[str] = None  # picked from the best location when omitted
+
+class BackroomStock(BaseModel):
+    sku: str
+    location: str
+    quantity: int
+
+class BackroomLocations(BaseModel):
+    sku: str
+    total: int
+    locations: Dict[str, int]
+
+class ReplenishmentNeed(BaseModel):
+    sku: str
+    units_needed: int = Field(gt=0)
+
+class ReplenishmentPlanRequest(BaseModel):
+    items: List[ReplenishmentNeed] = Field(max_length=5000)
+
+class ReplenishmentPlan(BaseModel):
+    sku: str
+    units_needed: int
+    type: Literal['restock', 'transfer']
+    backroom_location: Optional[str] = None
+    backroom_available: int
+    short_by: int
+
+class ReplenishmentPlanResponse(BaseModel):
+    plans: List[ReplenishmentPlan]
@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+# Pydantic models for the product catalog
+class CatalogProduct(BaseModel):
+    sku: str
+    name: str
+    category: str
+    unit_price: float
+    image_url: Optional[str] = None
+
+class CatalogSearchResponse(BaseModel):
+    query: str
+    results: List[CatalogProduct]
+
+class CatalogReloadRequest(BaseModel):
+    path: Optional[str] = None  # relative to DATA_DIR, defaults to CATALOG_FILE
+
+class CatalogStatus(BaseModel):
+    sku_count: int
+    category_count: int
+    skipped_count: int = 0  # records of the source file left out as invalid
+    source: Optional[str] = None
+    loaded_at: datetime
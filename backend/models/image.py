@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from typing import Dict
+
+# Pydantic models for uploaded scan images
+class ImageUploadResponse(BaseModel):
+    id: str  # "<sha256>.<ext>", also the path segment under /api/images
+    url: str
+    thumbnail_urls: Dict[str, str]
+    size: int
+    content_type: str
+    deduplicated: bool
@@ -0,0 +1,50 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+from .scan import DetectedProduct
+
+# Pydantic models for planograms (expected shelf layouts)
+class PlanogramSlot(BaseModel):
+    shelf: str
+    slot: int
+    sku: str
+    x: float
+    y: float
+    width: float = Field(gt=0)
+    height: float = Field(gt=0)
+    facings: int = Field(default=1, ge=0)
+
+class PlanogramUpload(BaseModel):
+    slots: List[PlanogramSlot] = Field(min_length=1, max_length=50000)
+
+class PlanogramSummary(BaseModel):
+    aisle: str
+    slot_count: int
+    shelves: List[str]
+    updated_at: Optional[datetime] = None
+
+class PlanogramMatchRequest(BaseModel):
+    detections: List[DetectedProduct] = Field(max_length=10000)
+
+class SlotShortage(BaseModel):
+    sku: str
+    shelf: str
+    slot: int
+    expected_facings: int
+    actual_facings: int
+    message: str
+
+class SkuFacings(BaseModel):
+    sku: str
+    expected_facings: int
+    actual_facings: int
+    shortfall: int
+    misplaced: int  # detections of this SKU found in another SKU's slot
+
+class PlanogramMatchResponse(BaseModel):
+    aisle: str
+    matched: int
+    unmatched: int
+    skus: List[SkuFacings]
+    shortages: List[SlotShortage]
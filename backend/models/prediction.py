@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from typing import List
+
+# Pydantic models for lost-sales predictions
+class LossBand(BaseModel):
+    expected_loss: float
+    low: float  # 5th percentile
+    high: float  # 95th percentile
+
+class AisleLoss(LossBand):
+    aisle: str
+
+class SkuLoss(LossBand):
+    sku: str
+    name: str
+    aisle: str
+    stockout_probability: float
+
+class LostSalesResponse(BaseModel):
+    store_id: str
+    horizon_hours: float
+    scenarios: int
+    sku_count: int
+    simulation_ms: float
+    store: LossBand
+    aisles: List[AisleLoss]
+    skus: List[SkuLoss]
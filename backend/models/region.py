@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from datetime import datetime
+
+# Pydantic models for multi-store regional rollups
+class AtRiskSku(BaseModel):
+    store_id: str
+    sku: str
+    name: str
+    category: Optional[str] = None
+    level: int
+    time_to_empty: float  # hours
+    predicted_lost_sales: float
+    priority: Literal['critical', 'high', 'medium']
+
+class StoreRollupSummary(BaseModel):
+    store_id: str
+    computed_at: datetime
+    osa: float  # on-shelf availability, 0..1
+    predicted_lost_sales: float
+    at_risk_count: int
+
+class RegionRollupResponse(BaseModel):
+    region: str
+    store_count: int
+    computed_at: datetime
+    oldest_partial_at: Optional[datetime] = None
+    osa: float
+    predicted_lost_sales: float
+    at_risk_count: int
+    at_risk_skus: List[AtRiskSku]
+    stores: List[StoreRollupSummary]
+
+class RegionStoresUpdate(BaseModel):
+    store_ids: List[str] = Field(min_length=1, max_length=1000)
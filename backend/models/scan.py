@@ -0,0 +1,45 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+from .task import TaskResponse
+
+# Pydantic models for shelf scan detections
+class BoundingBox(BaseModel):
+    x: float
+    y: float
+    width: float = Field(ge=0)
+    height: float = Field(ge=0)
+
+class DetectedProduct(BaseModel):
+    sku: str
+    name: str
+    count: int = Field(ge=0)
+    confidence: float = Field(ge=0, le=1)
+    gap_detected: bool
+    position: BoundingBox
+
+class ScanCreate(BaseModel):
+    aisle: str
+    shelf: str
+    image_url: Optional[str] = None
+    processing_time: Optional[float] = Field(default=None, ge=0)  # seconds
+    detected_products: List[DetectedProduct] = Field(max_length=1000)
+
+class ScanDiff(BaseModel):
+    previous_scan_id: Optional[str] = None
+    unchanged: int  # SKUs skipped: same as the last accepted scan, or changed but needing no task
+    created: List[str]  # SKUs that got a new task
+    updated: List[str]  # SKUs whose open task was updated in place
+    resolved: List[str]  # SKUs with an open task that no longer need attention
+    missing: List[str]  # SKUs in the last accepted scan but not in this one
+
+class ScanResult(BaseModel):
+    id: str
+    aisle: str
+    shelf: str
+    confidence: float
+    accepted: bool
+    created_at: datetime
+    diff: Optional[ScanDiff] = None
+    tasks: List[TaskResponse]  # tasks created or updated by this scan
@@ -0,0 +1,47 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from datetime import datetime
+
+# Pydantic models for stock-level time series
+class StockReading(BaseModel):
+    sku: str
+    level: int = Field(ge=0)
+    timestamp: Optional[datetime] = None
+
+class StockReadingBatch(BaseModel):
+    readings: List[StockReading] = Field(min_length=1, max_length=10000)
+
+class StockIngestResponse(BaseModel):
+    accepted: int
+
+class StockHistoryPoint(BaseModel):
+    timestamp: datetime
+    count: int
+    mean: float
+    min: int
+    max: int
+    last: int
+
+class StockHistoryResponse(BaseModel):
+    sku: str
+    resolution: Literal['raw', '1m', '1h', '1d']
+    points: List[StockHistoryPoint]
+
+class StockTrendResponse(BaseModel):
+    sku: str
+    trend: Literal['up', 'down', 'stable']
+    slope_per_hour: float
+    velocity: float  # units sold per hour
+    current_level: Optional[int] = None
+    last_restocked: Optional[datetime] = None
+
+class ForecastPoint(BaseModel):
+    timestamp: datetime  # start of the hour (UTC)
+    velocity: float  # forecast units sold per hour
+
+class StockForecastResponse(BaseModel):
+    sku: str
+    fitted_at: Optional[datetime] = None
+    current_level: Optional[int] = None
+    time_to_empty: Optional[float] = None  # hours at the forecast rates, from the current level
+    points: List[ForecastPoint]
@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from datetime import datetime
+
+from models.task import TaskPriority, TaskResponse, TaskStatus
+
+# Pydantic models for offline sync
+class TaskMutation(BaseModel):
+    idempotency_key: str = Field(min_length=1, max_length=128)  # generated by the device, reused on retry
+    task_id: str
+    status: Optional[TaskStatus] = None
+    priority: Optional[TaskPriority] = None
+    assigned_to: Optional[str] = None
+    occurred_at: Optional[datetime] = None  # when the change was made on the device (UTC)
+
+class SyncRequest(BaseModel):
+    last_version: int = Field(0, ge=0)  # highest change version the device has seen
+    mutations: List[TaskMutation] = Field(default_factory=list, max_length=1000)
+
+class MutationResult(BaseModel):
+    idempotency_key: str
+    task_id: str
+    result: Literal['applied', 'duplicate', 'not_found', 'rejected', 'conflict']
+
+class SyncResponse(BaseModel):
+    results: List[MutationResult]
+    changes: List[TaskResponse]
+    version: int  # pass as last_version on the next sync
+    has_more: bool
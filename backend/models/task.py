@@ -0,0 +1,90 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from datetime import datetime
+
+TaskType = Literal['restock', 'transfer', 'audit']
+TaskPriority = Literal['high', 'medium', 'low']
+TaskStatus = Literal['pending', 'in_progress', 'completed', 'not_found', 'on_hold']
+
+# Pydantic models for products and replenishment tasks
+class Product(BaseModel):
+    id: str
+    name: str
+    sku: str
+    current_stock: int
+    max_capacity: int
+    category: str
+    aisle: str
+    shelf: str
+    last_restocked: Optional[str] = None
+    trend: Literal['up', 'down', 'stable'] = 'stable'
+    status: Literal['healthy', 'low', 'critical', 'out']
+    sales_velocity: float  # units per hour
+    time_to_empty: float  # hours until OOS
+    revenue_impact: float  # $ per hour if OOS
+    backroom_location: Optional[str] = None
+    nearby_stores: Optional[List[str]] = None
+    image_url: Optional[str] = None
+
+class TaskCreate(BaseModel):
+    product: Product
+    type: TaskType
+    priority: TaskPriority
+    assigned_to: Optional[str] = None
+    estimated_time: int = Field(ge=0)  # minutes
+    urgency_score: float
+    instructions: Optional[str] = None
+    backroom_location: Optional[str] = None
+    transfer_store: Optional[str] = None
+    image_session_id: Optional[str] = None
+
+class TaskUpdate(BaseModel):
+    expected_version: int = Field(ge=0)  # the task's `version` as last seen by the client
+    status: Optional[TaskStatus] = None
+    priority: Optional[TaskPriority] = None
+    assigned_to: Optional[str] = None
+
+class TaskResponse(TaskCreate):
+    id: str
+    product_id: str
+    store_id: str
+    status: TaskStatus
+    created_at: datetime
+    updated_at: datetime
+    version: int = 0  # store change version of the last change to this task
+
+class TaskTransition(BaseModel):
+    from_status: Optional[TaskStatus] = None  # None when the task was created
+    to_status: TaskStatus
+    user_id: Optional[str] = None
+    timestamp: datetime
+
+class AssociateTimings(BaseModel):
+    user_id: str
+    completed: int
+    not_found: int
+    on_hold: int
+    avg_pickup_minutes: Optional[float] = None  # task creation to in_progress
+    avg_work_minutes: Optional[float] = None  # in_progress to completed or not_found
+
+class ProductivityResponse(BaseModel):
+    store_id: str
+    compacted_through: Optional[datetime] = None  # transitions before this are folded into the totals
+    tasks_by_status: dict
+    associates: List[AssociateTimings]
+
+class LeaderboardEntry(BaseModel):
+    user_id: str
+    name: Optional[str] = None
+    completed: int
+    active: int  # tasks in progress now, whatever the window
+    not_found: int
+    on_hold: int
+    avg_completion_minutes: Optional[float] = None  # in_progress to completed
+    revenue_protected: float  # summed hourly revenue impact of completed tasks
+
+class LeaderboardResponse(BaseModel):
+    store_id: str
+    start: datetime
+    end: datetime
+    associates: List[LeaderboardEntry]
@@ -0,0 +1,222 @@
+"""
+Store ownership across worker processes.
+
+Each worker announces itself in the cluster_members collection with the URL
+it serves on and a heartbeat. All workers build the same consistent-hash ring
+from the live members, with VNODES virtual nodes per worker, and map every
+store_id to one owner. When a worker joins or stops heartbeating, the ring is
+rebuilt and only the stores on its arcs change owner.
+
+The ring decides store ownership: requests are served by the owner, and
+per-store scheduler jobs run on it (the scheduler's per-store lease only
+keeps two workers from running a store while their rings disagree).
+Listeners registered with `on_rebalance` are called with the old and new
+ring, so per-store caches can be dropped when their store changes owner.
+
+Store-scoped requests that arrive at a worker which does not own the store are
+forwarded to the owner. A forwarded request is always served where it lands,
+and if the owner cannot be reached it is served locally, since all state is in
+Mongo anyway.
+
+Partitioning is off unless PARTITIONING_ENABLED is set. Several local
+processes can form a cluster: give each its own port and WORKER_URL, e.g.
+`PARTITIONING_ENABLED=true WORKER_URL=http://127.0.0.1:8001 uvicorn main:app --port 8001`.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from fastapi import Depends, Request, Response
+from pymongo.errors import PyMongoError
+
+from auth import get_current_active_user
+from change_feed import change_feed
+from lazy_imports import lazy_import
+
+httpx = lazy_import("httpx")  # only needed once requests are forwarded
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+PARTITIONING_ENABLED = os.getenv("PARTITIONING_ENABLED", "false").lower() == "true"
+WORKER_URL = os.getenv("WORKER_URL", "http://127.0.0.1:8000")
+VNODES = int(os.getenv("PARTITION_VNODES", 64))
+HEARTBEAT_SECONDS = float(os.getenv("PARTITION_HEARTBEAT_SECONDS", 3))
+MEMBER_TIMEOUT_SECONDS = float(os.getenv("PARTITION_MEMBER_TIMEOUT_SECONDS", 10))
+FORWARD_TIMEOUT_SECONDS = float(os.getenv("PARTITION_FORWARD_TIMEOUT_SECONDS", 10))
+
+MEMBERS_COLLECTION = "cluster_members"
+FORWARDED_HEADER = "X-ShelfMind-Forwarded-By"
+
+# Hop-by-hop and re-encoded headers that must not be copied between hops
+_SKIP_HEADERS = {"host", "content-length", "transfer-encoding", "connection", "content-encoding", "keep-alive"}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes."""
+
+    def __init__(self, members: Iterable[str] = (), vnodes: int = VNODES):
+        self.members = sorted(set(members))
+        self.vnodes = vnodes
+        points = sorted((_hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[i]
+
+
+class ForwardedResponse(Exception):
+    """Raised by the routing dependency with the owner's response."""
+
+    def __init__(self, response: Response):
+        self.response = response
+
+
+class StorePartitioner:
+    def __init__(self):
+        self.worker_id = change_feed.worker_id
+        self.url = WORKER_URL.rstrip("/")
+        self.ring = HashRing([self.worker_id])
+        self.urls: Dict[str, str] = {self.worker_id: self.url}
+        self.forwarded = 0
+        self.forward_failures = 0
+        self.rebalances = 0
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._listeners: List[Callable[[HashRing, HashRing], None]] = []
+
+    def on_rebalance(self, listener: Callable[[HashRing, HashRing], None]) -> None:
+        """Call `listener(old_ring, new_ring)` whenever ownership changes."""
+        self._listeners.append(listener)
+
+    def owner(self, store_id: str) -> str:
+        return self.ring.owner(store_id) or self.worker_id
+
+    def is_local(self, store_id: str) -> bool:
+        return not PARTITIONING_ENABLED or self.owner(store_id) == self.worker_id
+
+    async def start(self, db) -> None:
+        if not PARTITIONING_ENABLED:
+            return
+        self._db = db
+        self._client = httpx.AsyncClient(timeout=FORWARD_TIMEOUT_SECONDS)
+        await self._heartbeat()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Partitioning enabled: worker %s at %s", self.worker_id, self.url)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            # Leave promptly so the other workers take over our stores without waiting for a timeout
+            try:
+                await self._db[MEMBERS_COLLECTION].delete_one({"_id": self.worker_id})
+            except PyMongoError:
+                pass
+            self._db = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                await self._heartbeat()
+            except PyMongoError as e:
+                logger.error(f"Partition heartbeat failed: {e}")
+
+    async def _heartbeat(self) -> None:
+        now = datetime.utcnow()
+        await self._db[MEMBERS_COLLECTION].update_one(
+            {"_id": self.worker_id}, {"$set": {"url": self.url, "last_seen": now}}, upsert=True
+        )
+        cutoff = now - timedelta(seconds=MEMBER_TIMEOUT_SECONDS)
+        urls = {doc["_id"]: doc["url"] async for doc in self._db[MEMBERS_COLLECTION].find({"last_seen": {"$gte": cutoff}})}
+        urls[self.worker_id] = self.url
+        self.urls = urls
+        if sorted(urls) != self.ring.members:
+            self._rebalance(HashRing(urls))
+
+    def _rebalance(self, ring: HashRing) -> None:
+        joined = set(ring.members) - set(self.ring.members)
+        left = set(self.ring.members) - set(ring.members)
+        old, self.ring = self.ring, ring
+        self.rebalances += 1
+        logger.info("Rebalanced stores over %d workers (joined: %s, left: %s)",
+                    len(ring.members), sorted(joined) or "-", sorted(left) or "-")
+        for listener in self._listeners:
+            try:
+                listener(old, ring)
+            except Exception as e:
+                logger.error(f"Rebalance listener failed: {e}")
+
+    async def forward(self, request: Request, owner: str) -> Optional[Response]:
+        """Replay a request on the owning worker; None when the owner is unreachable."""
+        url = self.urls.get(owner)
+        if url is None or self._client is None:
+            return None
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in _SKIP_HEADERS}
+        headers[FORWARDED_HEADER] = self.worker_id
+        target = f"{url}{request.url.path}"
+        if request.url.query:
+            target += f"?{request.url.query}"
+        try:
+            upstream = await self._client.request(request.method, target, headers=headers, content=await request.body())
+        except httpx.HTTPError as e:
+            self.forward_failures += 1
+            logger.warning(f"Could not forward to {owner} at {url}, serving locally: {e}")
+            return None
+        self.forwarded += 1
+        response_headers = {k: v for k, v in upstream.headers.items() if k.lower() not in _SKIP_HEADERS}
+        response_headers["X-ShelfMind-Served-By"] = owner
+        return Response(content=upstream.content, status_code=upstream.status_code, headers=response_headers)
+
+    def stats(self, store_ids: Iterable[str] = ()) -> dict:
+        return {
+            "enabled": PARTITIONING_ENABLED,
+            "worker_id": self.worker_id,
+            "members": [{"worker_id": member, "url": self.urls.get(member)} for member in self.ring.members],
+            "vnodes": self.ring.vnodes,
+            "rebalances": self.rebalances,
+            "forwarded": self.forwarded,
+            "forward_failures": self.forward_failures,
+            "owners": {store_id: self.owner(store_id) for store_id in store_ids},
+        }
+
+
+# Process-wide partitioner
+store_partitioner = StorePartitioner()
+
+
+async def route_to_store_owner(request: Request, current_user: dict = Depends(get_current_active_user)) -> None:
+    """Router dependency: forward the request to the worker that owns the user's store."""
+    store_id = current_user["store_id"]
+    if store_partitioner.is_local(store_id) or FORWARDED_HEADER.lower() in request.headers:
+        return
+    response = await store_partitioner.forward(request, store_partitioner.owner(store_id))
+    if response is not None:
+        raise ForwardedResponse(response)
+
+
+async def create_partitioning_indexes(db) -> None:
+    await db[MEMBERS_COLLECTION].create_index("last_seen", expireAfterSeconds=int(MEMBER_TIMEOUT_SECONDS * 6))
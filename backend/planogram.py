@@ -0,0 +1,233 @@
+"""
+Planogram index for matching shelf scan detections to slots.
+
+An aisle's planogram is a set of rectangular slots grouped into shelves. The
+index keeps the slots as NumPy arrays sorted by (shelf band, left edge): a
+static interval index where each shelf is a band on the y axis and its slots
+are disjoint intervals on the x axis. A whole scan is matched in one batch by
+locating each box centre with two `searchsorted` calls. `validate_slots`
+checks that a layout has that shape before it is saved.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from change_feed import change_feed
+from database import get_database
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+PLANOGRAM_COLLECTION = "planograms"
+
+
+def validate_slots(slots: List[dict]) -> None:
+    """Raise ValueError unless slot numbers are unique per shelf, slots on a shelf do not overlap
+    horizontally, and shelf bands do not overlap vertically; touching edges are fine."""
+    seen = set()
+    for slot in slots:
+        key = (slot["shelf"], slot["slot"])
+        if key in seen:
+            raise ValueError(f"Duplicate slot {slot['slot']} on shelf {slot['shelf']}")
+        seen.add(key)
+
+    # Sorted by left edge, a slot overlaps another on its shelf exactly when it starts before the
+    # furthest right edge seen so far
+    by_shelf: Dict[str, List[dict]] = {}
+    for slot in slots:
+        by_shelf.setdefault(slot["shelf"], []).append(slot)
+    for shelf, shelf_slots in by_shelf.items():
+        shelf_slots.sort(key=lambda s: s["x"])
+        right = shelf_slots[0]
+        for slot in shelf_slots[1:]:
+            if slot["x"] < right["x"] + right["width"]:
+                raise ValueError(f"Slots {right['slot']} and {slot['slot']} overlap on shelf {shelf}")
+            if slot["x"] + slot["width"] > right["x"] + right["width"]:
+                right = slot
+
+    # Same sweep over shelf bands on the y axis
+    bands = sorted(
+        (min(s["y"] for s in shelf_slots), max(s["y"] + s["height"] for s in shelf_slots), shelf)
+        for shelf, shelf_slots in by_shelf.items()
+    )
+    lowest = bands[0] if bands else None
+    for band in bands[1:]:
+        if band[0] < lowest[1]:
+            raise ValueError(f"Shelves {lowest[2]} and {band[2]} overlap")
+        if band[1] > lowest[1]:
+            lowest = band
+
+
+class PlanogramIndex:
+    """Immutable slot index for one aisle."""
+
+    def __init__(self, aisle: str, slots: List[dict], updated_at: Optional[datetime] = None):
+        self.aisle = aisle
+        self.updated_at = updated_at
+        n = len(slots)
+        x0 = np.fromiter((s["x"] for s in slots), dtype=np.float64, count=n)
+        y0 = np.fromiter((s["y"] for s in slots), dtype=np.float64, count=n)
+        x1 = x0 + np.fromiter((s["width"] for s in slots), dtype=np.float64, count=n)
+        y1 = y0 + np.fromiter((s["height"] for s in slots), dtype=np.float64, count=n)
+
+        # Shelf bands, ordered top to bottom
+        shelf_top: Dict[str, float] = {}
+        for s in slots:
+            shelf_top[s["shelf"]] = min(shelf_top.get(s["shelf"], s["y"]), s["y"])
+        shelf_names = sorted(shelf_top, key=shelf_top.get)
+        shelf_of = {name: i for i, name in enumerate(shelf_names)}
+        shelf_rank = np.fromiter((shelf_of[s["shelf"]] for s in slots), dtype=np.int64, count=n)
+        self.shelf_names = shelf_names
+        self.shelf_y0 = np.full(len(shelf_names), np.inf)
+        self.shelf_y1 = np.full(len(shelf_names), -np.inf)
+        np.minimum.at(self.shelf_y0, shelf_rank, y0)
+        np.maximum.at(self.shelf_y1, shelf_rank, y1)
+
+        # One sorted key per slot: shelf rank * stride + left edge
+        self.x_min = float(x0.min()) if n else 0.0
+        self.stride = float(x1.max() - self.x_min + 1.0) if n else 1.0
+        keys = shelf_rank * self.stride + (x0 - self.x_min)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.slot_shelf = shelf_rank[order]
+        self.slot_x1 = x1[order]
+        self.slot_y0 = y0[order]
+        self.slot_y1 = y1[order]
+
+        ordered = [slots[i] for i in order]
+        self.slot_numbers = [s["slot"] for s in ordered]
+        self.sku_names = sorted({s["sku"] for s in slots})
+        sku_of = {sku: i for i, sku in enumerate(self.sku_names)}
+        self.sku_index = sku_of
+        self.slot_sku = np.fromiter((sku_of[s["sku"]] for s in ordered), dtype=np.int64, count=n)
+        self.slot_facings = np.fromiter((s.get("facings", 1) for s in ordered), dtype=np.int64, count=n)
+
+    @property
+    def slot_count(self) -> int:
+        return len(self.keys)
+
+    def locate(self, cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        """Slot position for each point, or -1 where the point falls outside every slot."""
+        rank = np.searchsorted(self.shelf_y0, cy, side="right") - 1
+        in_shelf = (rank >= 0) & (cy < self.shelf_y1[np.clip(rank, 0, None)])
+
+        idx = np.searchsorted(self.keys, rank * self.stride + (cx - self.x_min), side="right") - 1
+        safe = np.clip(idx, 0, None)
+        hit = (in_shelf & (idx >= 0) & (self.slot_shelf[safe] == rank) & (cx < self.slot_x1[safe])
+               & (cy >= self.slot_y0[safe]) & (cy < self.slot_y1[safe]))  # slots may be shorter than their shelf
+        return np.where(hit, idx, -1)
+
+    def match(self, detections: List[dict]) -> dict:
+        """Match a scan's detections against the slots and report facings per SKU."""
+        n = len(detections)
+        if n:
+            boxes = np.array(
+                [(d["position"]["x"], d["position"]["y"], d["position"]["width"], d["position"]["height"])
+                 for d in detections],
+                dtype=np.float64,
+            )
+            counts = np.fromiter((d["count"] for d in detections), dtype=np.int64, count=n)
+            detected_sku = np.fromiter((self.sku_index.get(d["sku"], -1) for d in detections),
+                                       dtype=np.int64, count=n)
+            slot = self.locate(boxes[:, 0] + boxes[:, 2] / 2, boxes[:, 1] + boxes[:, 3] / 2)
+        else:
+            counts = detected_sku = slot = np.empty(0, dtype=np.int64)
+
+        matched = slot >= 0
+        correct = matched & (detected_sku == self.slot_sku[np.clip(slot, 0, None)])
+
+        slots = self.slot_count
+        skus = len(self.sku_names)
+        actual_per_slot = np.bincount(slot[correct], weights=counts[correct], minlength=slots).astype(np.int64)
+        expected_per_sku = np.bincount(self.slot_sku, weights=self.slot_facings, minlength=skus).astype(np.int64)
+        actual_per_sku = np.bincount(self.slot_sku, weights=actual_per_slot, minlength=skus).astype(np.int64)
+        misplaced_mask = matched & ~correct & (detected_sku >= 0)
+        misplaced_per_sku = np.bincount(detected_sku[misplaced_mask], weights=counts[misplaced_mask],
+                                        minlength=skus).astype(np.int64)
+
+        sku_report = [
+            {
+                "sku": self.sku_names[i],
+                "expected_facings": int(expected_per_sku[i]),
+                "actual_facings": int(actual_per_sku[i]),
+                "shortfall": int(max(expected_per_sku[i] - actual_per_sku[i], 0)),
+                "misplaced": int(misplaced_per_sku[i]),
+            }
+            for i in range(skus)
+        ]
+
+        shortages = []
+        for i in np.flatnonzero(actual_per_slot < self.slot_facings):
+            sku = self.sku_names[self.slot_sku[i]]
+            shelf = self.shelf_names[self.slot_shelf[i]]
+            number = self.slot_numbers[i]
+            shortages.append({
+                "sku": sku,
+                "shelf": shelf,
+                "slot": number,
+                "expected_facings": int(self.slot_facings[i]),
+                "actual_facings": int(actual_per_slot[i]),
+                "message": f"SKU {sku} is short at aisle {self.aisle} shelf {shelf} slot {number}",
+            })
+
+        return {
+            "aisle": self.aisle,
+            "matched": int(matched.sum()),
+            "unmatched": int(n - matched.sum()),
+            "skus": sku_report,
+            "shortages": shortages,
+        }
+
+
+# Built indexes, keyed by (store_id, aisle)
+_index_cache: Dict[Tuple[str, str], PlanogramIndex] = {}
+
+
+async def save_planogram(store_id: str, aisle: str, slots: List[dict]) -> PlanogramIndex:
+    """Replace the planogram of an aisle and rebuild its index; raises ValueError for an invalid layout."""
+    validate_slots(slots)
+    updated_at = datetime.utcnow()
+    index = PlanogramIndex(aisle, slots, updated_at)
+    db = await get_database(store_id)
+    await db[PLANOGRAM_COLLECTION].update_one(
+        {"store_id": store_id, "aisle": aisle},
+        {"$set": {"slots": slots, "shelves": index.shelf_names, "slot_count": index.slot_count,
+                  "updated_at": updated_at}},
+        upsert=True,
+    )
+    _index_cache[(store_id, aisle)] = index
+    await change_feed.publish("planograms", store_id)
+    return index
+
+
+def forget_planograms(store_id: Optional[str] = None) -> None:
+    """Drop a store's (or every store's) cached aisle indexes after another worker changed them."""
+    for key in [key for key in _index_cache if store_id is None or key[0] == store_id]:
+        _index_cache.pop(key, None)
+
+
+change_feed.subscribe("planograms", forget_planograms)
+
+
+async def get_planogram_index(store_id: str, aisle: str) -> Optional[PlanogramIndex]:
+    """Cached index for an aisle, loaded from the database on first use."""
+    cached = _index_cache.get((store_id, aisle))
+    if cached is not None:
+        return cached
+
+    db = await get_database(store_id)
+    doc = await db[PLANOGRAM_COLLECTION].find_one({"store_id": store_id, "aisle": aisle})
+    if doc is None:
+        return None
+    index = PlanogramIndex(aisle, doc["slots"], doc.get("updated_at"))
+    _index_cache[(store_id, aisle)] = index
+    return index
+
+
+async def create_planogram_indexes(db) -> None:
+    await db[PLANOGRAM_COLLECTION].create_index([("store_id", 1), ("aisle", 1)], unique=True)
@@ -0,0 +1,311 @@
+"""
+On-demand sampling profiler and slow-request tracking.
+
+A sampler thread looks at the event loop thread at a fixed interval. During a
+profile session it records the loop thread's stack on every tick, either for
+a number of seconds or only while the loop is running one of the next K
+requests whose path starts with a given prefix. Stacks are returned in the
+collapsed format flame graph tools read: one `root;...;leaf count` line per
+distinct stack. Sampling never touches the loop itself, so a profile also
+shows code that blocks it.
+
+With PROFILING_ENABLED, every request that runs longer than SLOW_REQUEST_MS
+is sampled while it is still in flight: the loop thread's stack when the
+request is the one running, otherwise the chain of coroutines it is suspended
+in (typically awaiting MongoDB). Mongo commands issued on behalf of each
+request are recorded through pymongo command monitoring. Slow requests are
+kept in a bounded in-memory log for the admin API. Without it the sampler
+thread is not started, and slow requests are only logged.
+
+Work a request hands to other tasks (e.g. coalesced queries) is not attributed
+to it.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 120))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 1000))
+SLOW_SAMPLE_INTERVAL_MS = float(os.getenv("SLOW_SAMPLE_INTERVAL_MS", 50))
+SLOW_REQUEST_LOG_SIZE = int(os.getenv("SLOW_REQUEST_LOG_SIZE", 100))
+# Long by design: streamed exports and the profile endpoint itself
+SLOW_REQUEST_IGNORE = [p.strip() for p in os.getenv("SLOW_REQUEST_IGNORE", "/api/exports,/api/admin/profile").split(",") if p.strip()]
+MAX_STACK_DEPTH = 64
+MAX_COMMANDS_PER_REQUEST = 50
+TOP_SLOW_STACKS = 20
+
+
+def _label(code, lineno: Optional[int] = None) -> str:
+    where = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno if lineno is None else lineno}"
+    return f"{code.co_name} ({where})"
+
+
+def thread_stack(frame) -> List[str]:
+    """Labels of a thread's frames, outermost first."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def coroutine_stack(task: asyncio.Task) -> List[str]:
+    """Labels of the coroutines a suspended task is awaiting through, outermost first."""
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None and len(labels) < MAX_STACK_DEPTH:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            if not hasattr(awaitable, "cr_await") and not hasattr(awaitable, "gi_yieldfrom"):
+                labels.append(f"<{type(awaitable).__name__}>")  # the future it is waiting on
+            break
+        labels.append(_label(frame.f_code, frame.f_lineno))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return labels
+
+
+def collapse(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class RequestRecord:
+    def __init__(self, method: str, path: str, task: Optional[asyncio.Task]):
+        self.method = method
+        self.path = path
+        self.task = task
+        self.started = time.perf_counter()
+        self.started_at = datetime.utcnow()
+        self.status: Optional[int] = None
+        self.profiled = False  # counted by the running profile session
+        self.stacks: Counter = Counter()
+        self.commands: List[dict] = []
+        self.pending_commands: Dict[int, dict] = {}
+
+    def as_dict(self, duration_ms: float) -> dict:
+        samples = sum(self.stacks.values())
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(duration_ms, 1),
+            "samples": samples,
+            "stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(TOP_SLOW_STACKS)],
+            "mongo_commands": self.commands,
+        }
+
+
+_current_request: contextvars.ContextVar[Optional[RequestRecord]] = contextvars.ContextVar("profiled_request", default=None)
+
+
+class _CommandRecorder(monitoring.CommandListener):
+    """Attributes Mongo commands to the request they run for (motor copies the context to its threads)."""
+
+    def started(self, event):
+        record = _current_request.get()
+        if record is not None and len(record.commands) + len(record.pending_commands) < MAX_COMMANDS_PER_REQUEST:
+            target = event.command.get(event.command_name)
+            record.pending_commands[event.request_id] = {
+                "command": event.command_name,
+                "database": event.database_name,
+                "collection": target if isinstance(target, str) else event.command.get("collection"),  # getMore
+            }
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+    def _finish(self, event, failed: bool) -> None:
+        record = _current_request.get()
+        command = record.pending_commands.pop(event.request_id, None) if record is not None else None
+        if command is not None:
+            command["duration_ms"] = round(event.duration_micros / 1000, 2)
+            command["failed"] = failed
+            record.commands.append(command)
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class ProfileSession:
+    def __init__(self, route: Optional[str], requests: Optional[int]):
+        self.route = route
+        self.remaining = requests
+        self.tasks: Counter = Counter()  # tasks running matching requests, with how many each
+        self.stacks: Counter = Counter()
+        self.matched = 0
+        self.started = time.perf_counter()
+        self.done = asyncio.Event()
+
+
+class Profiler:
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, slow_ms: float = SLOW_REQUEST_MS,
+                 slow_interval_ms: float = SLOW_SAMPLE_INTERVAL_MS, log_size: int = SLOW_REQUEST_LOG_SIZE):
+        self.interval = interval_ms / 1000
+        self.slow_seconds = slow_ms / 1000
+        self.slow_interval = slow_interval_ms / 1000
+        self.slow_requests = deque(maxlen=log_size)
+        self.session: Optional[ProfileSession] = None
+        self._inflight: Dict[int, RequestRecord] = {}
+        self._inflight_lock = threading.Lock()  # the sampler thread reads it while the loop changes it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._slow_total = 0
+
+    def start(self) -> None:
+        """Start the sampler thread when PROFILING_ENABLED; call from the event loop."""
+        if PROFILING_ENABLED and self._thread is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval if self.session is not None else self.slow_interval):
+            try:
+                self._sample()
+            except Exception as e:  # the sampler must never die; frames can vanish while being read
+                logger.debug(f"Profiler sample failed: {e}")
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        running = asyncio.current_task(self._loop)
+        session = self.session
+        loop_stack = None
+        if session is not None and frame is not None and (session.route is None or running in session.tasks):
+            loop_stack = ";".join(thread_stack(frame))
+            session.stacks[loop_stack] += 1
+
+        now = time.perf_counter()
+        with self._inflight_lock:
+            inflight = list(self._inflight.values())
+        for record in inflight:
+            if now - record.started < self.slow_seconds or record.task is None:
+                continue
+            if record.task is running and frame is not None:
+                stack = loop_stack or ";".join(thread_stack(frame))
+            else:
+                stack = ";".join(coroutine_stack(record.task))
+            if stack:
+                record.stacks[stack] += 1
+
+    async def profile(self, seconds: Optional[float] = None, route: Optional[str] = None,
+                      requests: Optional[int] = None) -> dict:
+        """Sample for `seconds`, or while the next `requests` requests under `route` run (at most PROFILE_MAX_SECONDS)."""
+        if self.session is not None:
+            raise ProfilerBusy("A profile is already running on this worker")
+        self.start()
+        session = self.session = ProfileSession(route, requests)
+        try:
+            timeout = min(seconds or PROFILE_MAX_SECONDS, PROFILE_MAX_SECONDS)
+            if route is None:
+                await asyncio.sleep(timeout)
+            else:
+                try:
+                    await asyncio.wait_for(session.done.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.session = None
+        return {
+            "duration_seconds": round(time.perf_counter() - session.started, 3),
+            "samples": sum(session.stacks.values()),
+            "matched_requests": session.matched,
+            "collapsed": collapse(session.stacks),
+        }
+
+    def request_started(self, record: RequestRecord) -> None:
+        with self._inflight_lock:
+            self._inflight[id(record)] = record
+        session = self.session
+        if (session is not None and session.route is not None and not session.done.is_set()
+                and record.path.startswith(session.route)):
+            record.profiled = True
+            session.tasks[record.task] += 1
+
+    def request_finished(self, record: RequestRecord) -> None:
+        with self._inflight_lock:
+            self._inflight.pop(id(record), None)
+        session = self.session
+        if session is not None and record.profiled:
+            session.tasks[record.task] -= 1
+            if session.tasks[record.task] <= 0:
+                del session.tasks[record.task]
+            session.matched += 1
+            if session.remaining is not None and session.matched >= session.remaining:
+                session.done.set()
+
+        duration = time.perf_counter() - record.started
+        if duration >= self.slow_seconds and not any(record.path.startswith(p) for p in SLOW_REQUEST_IGNORE):
+            self._slow_total += 1
+            self.slow_requests.appendleft(record.as_dict(duration * 1000))
+            logger.warning("Slow request %s %s took %.0f ms", record.method, record.path, duration * 1000)
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.slow_seconds * 1000,
+            "slow_total": self._slow_total,
+            "profiling": self.session is not None,
+            "requests": list(self.slow_requests),
+        }
+
+
+# Process-wide profiler; the command listener applies to Mongo clients created after this import
+profiler = Profiler()
+monitoring.register(_CommandRecorder())
+
+
+class ProfilingMiddleware:
+    """Tracks in-flight requests for the profiler and the slow-request log."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        record = RequestRecord(scope["method"], scope["path"], asyncio.current_task())
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                record.status = message["status"]
+            await send(message)
+
+        token = _current_request.set(record)
+        profiler.request_started(record)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profiler.request_finished(record)
+            _current_request.reset(token)
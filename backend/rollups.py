@@ -0,0 +1,229 @@
+"""
+Multi-store rollups for regional managers.
+
+Each store has a precomputed partial aggregate (on-shelf availability counts,
+predicted lost sales and its top at-risk SKUs) kept in the store_partials
+collection. A regional rollup fetches the partials of all its stores
+concurrently, recomputing only those older than their staleness bound, and
+merges them. Merged results are cached per region for a short time.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import weakref
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from catalog import product_catalog
+from change_feed import change_feed
+from database import get_analytics_database, get_database
+from forecast import forecast_demand, get_demand_model
+from timeseries import get_store_levels, get_store_velocities
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+AT_RISK_HORIZON_HOURS = float(os.getenv("AT_RISK_HORIZON_HOURS", 2.0))
+PARTIAL_MAX_AGE_SECONDS = int(os.getenv("PARTIAL_MAX_AGE_SECONDS", 300))
+REGION_CACHE_SECONDS = int(os.getenv("REGION_CACHE_SECONDS", 60))
+PARTIAL_TOP_SKUS = 50  # at-risk SKUs kept per store partial
+
+STORES_COLLECTION = "stores"
+PARTIALS_COLLECTION = "store_partials"
+
+
+def risk_priority(level: int, time_to_empty: float) -> str:
+    """Priority bucket used by the manager dashboard's at-risk list."""
+    if level == 0 or time_to_empty <= 0.5:
+        return "critical"
+    if time_to_empty <= 1.0:
+        return "high"
+    return "medium"
+
+
+async def compute_store_partial(store_id: str) -> dict:
+    """Compute and persist the partial aggregate of one store."""
+    levels, velocities, model = await asyncio.gather(
+        get_store_levels(store_id), get_store_velocities(store_id), get_demand_model(store_id)
+    )
+    snapshot = product_catalog.snapshot
+    now = datetime.utcnow()
+
+    at_risk = []
+    lost_sales = 0.0
+    on_shelf = 0
+    for sku, doc in levels.items():
+        level = doc["level"]
+        if level > 0:
+            on_shelf += 1
+        # Seasonal forecast when the store has one: the rate now, and the hours until the shelf sells out
+        velocity, time_to_empty = forecast_demand(model, sku, level, velocities.get(sku, 0.0), now)
+        if time_to_empty >= AT_RISK_HORIZON_HOURS:
+            continue
+
+        product = snapshot.get(sku) or {}
+        loss = velocity * (AT_RISK_HORIZON_HOURS - time_to_empty) * product.get("unit_price", 0.0)
+        lost_sales += loss
+        at_risk.append({
+            "store_id": store_id,
+            "sku": sku,
+            "name": product.get("name", sku),
+            "category": product.get("category"),
+            "level": level,
+            "time_to_empty": round(time_to_empty, 2),
+            "predicted_lost_sales": round(loss, 2),
+            "priority": risk_priority(level, time_to_empty),
+        })
+
+    partial = {
+        "store_id": store_id,
+        "computed_at": now,
+        "sku_count": len(levels),
+        "on_shelf_count": on_shelf,
+        "predicted_lost_sales": round(lost_sales, 2),
+        "at_risk_count": len(at_risk),
+        "at_risk": heapq.nlargest(PARTIAL_TOP_SKUS, at_risk, key=lambda item: item["predicted_lost_sales"]),
+    }
+    db = await get_database(store_id)
+    await db[PARTIALS_COLLECTION].replace_one({"store_id": store_id}, partial, upsert=True)
+    return partial
+
+
+async def get_store_partial(store_id: str, max_age: int = PARTIAL_MAX_AGE_SECONDS) -> dict:
+    """Stored partial of a store, recomputed first if older than `max_age` seconds."""
+    db = await get_analytics_database(store_id)
+    partial = await db[PARTIALS_COLLECTION].find_one({"store_id": store_id}, {"_id": 0})
+    if partial is None or (datetime.utcnow() - partial["computed_at"]).total_seconds() > max_age:
+        partial = await compute_store_partial(store_id)
+    return partial
+
+
+def merge_partials(region: str, partials: List[dict], top: int) -> dict:
+    """Merge per-store partials into one regional rollup."""
+    sku_count = sum(p["sku_count"] for p in partials)
+    on_shelf = sum(p["on_shelf_count"] for p in partials)
+    at_risk = heapq.merge(*(p["at_risk"] for p in partials), key=lambda item: -item["predicted_lost_sales"])
+    return {
+        "region": region,
+        "store_count": len(partials),
+        "computed_at": datetime.utcnow(),
+        "oldest_partial_at": min((p["computed_at"] for p in partials), default=None),
+        "osa": on_shelf / sku_count if sku_count else 1.0,
+        "predicted_lost_sales": round(sum(p["predicted_lost_sales"] for p in partials), 2),
+        "at_risk_count": sum(p["at_risk_count"] for p in partials),
+        "at_risk_skus": [item for _, item in zip(range(top), at_risk)],
+        "stores": [
+            {
+                "store_id": p["store_id"],
+                "computed_at": p["computed_at"],
+                "osa": p["on_shelf_count"] / p["sku_count"] if p["sku_count"] else 1.0,
+                "predicted_lost_sales": p["predicted_lost_sales"],
+                "at_risk_count": p["at_risk_count"],
+            }
+            for p in partials
+        ],
+    }
+
+
+async def get_region_store_ids(region: str) -> List[str]:
+    db = await get_database()
+    cursor = db[STORES_COLLECTION].find({"region": region}, {"store_id": 1})
+    return [doc["store_id"] async for doc in cursor]
+
+
+async def get_store_region(store_id: str) -> Optional[str]:
+    db = await get_database()
+    doc = await db[STORES_COLLECTION].find_one({"store_id": store_id}, {"region": 1})
+    return doc.get("region") if doc else None
+
+
+async def get_all_store_ids() -> List[str]:
+    """Every known store: those assigned to a region and those with users."""
+    db = await get_database()
+    store_ids = set(await db[STORES_COLLECTION].distinct("store_id"))
+    store_ids.update(await db.users.distinct("store_id"))
+    return sorted(store_id for store_id in store_ids if store_id)
+
+
+async def set_region_stores(region: str, store_ids: List[str]) -> None:
+    """Assign stores to a region."""
+    db = await get_database()
+    await db[STORES_COLLECTION].bulk_write(
+        [UpdateOne({"store_id": store_id}, {"$set": {"region": region}}, upsert=True) for store_id in store_ids],
+        ordered=False,
+    )
+    region_cache.invalidate()
+    await change_feed.publish("regions", region)
+
+
+class RegionRollupCache:
+    """Per-region rollup results with a staleness bound and one refresh in flight per region."""
+
+    def __init__(self, ttl: int = REGION_CACHE_SECONDS):
+        self.ttl = ttl
+        self._results: Dict[str, Tuple[datetime, dict]] = {}
+        # A lock lives only while a refresh holds or waits on it
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def invalidate(self, region: Optional[str] = None) -> None:
+        if region is None:
+            self._results.clear()
+            return
+        for key in [key for key in self._results if key.startswith(f"{region}:")]:
+            self._results.pop(key, None)
+
+    def _fresh(self, region: str, max_staleness: int) -> Optional[dict]:
+        cached = self._results.get(region)
+        if cached and (datetime.utcnow() - cached[0]).total_seconds() <= max_staleness:
+            return cached[1]
+        return None
+
+    async def get(self, region: str, top: int = 20, max_staleness: Optional[int] = None) -> Optional[dict]:
+        """Regional rollup no older than `max_staleness` seconds (default: the cache TTL)."""
+        partial_max_age = PARTIAL_MAX_AGE_SECONDS
+        if max_staleness is None:
+            max_staleness = self.ttl
+        else:
+            partial_max_age = min(max_staleness, PARTIAL_MAX_AGE_SECONDS)
+        key = f"{region}:{top}"
+        result = self._fresh(key, max_staleness)
+        if result is not None:
+            return result
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            # Another request may have refreshed while we waited
+            result = self._fresh(key, max_staleness)
+            if result is not None:
+                return result
+
+            store_ids = await get_region_store_ids(region)
+            if not store_ids:
+                return None
+            partials = await asyncio.gather(
+                *(get_store_partial(store_id, partial_max_age) for store_id in store_ids)
+            )
+            result = merge_partials(region, partials, top)
+            self._results[key] = (result["computed_at"], result)
+            return result
+
+
+# Process-wide regional cache
+region_cache = RegionRollupCache()
+# Stores may have moved between regions on another worker
+change_feed.subscribe("regions", lambda region: region_cache.invalidate())
+
+
+async def create_region_indexes(db) -> None:
+    await db[STORES_COLLECTION].create_index("store_id", unique=True)
+    await db[STORES_COLLECTION].create_index("region")
+
+
+async def create_rollup_indexes(db) -> None:
+    await db[PARTIALS_COLLECTION].create_index("store_id", unique=True)
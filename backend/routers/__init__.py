@@ -6,7 +6,31 @@ for different functionalities of the ShelfMind application.
 """
 
 from .auth import router as auth_router
+from .stock import router as stock_router
+from .images import router as images_router
+from .planograms import router as planograms_router
+from .catalog import router as catalog_router
+from .regions import router as regions_router
+from .tasks import router as tasks_router
+from .predictions import router as predictions_router
+from .sync import router as sync_router
+from .backroom import router as backroom_router
+from .scans import router as scans_router
+from .exports import router as exports_router
+from .admin import router as admin_router
 
 __all__ = [
-    "auth_router"
+    "auth_router",
+    "stock_router",
+    "images_router",
+    "planograms_router",
+    "catalog_router",
+    "regions_router",
+    "tasks_router",
+    "predictions_router",
+    "sync_router",
+    "backroom_router",
+    "scans_router",
+    "exports_router",
+    "admin_router"
 ]
\ No newline at end of file
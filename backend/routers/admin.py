@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict, List, Optional
+
+from auth import get_current_admin, get_current_manager
+from change_feed import change_feed
+from scheduler import scheduler
+from partitioning import store_partitioner
+from coalesce import single_flight
+from profiling import PROFILE_MAX_SECONDS, PROFILING_ENABLED, ProfilerBusy, profiler
+
+router = APIRouter()
+
+@router.get("/change-feed", response_model=Dict[str, Any])
+async def get_change_feed_status(
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Get this worker's cache invalidation feed: transport, counts and propagation lag (managers only).
+    """
+    return change_feed.stats()
+
+@router.get("/jobs", response_model=Dict[str, Any])
+async def get_jobs(
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Get this worker's background jobs with their triggers, next run and timings (managers only).
+    """
+    return scheduler.stats()
+
+@router.get("/partitioning", response_model=Dict[str, Any])
+async def get_partitioning(
+    store_id: List[str] = Query([], description="Stores to look up owners for"),
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Get the worker ring this worker sees and the owners of the given stores (managers only).
+    """
+    return store_partitioner.stats(store_id)
+
+@router.get("/coalescing", response_model=Dict[str, Any])
+async def get_coalescing(
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Get this worker's request coalescing counts: executed, coalesced and micro-cached requests per endpoint (managers only).
+    """
+    return single_flight.stats()
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: Optional[float] = Query(None, gt=0, le=PROFILE_MAX_SECONDS, description="Profile for this long"),
+    route: Optional[str] = Query(None, description="Profile only requests whose path starts with this"),
+    requests: int = Query(10, ge=1, le=1000, description="With route, stop after this many matching requests"),
+    current_user: dict = Depends(get_current_admin)
+):
+    """
+    Sample this worker's event loop and return collapsed stacks for flame graphs (managers with the admin token).
+
+    Samples for `seconds`, or while the next `requests` requests under `route` run. Needs PROFILING_ENABLED.
+    """
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Profiling is disabled on this worker")
+    if (seconds is None) == (route is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Give either seconds or route")
+    try:
+        result = await profiler.profile(seconds=seconds, route=route, requests=requests if route else None)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(result["collapsed"], headers={
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Profile-Seconds": str(result["duration_seconds"]),
+        "X-Profile-Requests": str(result["matched_requests"]),
+    })
+
+@router.get("/slow-requests", response_model=Dict[str, Any])
+async def get_slow_requests(
+    current_user: dict = Depends(get_current_admin)
+):
+    """
+    Get this worker's recent slow requests with their sampled stacks and Mongo commands (managers with the admin token).
+
+    Needs PROFILING_ENABLED.
+    """
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Profiling is disabled on this worker")
+    return profiler.stats()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from datetime import timedelta
 import uuid
 from typing import Dict, Any
@@ -19,6 +19,7 @@ from auth import (
     get_current_active_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from conditional import STATIC_MAX_AGE
 
 router = APIRouter()
 
@@ -197,10 +198,11 @@ async def validate_token(
     )
 
 @router.get("/roles", response_model=Dict[str, Any])
-async def get_available_roles():
+async def get_available_roles(response: Response):
     """
     Get available user roles and their descriptions.
     """
+    response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}"
     return {
         "roles": [
             {
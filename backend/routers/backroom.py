@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from models.backroom import (
+    BackroomBulkLoad,
+    BackroomLoadSummary,
+    BackroomReceive,
+    BackroomPick,
+    BackroomStock,
+    BackroomLocations,
+    ReplenishmentPlanRequest,
+    ReplenishmentPlanResponse
+)
+from auth import get_current_active_user, get_current_manager
+from backroom import backroom_inventory, InsufficientStock
+
+router = APIRouter()
+
+@router.put("", response_model=BackroomLoadSummary)
+async def load_backroom(
+    load: BackroomBulkLoad,
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Replace the store's backroom inventory with a full count (managers only).
+    """
+    index = await backroom_inventory.bulk_load(current_user["store_id"], [c.model_dump() for c in load.counts])
+    return BackroomLoadSummary(
+        sku_count=len(index.locations),
+        location_count=len({location for locations in index.locations.values() for location in locations}),
+        total_units=sum(sum(locations.values()) for locations in index.locations.values())
+    )
+
+@router.post("/receive", response_model=BackroomStock)
+async def receive_stock(
+    receipt: BackroomReceive,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Record units put away at a backroom bay and level.
+    """
+    doc = await backroom_inventory.receive(
+        current_user["store_id"], receipt.sku, receipt.bay, receipt.level, receipt.quantity
+    )
+    return BackroomStock(sku=doc["sku"], location=doc["location"], quantity=doc["quantity"])
+
+@router.post("/pick", response_model=BackroomStock)
+async def pick_stock(
+    pick: BackroomPick,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Record units taken from the backroom for a restock.
+    """
+    try:
+        doc = await backroom_inventory.pick(current_user["store_id"], pick.sku, pick.quantity, pick.location)
+    except InsufficientStock as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return BackroomStock(sku=doc["sku"], location=doc["location"], quantity=doc["quantity"])
+
+@router.post("/plan", response_model=ReplenishmentPlanResponse)
+async def plan_replenishment(
+    request: ReplenishmentPlanRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Decide restock (from the backroom location) or transfer for a batch of SKUs.
+    """
+    plans = await backroom_inventory.plan(current_user["store_id"], [i.model_dump() for i in request.items])
+    return ReplenishmentPlanResponse(plans=plans)
+
+@router.get("/{sku}", response_model=BackroomLocations)
+async def get_sku_locations(
+    sku: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Get the backroom locations and quantities of a SKU.
+    """
+    locations = await backroom_inventory.locations(current_user["store_id"], sku)
+    return BackroomLocations(sku=sku, total=sum(locations.values()), locations=locations)
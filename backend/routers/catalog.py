@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+
+from models.catalog import (
+    CatalogProduct,
+    CatalogSearchResponse,
+    CatalogReloadRequest,
+    CatalogStatus
+)
+from auth import get_current_active_user, get_current_manager
+from catalog import product_catalog, resolve_catalog_path, CATALOG_FILE
+from conditional import REVALIDATE, collection_etag, not_modified
+
+router = APIRouter()
+
+def _status(snapshot) -> CatalogStatus:
+    return CatalogStatus(
+        sku_count=len(snapshot),
+        category_count=len(snapshot.categories),
+        skipped_count=snapshot.skipped,
+        source=snapshot.source,
+        loaded_at=snapshot.loaded_at
+    )
+
+@router.get("/search", response_model=CatalogSearchResponse)
+async def search_catalog(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Typeahead search by SKU prefix or by the start of words in the product name.
+    """
+    snapshot = product_catalog.snapshot
+    etag = collection_etag(request, "catalog", int(snapshot.loaded_at.timestamp() * 1000))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE
+    return CatalogSearchResponse(query=q, results=snapshot.search(q, limit))
+
+@router.get("/status", response_model=CatalogStatus)
+async def get_catalog_status(
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Get the size and source of the loaded catalog.
+    """
+    return _status(product_catalog.snapshot)
+
+@router.post("/reload", response_model=CatalogStatus)
+async def reload_catalog(
+    request: CatalogReloadRequest,
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Reload the catalog from a bulk CSV or NDJSON file under DATA_DIR (managers only).
+
+    The new catalog is built in the background and swapped in atomically;
+    searches keep using the previous one until then.
+    """
+    try:
+        path = resolve_catalog_path(request.path or CATALOG_FILE)
+        snapshot = await product_catalog.reload(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Catalog file not found")
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid catalog file: {e}")
+    return _status(snapshot)
+
+@router.get("/{sku}", response_model=CatalogProduct)
+async def get_catalog_product(
+    sku: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Look up a product by exact SKU.
+    """
+    product = product_catalog.snapshot.get(sku)
+    if product is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown SKU: {sku}")
+    return CatalogProduct(**product)
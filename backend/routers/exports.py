@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Literal, Optional
+
+from auth import get_current_manager
+from database import get_analytics_database
+from export import DATASETS, FORMATS, decode_cursor, format_available, stream_export
+
+router = APIRouter()
+
+@router.get("/{dataset}")
+async def export_dataset(
+    dataset: Literal["tasks", "scans", "stock"],
+    fmt: Literal["csv", "ndjson", "arrow"] = Query("csv", alias="format"),
+    start: Optional[datetime] = Query(None, description="Only records at or after this time (UTC)"),
+    end: Optional[datetime] = Query(None, description="Only records before this time (UTC)"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to export"),
+    after: Optional[str] = Query(None, description="export_cursor of the last row received, to resume"),
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Stream the store's tasks, scan readings or raw stock readings (managers only).
+
+    Rows are streamed in batches straight from the database in time order. Every row has an
+    `export_cursor`; pass the last one received as `after` to resume an interrupted export.
+    """
+    if not format_available(fmt):
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Arrow export needs the pyarrow package")
+    spec = DATASETS[dataset]
+    try:
+        columns = spec.select(name.strip() for name in (fields or "").split(",") if name.strip())
+        if after:
+            decode_cursor(after)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    store_id = current_user["store_id"]
+    db = await get_analytics_database(store_id)
+    filename = f"{dataset}-{store_id}-{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}"
+    return StreamingResponse(
+        stream_export(db, spec, columns, fmt, store_ids=[store_id], start=start, end=end, after=after),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
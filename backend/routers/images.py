@@ -0,0 +1,87 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, Query, Response, UploadFile, status
+from typing import Optional
+import re
+
+from models.image import ImageUploadResponse
+from auth import get_current_active_user
+from blob_store import (
+    image_store,
+    ImageTooLarge,
+    ZeroCopyFileResponse,
+    etag_for,
+    IMAGE_TYPES,
+    THUMBNAIL_SIZES
+)
+from conditional import etag_matches
+
+router = APIRouter()
+
+# Content-addressed names never change, so clients may cache them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# The original sent in place of a thumbnail that could not be rendered; revalidate to get the thumbnail later
+FALLBACK_CACHE_CONTROL = "no-cache"
+
+IMAGE_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(jpg|png|webp)$")
+
+@router.post("", response_model=ImageUploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_image(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Upload a shelf scan photo (JPEG, PNG or WebP).
+
+    Images are stored by content hash, so re-uploading the same photo returns
+    the existing image. Thumbnails are rendered in the background.
+    """
+    content_type = (file.content_type or "").lower()
+    if content_type not in IMAGE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported image type. Allowed: {', '.join(IMAGE_TYPES)}"
+        )
+
+    try:
+        name, size, created = await image_store.put(file.file, content_type)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+    if created:
+        background_tasks.add_task(image_store.render_thumbnails, name)
+
+    return ImageUploadResponse(
+        id=name,
+        url=f"/api/images/{name}",
+        thumbnail_urls={size_name: f"/api/images/{name}?size={size_name}" for size_name in THUMBNAIL_SIZES},
+        size=size,
+        content_type=content_type,
+        deduplicated=not created
+    )
+
+@router.get("/{name}")
+async def get_image(
+    name: str,
+    size: Optional[str] = Query(None, description="Thumbnail size: " + ", ".join(THUMBNAIL_SIZES)),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Serve an image or one of its thumbnails.
+
+    Supports `If-None-Match` (304 Not Modified) and HTTP `Range` requests. When a thumbnail
+    cannot be rendered, the original is sent with its own ETag and is not cacheable as immutable.
+    """
+    if not IMAGE_NAME_PATTERN.match(name) or not image_store.exists(name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown thumbnail size: {size}")
+
+    etag = etag_for(name, size)
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = await image_store.thumbnail(name, size) if size else image_store.path_for(name)
+    if size and path != image_store.thumbnail_path_for(name, size):
+        headers = {"ETag": etag_for(name), "Cache-Control": FALLBACK_CACHE_CONTROL}
+    return ZeroCopyFileResponse(path, headers=headers, content_disposition_type="inline")
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from models.planogram import (
+    PlanogramUpload,
+    PlanogramSummary,
+    PlanogramMatchRequest,
+    PlanogramMatchResponse
+)
+from auth import get_current_active_user, get_current_manager
+from planogram import save_planogram, get_planogram_index
+
+router = APIRouter()
+
+@router.put("/{aisle}", response_model=PlanogramSummary)
+async def upload_planogram(
+    aisle: str,
+    planogram: PlanogramUpload,
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Replace the expected slot layout of an aisle (managers only).
+
+    Slots on the same shelf must not overlap horizontally, nor shelves vertically.
+    """
+    slots = [slot.model_dump() for slot in planogram.slots]
+    try:
+        index = await save_planogram(current_user["store_id"], aisle, slots)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return PlanogramSummary(
+        aisle=aisle,
+        slot_count=index.slot_count,
+        shelves=index.shelf_names,
+        updated_at=index.updated_at
+    )
+
+@router.post("/{aisle}/match", response_model=PlanogramMatchResponse)
+async def match_detections(
+    aisle: str,
+    request: PlanogramMatchRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Match a scan's detected products against the aisle planogram.
+
+    Returns expected vs. actual facings per SKU and every slot that is short.
+    """
+    index = await get_planogram_index(current_user["store_id"], aisle)
+    if index is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No planogram for aisle {aisle}")
+    return PlanogramMatchResponse(**index.match([d.model_dump() for d in request.detections]))
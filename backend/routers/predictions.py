@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Query
+
+from models.prediction import LostSalesResponse
+from auth import get_current_active_user
+from lost_sales import predict_store_lost_sales, DEFAULT_HORIZON_HOURS, DEFAULT_SCENARIOS
+from coalesce import single_flight
+
+router = APIRouter()
+
+@router.get("/lost-sales", response_model=LostSalesResponse)
+async def get_predicted_lost_sales(
+    horizon_hours: float = Query(DEFAULT_HORIZON_HOURS, gt=0, le=24),
+    scenarios: int = Query(DEFAULT_SCENARIOS, ge=100, le=20000),
+    top: int = Query(50, ge=1, le=500, description="Number of SKUs to return"),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Predict lost sales for the current user's store over the next `horizon_hours`.
+
+    Stockout timing is simulated per SKU from sales velocity uncertainty, current
+    stock and the restock ETA of open tasks. Returns expected loss with a 90%
+    confidence band per SKU, per aisle and for the whole store.
+    """
+    store_id = current_user["store_id"]
+    prediction = await single_flight.do(
+        "predictions.lost_sales", store_id, (horizon_hours, scenarios, top),
+        lambda: predict_store_lost_sales(store_id, horizon_hours, scenarios, top),
+    )
+    return LostSalesResponse(**prediction)
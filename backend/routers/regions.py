@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import Optional
+
+from models.region import RegionRollupResponse, RegionStoresUpdate
+from auth import get_current_admin, get_current_manager
+from rollups import get_store_region, region_cache, set_region_stores
+from conditional import REVALIDATE, collection_etag, not_modified
+
+router = APIRouter()
+
+@router.put("/{region}/stores", status_code=status.HTTP_204_NO_CONTENT)
+async def assign_region_stores(
+    region: str,
+    update: RegionStoresUpdate,
+    current_user: dict = Depends(get_current_admin)
+):
+    """
+    Assign stores to a region (managers with the operator admin token only).
+    """
+    await set_region_stores(region, update.store_ids)
+
+@router.get("/{region}/rollup", response_model=RegionRollupResponse)
+async def get_region_rollup(
+    request: Request,
+    response: Response,
+    region: str,
+    top: int = Query(20, ge=1, le=200, description="Number of at-risk SKUs to return"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Maximum age of the result in seconds"),
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Get on-shelf availability, predicted lost sales and the top at-risk SKUs across a region.
+
+    Built from per-store partial aggregates fetched concurrently and cached per region.
+    Managers can only read the region their own store belongs to.
+    """
+    if await get_store_region(current_user["store_id"]) != region:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Your store is not in region {region}")
+    rollup = await region_cache.get(region, top, max_staleness)
+    if rollup is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No stores in region {region}")
+    # A cached rollup is identified by when it was computed
+    etag = collection_etag(request, region, int(rollup["computed_at"].timestamp() * 1000))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE
+    return RegionRollupResponse(**rollup)
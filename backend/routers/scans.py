@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends
+
+from models.scan import ScanCreate, ScanResult
+from auth import get_current_active_user
+from scans import process_scan
+
+router = APIRouter()
+
+@router.post("", response_model=ScanResult)
+async def submit_scan(
+    scan: ScanCreate,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Submit a shelf scan and apply only what changed since the last accepted scan of the shelf.
+
+    - **aisle**, **shelf**: The scanned shelf
+    - **detected_products**: Detections from the shelf image
+
+    Unchanged SKUs are skipped, open tasks of changed SKUs are updated in place, and only new gaps
+    create tasks. `diff` reports each outcome by SKU and `tasks` holds the created and updated tasks.
+    Scans with low detection confidence are recorded with `accepted: false` and change nothing.
+    """
+    return await process_scan(current_user["store_id"], current_user["id"], scan.model_dump())
@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from datetime import datetime, timedelta
+from typing import Optional
+
+from models.stock import (
+    StockReadingBatch,
+    StockIngestResponse,
+    StockHistoryResponse,
+    StockTrendResponse,
+    StockForecastResponse
+)
+from auth import get_current_active_user
+from timeseries import stock_writer, get_history, get_trend, get_latest_level, bucket_start, RESOLUTIONS
+from forecast import get_demand_model
+
+router = APIRouter()
+
+@router.post("/levels", response_model=StockIngestResponse, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_stock_levels(
+    batch: StockReadingBatch,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Record a batch of shelf stock readings for the current user's store.
+
+    Readings are buffered and written in batches, so they show up in history
+    queries within a couple of seconds.
+    """
+    accepted = await stock_writer.add(
+        current_user["store_id"],
+        [reading.model_dump() for reading in batch.readings]
+    )
+    return StockIngestResponse(accepted=accepted)
+
+@router.get("/{sku}/history", response_model=StockHistoryResponse)
+async def get_stock_history(
+    sku: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Optional[str] = Query(None, description="raw, 1m, 1h or 1d; chosen automatically if omitted"),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Get the stock-level history of a SKU.
+
+    - **start** / **end**: Time range (defaults to the last 24 hours)
+    - **resolution**: Force a rollup; otherwise the coarsest one that fits the range is used
+    """
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+    if resolution is not None and resolution != "raw" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown resolution: {resolution}")
+
+    resolution, points = await get_history(current_user["store_id"], sku, start, end, resolution)
+    return StockHistoryResponse(sku=sku, resolution=resolution, points=points)
+
+@router.get("/{sku}/trend", response_model=StockTrendResponse)
+async def get_stock_trend(
+    sku: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Get the trend ('up', 'down' or 'stable'), sales velocity and last restock time of a SKU.
+    """
+    return StockTrendResponse(**await get_trend(current_user["store_id"], sku))
+
+@router.get("/{sku}/forecast", response_model=StockForecastResponse)
+async def get_stock_forecast(
+    sku: str,
+    hours: int = Query(24, ge=1, le=168, description="Hours to forecast, starting with the current one"),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Get the seasonal demand forecast of a SKU: units per hour for the coming hours, and the hours
+    until its current shelf level sells out at those rates.
+    """
+    store_id = current_user["store_id"]
+    model = await get_demand_model(store_id)
+    if model is None or sku not in model:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No demand forecast for this SKU yet")
+    now = datetime.utcnow()
+    start = bucket_start(now, RESOLUTIONS["1h"])
+    rates = model.rates(sku, now, hours)
+    latest = await get_latest_level(store_id, sku)
+    return StockForecastResponse(
+        sku=sku,
+        fitted_at=model.fitted_at,
+        current_level=latest["level"] if latest else None,
+        time_to_empty=round(model.time_to_empty(sku, latest["level"], now), 2) if latest else None,
+        points=[{"timestamp": start + timedelta(hours=i), "velocity": round(float(rate), 3)} for i, rate in enumerate(rates)],
+    )
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+
+from models.sync import SyncRequest, SyncResponse
+from auth import get_current_active_user
+from sync import apply_task_mutations, get_changes_since
+
+router = APIRouter()
+
+@router.post("", response_model=SyncResponse)
+async def sync_tasks(
+    request: SyncRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Apply a batch of queued task mutations and return the tasks changed since `last_version`.
+
+    - **mutations**: Task status/priority/assignee changes, each with a client-generated idempotency key
+    - **last_version**: Highest change version the device has seen (0 for a full sync)
+
+    Mutations follow the rules of PATCH /api/tasks/{task_id}; an illegal status move, or an associate
+    reassigning a task or changing one assigned to someone else, is reported as `rejected`.
+    Retried mutations are reported as `duplicate` and not applied again. When `has_more` is true,
+    sync again with the returned `version` to fetch the next page of changes.
+    """
+    store_id = current_user["store_id"]
+    results = await apply_task_mutations(
+        store_id, current_user, [m.model_dump() for m in request.mutations]
+    )
+    changes = await get_changes_since(store_id, request.last_version)
+    return SyncResponse(results=results, **changes)
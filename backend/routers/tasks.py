@@ -0,0 +1,201 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from datetime import datetime
+from typing import List, Optional
+import uuid
+
+from database import TaskDocument, get_store_versions
+from conditional import REVALIDATE, collection_etag, delta_cursor, not_modified
+from models.task import LeaderboardResponse, Product, ProductivityResponse, TaskCreate, TaskResponse, TaskStatus, TaskTransition, TaskUpdate
+from auth import get_current_active_user, get_current_manager
+from transitions import get_task_transitions, replay_store, transition_log
+from team_stats import get_leaderboard, leaderboard_window
+from task_state import TaskConflict, update_task
+from coalesce import single_flight
+
+router = APIRouter()
+
+# Fields that may be selected with ?fields=, including nested product fields
+SELECTABLE_FIELDS = set(TaskResponse.model_fields) | {f"product.{name}" for name in Product.model_fields}
+
+def parse_fields(fields: Optional[str]) -> Optional[dict]:
+    """Mongo projection for a comma-separated field list; `id` is always included."""
+    if not fields:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = selected - SELECTABLE_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    # A parent field covers its nested fields; Mongo rejects projecting both
+    if "product" in selected:
+        selected = {name for name in selected if not name.startswith("product.")}
+    return {"_id": 0, "id": 1, **{name: 1 for name in selected}}
+
+@router.post("", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
+async def create_task(
+    task: TaskCreate,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Create a replenishment task in the current user's store.
+    """
+    task_doc = task.model_dump()
+    task_doc["id"] = f"task-{str(uuid.uuid4())[:8]}"
+    task_doc["product_id"] = task.product.id
+    task_doc["store_id"] = current_user["store_id"]
+    created_task = await TaskDocument.create_task(task_doc)
+    await transition_log.record(task_doc["store_id"], task_doc["id"], None, created_task["status"], current_user["id"])
+    return TaskResponse(**created_task)
+
+@router.get("", response_model=List[TaskResponse])
+async def list_tasks(
+    request: Request,
+    response: Response,
+    status_filter: Optional[TaskStatus] = Query(None, alias="status"),
+    assigned_to: Optional[str] = None,
+    since: Optional[int] = Query(None, ge=0, description="Only tasks changed after this store version"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,status,product.name"),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    List the tasks of the current user's store, newest first.
+
+    - **status**: Only tasks with this status
+    - **assigned_to**: Only tasks assigned to this associate
+    - **since**: Delta mode: every task changed after this version, oldest change first (filters are
+      ignored so clients also learn about tasks leaving their view)
+    - **fields**: Sparse fieldset; only these fields are read from the database and returned
+
+    Responses carry an ETag for If-None-Match and an `X-Store-Version` header to pass as `since`.
+    """
+    store_id = current_user["store_id"]
+    projection = parse_fields(fields)
+    versions = await get_store_versions(store_id)
+    etag = collection_etag(request, store_id, versions["committed"])
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    # Identical dashboard queries share one database read; the committed version keys out stale results
+    if since is not None:
+        tasks = await single_flight.do(
+            "tasks.changes", store_id, (versions["committed"], since, fields),
+            lambda: TaskDocument.get_task_changes(store_id, since, projection=projection),
+        )
+    else:
+        tasks = await single_flight.do(
+            "tasks.list", store_id, (versions["committed"], status_filter, assigned_to, fields),
+            lambda: TaskDocument.get_tasks_by_store(store_id, status_filter, assigned_to, projection),
+        )
+    headers = {
+        "ETag": etag,
+        "Cache-Control": REVALIDATE,
+        "X-Store-Version": str(delta_cursor(since or 0, versions)),
+    }
+    if projection is not None:
+        # Partial documents do not validate as TaskResponse
+        return JSONResponse(jsonable_encoder(tasks), headers=headers)
+    response.headers.update(headers)
+    return [TaskResponse(**task) for task in tasks]
+
+@router.get("/productivity", response_model=ProductivityResponse)
+async def get_productivity(
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Task counts by status and per-associate timings, replayed from the task transition log (managers only).
+    """
+    store_id = current_user["store_id"]
+    replay = await single_flight.do("tasks.productivity", store_id, (), lambda: replay_store(store_id))
+    tasks_by_status = {}
+    for task_status in replay.task_statuses().values():
+        tasks_by_status[task_status] = tasks_by_status.get(task_status, 0) + 1
+    return ProductivityResponse(
+        store_id=store_id,
+        compacted_through=replay.through,
+        tasks_by_status=tasks_by_status,
+        associates=replay.timings(),
+    )
+
+@router.get("/leaderboard", response_model=LeaderboardResponse)
+async def get_team_leaderboard(
+    start: Optional[datetime] = Query(None, description="Window start (UTC, rounded down to the hour); default 24 hours before end"),
+    end: Optional[datetime] = Query(None, description="Window end (UTC, rounded up to the hour); default now"),
+    current_user: dict = Depends(get_current_manager)
+):
+    """
+    Per-associate completed, active, not found and on-hold tasks, average completion time and revenue
+    protected over a window of at most 31 days (managers only).
+
+    Read from counters kept up to date as tasks change, so the cost does not grow with the number of tasks.
+    """
+    try:
+        start, end = leaderboard_window(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    store_id = current_user["store_id"]
+
+    async def leaderboard() -> list:
+        await transition_log.flush()
+        return await get_leaderboard(store_id, start, end)
+
+    associates = await single_flight.do("tasks.leaderboard", store_id, (start, end), leaderboard)
+    return LeaderboardResponse(store_id=store_id, start=start, end=end, associates=associates)
+
+@router.get("/{task_id}/transitions", response_model=List[TaskTransition])
+async def get_transitions(
+    task_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Status history of a task, oldest first (transitions older than the raw log retention are compacted away).
+    """
+    return await get_task_transitions(current_user["store_id"], task_id)
+
+@router.get("/{task_id}", response_model=TaskResponse)
+async def get_task(
+    task_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Get a single task of the current user's store.
+    """
+    task = await TaskDocument.get_task(current_user["store_id"], task_id)
+    if task is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    return TaskResponse(**task)
+
+@router.patch("/{task_id}", response_model=TaskResponse)
+async def patch_task(
+    task_id: str,
+    update: TaskUpdate,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Change a task's status, priority or assignee, if it is still at `expected_version`.
+
+    - **status**: Must be a legal move from the current status (completed tasks are final)
+    - **assigned_to**: Managers only; an associate moving a task to `in_progress` claims it
+
+    Associates can only change tasks that are unassigned or assigned to them. On a conflict the task
+    is unchanged and the 409 response carries its current state, so the client can retry from it.
+    """
+    changes = update.model_dump(exclude={"expected_version"}, exclude_none=True)
+    if not changes:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to update")
+    if "assigned_to" in changes and current_user["role"] != "manager":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only managers can reassign tasks")
+    try:
+        task = await update_task(current_user["store_id"], task_id, current_user, update.expected_version, changes)
+    except TaskConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"reason": e.reason, "message": str(e), "task": jsonable_encoder(TaskResponse(**e.task))}
+        )
+    if task is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    return TaskResponse(**task)
@@ -0,0 +1,355 @@
+"""
+Incremental shelf scan processing.
+
+Associates rescan the same aisle and shelf many times a day. Each accepted
+scan is compared, SKU by SKU, with the last accepted scan of the same shelf:
+
+- unchanged SKUs (same gap flag and status, count within
+  SCAN_COUNT_TOLERANCE) that still have an open task are skipped;
+- changed SKUs that have an open task get that task updated in place;
+- SKUs that need attention and have no open task get one, including gaps
+  whose task was closed (completed or not found) since the last scan;
+- SKUs that no longer need attention have their open task updated and are
+  reported as resolved.
+
+Tasks on hold count as open. An in-place update only lands if the task still
+has the version and status it was read with; a task changed concurrently
+(e.g. completed meanwhile) is left as it is.
+
+Scans of a shelf are processed one at a time per worker, and store-owner
+routing sends a store's scans to one worker. Across workers, a created task
+carries a `gap_key` (shelf, SKU and the scan it was diffed against) that is
+unique per store, so two scans diffed against the same previous scan cannot
+both open a task for the same gap.
+
+Only the created and updated tasks are written, in one bulk write under one
+reservation of store change versions, so a rescan of an unchanged shelf
+writes no tasks at all. Scans whose mean detection confidence is below
+SCAN_MIN_CONFIDENCE are recorded but not accepted, and do not replace the
+shelf's last accepted scan.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+import weakref
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backroom import backroom_inventory
+from catalog import DEFAULT_CATEGORY, product_catalog
+from database import OPEN_TASK_STATUSES, get_database, reserve_store_versions
+from forecast import FORECAST_HORIZON_HOURS, forecast_demand, get_demand_model
+from scoring import stock_status, task_priority, urgency_score
+from timeseries import DUPLICATE_KEY, get_store_velocities, stock_writer
+from transitions import transition_log
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SCAN_MIN_CONFIDENCE = float(os.getenv("SCAN_MIN_CONFIDENCE", 0.5))
+SCAN_COUNT_TOLERANCE = int(os.getenv("SCAN_COUNT_TOLERANCE", 1))
+SCAN_LOW_COUNT = int(os.getenv("SCAN_LOW_COUNT", 8))  # counts below this need attention, as on the dashboard
+SCAN_DEFAULT_CAPACITY = int(os.getenv("SCAN_DEFAULT_CAPACITY", 40))
+
+SCANS_COLLECTION = "scans"
+RESTOCK_MINUTES = 8
+TRANSFER_MINUTES = 25
+
+# Tasks that still cover a shelf gap; a task on hold is not closed
+SHELF_TASK_STATUSES = OPEN_TASK_STATUSES + ["on_hold"]
+
+# One scan of a shelf is processed at a time, so rescans cannot both create a task for the same gap;
+# a lock lives only while a scan holds or waits on it
+_shelf_locks: "weakref.WeakValueDictionary[Tuple[str, str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _shelf_lock(store_id: str, aisle: str, shelf: str) -> asyncio.Lock:
+    key = (store_id, aisle, shelf)
+    lock = _shelf_locks.get(key)
+    if lock is None:
+        lock = _shelf_locks[key] = asyncio.Lock()
+    return lock
+
+
+def summarize_detections(detections: List[dict]) -> Dict[str, dict]:
+    """Fold detections into one reading per SKU: total count, any gap, lowest confidence."""
+    readings: Dict[str, dict] = {}
+    for detection in detections:
+        reading = readings.get(detection["sku"])
+        if reading is None:
+            readings[detection["sku"]] = {
+                "sku": detection["sku"],
+                "name": detection["name"],
+                "count": detection["count"],
+                "gap_detected": detection["gap_detected"],
+                "confidence": detection["confidence"],
+            }
+            continue
+        reading["count"] += detection["count"]
+        reading["gap_detected"] = reading["gap_detected"] or detection["gap_detected"]
+        reading["confidence"] = min(reading["confidence"], detection["confidence"])
+    return readings
+
+
+def needs_attention(reading: dict) -> bool:
+    return reading["gap_detected"] or reading["count"] < SCAN_LOW_COUNT
+
+
+def reading_changed(before: Optional[dict], after: dict) -> bool:
+    if before is None:
+        return True
+    if before["gap_detected"] != after["gap_detected"]:
+        return True
+    if stock_status(before["count"], before["gap_detected"]) != stock_status(after["count"], after["gap_detected"]):
+        return True
+    return abs(before["count"] - after["count"]) > SCAN_COUNT_TOLERANCE
+
+
+def diff_readings(previous: Dict[str, dict], current: Dict[str, dict], open_skus) -> dict:
+    """Classify every SKU of the current scan against the previous one and the SKUs with an open task.
+
+    Returns the SKUs to create tasks for, to update in place, that were resolved, that were not seen
+    again, and the number left alone (unchanged with an open task, or needing no task).
+    """
+    diff = {"created": [], "updated": [], "resolved": [], "missing": [], "unchanged": 0}
+    for sku, reading in current.items():
+        if sku not in open_skus:
+            if needs_attention(reading):
+                diff["created"].append(sku)
+            else:
+                diff["unchanged"] += 1
+        elif reading_changed(previous.get(sku), reading):
+            diff["updated" if needs_attention(reading) else "resolved"].append(sku)
+        else:
+            diff["unchanged"] += 1
+    diff["missing"] = sorted(set(previous) - set(current))
+    return diff
+
+
+def _trend(before: Optional[dict], after: dict) -> str:
+    if before is None or before["count"] == after["count"]:
+        return "stable"
+    return "up" if after["count"] > before["count"] else "down"
+
+
+def _product_fields(reading: dict, before: Optional[dict], max_capacity: int, velocity: float,
+                    time_to_empty: float, revenue_impact: float) -> dict:
+    """Product fields and scoring that follow from a shelf reading and the SKU's current demand."""
+    count = reading["count"]
+    status = stock_status(count, needs_attention(reading))
+    score = urgency_score(count, max_capacity, velocity, revenue_impact)
+    return {
+        "current_stock": count,
+        "status": status,
+        "trend": _trend(before, reading),
+        "time_to_empty": round(min(time_to_empty, FORECAST_HORIZON_HOURS), 2),  # as the model caps it
+        "urgency_score": score,
+        "priority": task_priority(score, status),
+    }
+
+
+def _new_task(store_id: str, scan: dict, reading: dict, before: Optional[dict], plan: dict,
+              demand: Tuple[float, float]) -> dict:
+    record = product_catalog.snapshot.get(reading["sku"]) or {}
+    name = record.get("name") or reading["name"]
+    max_capacity = max(SCAN_DEFAULT_CAPACITY, reading["count"])
+    velocity, time_to_empty = demand
+    revenue_impact = round(record.get("unit_price", 0.0) * velocity, 2)
+    fields = _product_fields(reading, before, max_capacity, velocity, time_to_empty, revenue_impact)
+    restock = plan["type"] == "restock"
+    instructions = (
+        f"Restock {name} from backroom location {plan['backroom_location']}."
+        if restock else f"Transfer {name} from a nearby store - no backroom stock available."
+    )
+    now = datetime.utcnow()
+    return {
+        "id": f"task-{str(uuid.uuid4())[:8]}",
+        "product_id": reading["sku"],
+        "store_id": store_id,
+        "product": {
+            "id": reading["sku"],
+            "name": name,
+            "sku": reading["sku"],
+            "current_stock": fields["current_stock"],
+            "max_capacity": max_capacity,
+            "category": record.get("category") or DEFAULT_CATEGORY,
+            "aisle": scan["aisle"],
+            "shelf": scan["shelf"],
+            "last_restocked": None,
+            "trend": fields["trend"],
+            "status": fields["status"],
+            "sales_velocity": round(velocity, 2),
+            "time_to_empty": fields["time_to_empty"],
+            "revenue_impact": revenue_impact,
+            "backroom_location": plan["backroom_location"],
+            "nearby_stores": None,
+            "image_url": record.get("image_url"),
+        },
+        "type": plan["type"],
+        "priority": fields["priority"],
+        "assigned_to": None,
+        "estimated_time": RESTOCK_MINUTES if restock else TRANSFER_MINUTES,
+        "urgency_score": fields["urgency_score"],
+        "instructions": instructions,
+        "backroom_location": plan["backroom_location"],
+        "transfer_store": None,
+        "image_session_id": scan["id"],
+        "status": "pending",
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _task_update(task: dict, reading: dict, before: Optional[dict], scan_id: str,
+                 demand: Tuple[float, float]) -> dict:
+    product = task["product"]
+    velocity, time_to_empty = demand
+    fields = _product_fields(reading, before, product["max_capacity"], velocity, time_to_empty,
+                             product["revenue_impact"])
+    return {
+        "product.current_stock": fields["current_stock"],
+        "product.status": fields["status"],
+        "product.trend": fields["trend"],
+        "product.time_to_empty": fields["time_to_empty"],
+        "urgency_score": fields["urgency_score"],
+        "priority": fields["priority"],
+        "image_session_id": scan_id,
+    }
+
+
+async def get_last_scan(store_id: str, aisle: str, shelf: str) -> Optional[dict]:
+    """The last accepted scan of a shelf."""
+    db = await get_database(store_id)
+    return await db[SCANS_COLLECTION].find_one(
+        {"store_id": store_id, "aisle": aisle, "shelf": shelf, "accepted": True}, sort=[("created_at", -1)]
+    )
+
+
+async def process_scan(store_id: str, user_id: str, scan_data: dict) -> dict:
+    """Record a shelf scan and apply only its differences from the shelf's last accepted scan."""
+    db = await get_database(store_id)
+    readings = summarize_detections(scan_data["detected_products"])
+    confidence = sum(r["confidence"] for r in readings.values()) / len(readings) if readings else 0.0
+    now = datetime.utcnow()
+    scan = {
+        "id": f"scan-{str(uuid.uuid4())[:8]}",
+        "store_id": store_id,
+        "aisle": scan_data["aisle"],
+        "shelf": scan_data["shelf"],
+        "image_url": scan_data.get("image_url"),
+        "processing_time": scan_data.get("processing_time"),
+        "scanned_by": user_id,
+        "readings": list(readings.values()),
+        "confidence": round(confidence, 3),
+        "accepted": bool(readings) and confidence >= SCAN_MIN_CONFIDENCE,
+        "created_at": now,
+    }
+    if not scan["accepted"]:
+        await db[SCANS_COLLECTION].insert_one(scan)
+        logger.info("Scan %s of %s/%s not accepted (confidence %.2f)", scan["id"], scan["aisle"], scan["shelf"], confidence)
+        return {**scan, "diff": None, "tasks": []}
+
+    await stock_writer.add(store_id, [{"sku": r["sku"], "level": r["count"], "timestamp": now} for r in readings.values()])
+
+    async with _shelf_lock(store_id, scan["aisle"], scan["shelf"]):
+        last = await get_last_scan(store_id, scan["aisle"], scan["shelf"])
+        previous = {r["sku"]: r for r in last["readings"]} if last else {}
+        open_tasks = {
+            task["product"]["sku"]: task
+            async for task in db.tasks.find({
+                "store_id": store_id,
+                "status": {"$in": SHELF_TASK_STATUSES},
+                "product.aisle": scan["aisle"],
+                "product.shelf": scan["shelf"],
+                "product.sku": {"$in": list(readings)},
+            }).sort("created_at", 1)
+        }
+        diff = diff_readings(previous, readings, open_tasks)
+        diff["previous_scan_id"] = last["id"] if last else None
+
+        # Velocity and time to empty follow the SKU's seasonal forecast when its store has one
+        model = await get_demand_model(store_id)
+        new_tasks = []
+        if diff["created"]:
+            velocities = await get_store_velocities(store_id)
+            plans = await backroom_inventory.plan(store_id, [
+                {"sku": sku, "units_needed": max(SCAN_DEFAULT_CAPACITY - readings[sku]["count"], 1)}
+                for sku in diff["created"]
+            ])
+            new_tasks = [
+                _new_task(store_id, scan, readings[sku], previous.get(sku), plan,
+                          forecast_demand(model, sku, readings[sku]["count"], velocities.get(sku, 0.0), now))
+                for sku, plan in zip(diff["created"], plans)
+            ]
+            for task in new_tasks:
+                task["gap_key"] = f"{scan['aisle']}/{scan['shelf']}/{task['product']['sku']}@{diff['previous_scan_id']}"
+        updates = {
+            open_tasks[sku]["id"]: _task_update(
+                open_tasks[sku], readings[sku], previous.get(sku), scan["id"],
+                forecast_demand(model, sku, readings[sku]["count"], open_tasks[sku]["product"]["sales_velocity"], now),
+            )
+            for sku in diff["updated"] + diff["resolved"]
+        }
+
+        if new_tasks or updates:
+            async with reserve_store_versions(store_id, len(new_tasks) + len(updates)) as version:
+                for i, task in enumerate(new_tasks):
+                    task["version"] = version - i
+                tasks_by_id = {task["id"]: task for task in open_tasks.values()}
+                ours = version - len(new_tasks)
+                # Each update only lands if the task is as it was read above
+                operations = [
+                    UpdateOne(
+                        {"store_id": store_id, "id": task_id, "version": tasks_by_id[task_id].get("version"),
+                         "status": tasks_by_id[task_id]["status"]},
+                        {"$set": {**fields, "updated_at": now, "version": ours - i}},
+                    )
+                    for i, (task_id, fields) in enumerate(updates.items())
+                ]
+                if new_tasks:
+                    try:
+                        await db.tasks.insert_many(new_tasks, ordered=False)
+                    except BulkWriteError as e:
+                        # Another worker's scan against the same previous scan already opened these gaps
+                        errors = e.details.get("writeErrors", [])
+                        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+                            raise
+                        taken = {new_tasks[error["index"]]["product"]["sku"] for error in errors}
+                        logger.info("Scan %s left %d gaps to a concurrent scan", scan["id"], len(taken))
+                        new_tasks = [task for task in new_tasks if task["product"]["sku"] not in taken]
+                        diff["created"] = [sku for sku in diff["created"] if sku not in taken]
+                if operations:
+                    outcome = await db.tasks.bulk_write(operations, ordered=False)
+                    if outcome.matched_count < len(operations):
+                        landed = {doc["id"] async for doc in db.tasks.find(
+                            {"store_id": store_id, "id": {"$in": list(updates)},
+                             "version": {"$gt": ours - len(updates), "$lte": ours}}, {"id": 1}
+                        )}
+                        skipped = {tasks_by_id[task_id]["product"]["sku"] for task_id in updates if task_id not in landed}
+                        logger.info("Scan %s left %d tasks changed meanwhile as they are", scan["id"], len(skipped))
+                        updates = {task_id: fields for task_id, fields in updates.items() if task_id in landed}
+                        diff["updated"] = [sku for sku in diff["updated"] if sku not in skipped]
+                        diff["resolved"] = [sku for sku in diff["resolved"] if sku not in skipped]
+
+        scan["diff"] = {key: diff[key] for key in ("previous_scan_id", "unchanged", "created", "updated", "resolved", "missing")}
+        await db[SCANS_COLLECTION].insert_one(scan)
+
+    for task in new_tasks:
+        await transition_log.record(store_id, task["id"], None, task["status"], user_id, now)
+    changed_ids = [task["id"] for task in new_tasks] + list(updates)
+    tasks = await db.tasks.find({"store_id": store_id, "id": {"$in": changed_ids}}).to_list(length=None) if changed_ids else []
+    logger.info("Scan %s of %s/%s: %d tasks created, %d updated, %d SKUs unchanged", scan["id"], scan["aisle"],
+                scan["shelf"], len(new_tasks), len(updates), diff["unchanged"])
+    return {**scan, "tasks": tasks}
+
+
+async def create_scan_indexes(db) -> None:
+    await db[SCANS_COLLECTION].create_index("id", unique=True)
+    await db[SCANS_COLLECTION].create_index([("store_id", 1), ("aisle", 1), ("shelf", 1), ("accepted", 1), ("created_at", -1)])
+    await db.tasks.create_index([("store_id", 1), ("gap_key", 1)], unique=True,
+                                partialFilterExpression={"gap_key": {"$exists": True}})
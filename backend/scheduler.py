@@ -0,0 +1,356 @@
+"""
+Background job scheduler for ShelfMind.
+
+Jobs run on the event loop of every worker, started from the app lifespan.
+Each job has an interval or cron trigger plus random jitter, so workers do
+not fire in lockstep. Three kinds of job are supported:
+
+- singleton jobs run only on the worker holding the leader lock in Mongo.
+  A leader that cannot renew its lease cancels its singleton runs well
+  before the lease expires, so they never overlap the next leader's;
+- per-store jobs run once per store. A worker only runs the stores it owns
+  (see `start`), and each store's run is claimed with a short lease in
+  Mongo, so each store runs once per period even while workers disagree
+  about ownership;
+- local jobs run on every worker.
+
+A job (or a store's run of it) never overlaps its previous run. CPU-heavy
+steps can be sent to the scheduler's process pool with `run_in_process`.
+Per-job timings are kept for the admin API.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from change_feed import change_feed
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_PROCESSES = int(os.getenv("SCHEDULER_PROCESSES", 2))
+SCHEDULER_STORE_CONCURRENCY = int(os.getenv("SCHEDULER_STORE_CONCURRENCY", 8))
+LEADER_LEASE_SECONDS = int(os.getenv("LEADER_LEASE_SECONDS", 30))
+
+LOCKS_COLLECTION = "job_locks"
+LEADER_LOCK = "scheduler-leader"
+
+
+class IntervalTrigger:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def next_after(self, now: datetime) -> datetime:
+        return now + timedelta(seconds=self.seconds)
+
+    def __str__(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+class CronTrigger:
+    """Five-field cron expression (minute hour day-of-month month day-of-week) in UTC.
+
+    Fields accept `*`, numbers, ranges (`1-5`), steps (`*/15`, `0-30/10`, `5/15` from 5 to the
+    field's maximum) and comma lists. Day of week runs 0-6 from Sunday; 7 is Sunday too. Names
+    (`MON`, `JAN`) and the `?`, `L`, `W` and `#` extensions are not supported and raise ValueError.
+    """
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            spec, slash, step = part.partition("/")
+            try:
+                if spec == "*":
+                    start, end = low, high
+                elif "-" in spec:
+                    start, end = (int(value) for value in spec.split("-", 1))
+                else:
+                    start = int(spec)
+                    end = high if slash else start
+                increment = int(step) if slash else 1
+            except ValueError:
+                raise ValueError(f"Unsupported cron field {field!r}") from None
+            if increment < 1:
+                raise ValueError(f"Cron field {field!r} needs a positive step")
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field {field!r} out of range {low}-{high}")
+            values.update(range(start, end + 1, increment))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        weekday = (dt.weekday() + 1) % 7  # cron counts from Sunday
+        day, dow = dt.day in self.days, weekday in self.weekdays
+        # Standard cron: when both are restricted, either may match
+        if self._any_day or self._any_weekday:
+            return day and dow
+        return day or dow
+
+    def next_after(self, now: datetime) -> datetime:
+        dt = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+    def __str__(self) -> str:
+        return f"cron {self.expression}"
+
+
+class JobStats:
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped_overlap = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.total_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, duration_ms: float, error: Optional[str]) -> None:
+        self.runs += 1
+        self.last_duration_ms = round(duration_ms, 1)
+        self.total_duration_ms += duration_ms
+        self.max_duration_ms = max(self.max_duration_ms, duration_ms)
+        if error is not None:
+            self.failures += 1
+            self.last_error = error
+
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Awaitable],
+        trigger,
+        jitter: float = 0.0,
+        mode: str = "local",  # local, singleton or per_store
+        timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.jitter = jitter
+        self.mode = mode
+        self.timeout = timeout
+        self.next_run_at: Optional[datetime] = None
+        self.running: Set[Optional[str]] = set()  # store ids (None for the whole job) with a run in progress
+        self.stats = JobStats()
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self.worker_id = change_feed.worker_id
+        self.is_leader = False
+        self._db = None
+        self._tasks: List[asyncio.Task] = []
+        self._runs: Set[asyncio.Task] = set()
+        self._singleton_runs: Set[asyncio.Task] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._store_ids: Optional[Callable[[], Awaitable[List[str]]]] = None
+        self._owns: Callable[[str], bool] = lambda store_id: True
+
+    def add_job(self, name: str, func: Callable[..., Awaitable], trigger, jitter: float = 0.0,
+                mode: str = "local", timeout: Optional[float] = None) -> Job:
+        """Register a job; per-store jobs are called as `func(store_id)`, others as `func()`."""
+        if mode not in ("local", "singleton", "per_store"):
+            raise ValueError(f"Unknown job mode {mode!r}")
+        job = self.jobs[name] = Job(name, func, trigger, jitter, mode, timeout)
+        return job
+
+    async def run_in_process(self, func: Callable, *args):
+        """Run a CPU-heavy, picklable function in the scheduler's process pool."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=SCHEDULER_PROCESSES)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    async def start(self, db, store_ids: Callable[[], Awaitable[List[str]]],
+                    owns: Optional[Callable[[str], bool]] = None) -> None:
+        """Start the job loops; per-store jobs run for the stores in `store_ids()` for which `owns` is true."""
+        if not SCHEDULER_ENABLED:
+            logger.info("Scheduler disabled")
+            return
+        self._db = db
+        self._store_ids = store_ids
+        if owns is not None:
+            self._owns = owns
+        self._tasks.append(asyncio.create_task(self._hold_leadership()))
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._job_loop(job)))
+        logger.info("Scheduler started with %d jobs", len(self.jobs))
+
+    async def stop(self) -> None:
+        for task in self._tasks + list(self._runs):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._runs, return_exceptions=True)
+        self._tasks.clear()
+        if self.is_leader and self._db is not None:
+            try:
+                await self._db[LOCKS_COLLECTION].delete_one({"_id": LEADER_LOCK, "owner": self.worker_id})
+            except PyMongoError:
+                pass
+        self.is_leader = False
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _claim(self, lock: str, seconds: float) -> bool:
+        """Take or renew a lease; False while another worker holds an unexpired one."""
+        now = datetime.utcnow()
+        try:
+            doc = await self._db[LOCKS_COLLECTION].find_one_and_update(
+                {"_id": lock, "$or": [{"owner": self.worker_id}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.worker_id, "expires_at": now + timedelta(seconds=seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return False  # the upsert lost to the current holder
+        return doc["owner"] == self.worker_id
+
+    async def _hold_leadership(self) -> None:
+        while True:
+            # A renewal that hangs counts as failed, so a lost lease is noticed while it is still ours
+            try:
+                leader = await asyncio.wait_for(self._claim(LEADER_LOCK, LEADER_LEASE_SECONDS), LEADER_LEASE_SECONDS / 3)
+            except (PyMongoError, asyncio.TimeoutError) as e:
+                logger.error(f"Leader lease check failed: {e!r}")
+                leader = False
+            if leader != self.is_leader:
+                logger.info("Worker %s %s scheduler leadership", self.worker_id, "took" if leader else "lost")
+            if not leader and self._singleton_runs:
+                # Stop before the lease expires and another worker starts the same jobs
+                logger.warning("Cancelling %d singleton job runs after losing leadership", len(self._singleton_runs))
+                for task in self._singleton_runs:
+                    task.cancel()
+            self.is_leader = leader
+            await asyncio.sleep(LEADER_LEASE_SECONDS / 3)
+
+    async def _job_loop(self, job: Job) -> None:
+        while True:
+            now = datetime.utcnow()
+            job.next_run_at = job.trigger.next_after(now) + timedelta(seconds=random.uniform(0, job.jitter))
+            await asyncio.sleep((job.next_run_at - now).total_seconds())
+            if job.mode == "singleton" and not self.is_leader:
+                continue
+            task = asyncio.create_task(self._fire(job))
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+            if job.mode == "singleton":
+                self._singleton_runs.add(task)
+                task.add_done_callback(self._singleton_runs.discard)
+
+    async def _fire(self, job: Job) -> None:
+        if job.mode != "per_store":
+            await self._run(job, None)
+            return
+        try:
+            store_ids = await self._store_ids()
+        except PyMongoError as e:
+            logger.error(f"Could not list stores for job {job.name}: {e}")
+            return
+        store_ids = [store_id for store_id in store_ids if self._owns(store_id)]
+        # A store's lease lasts most of a period, so each store runs once per period across workers
+        lease = max((job.trigger.next_after(datetime.utcnow()) - datetime.utcnow()).total_seconds() * 0.9, 1.0)
+        semaphore = asyncio.Semaphore(SCHEDULER_STORE_CONCURRENCY)
+
+        async def run_store(store_id: str) -> None:
+            async with semaphore:
+                try:
+                    if not await self._claim(f"job:{job.name}:{store_id}", lease):
+                        return
+                except PyMongoError as e:
+                    logger.error(f"Could not claim job {job.name} for {store_id}: {e}")
+                    return
+                await self._run(job, store_id)
+
+        await asyncio.gather(*(run_store(store_id) for store_id in store_ids))
+
+    async def _run(self, job: Job, store_id: Optional[str]) -> None:
+        if store_id in job.running:
+            job.stats.skipped_overlap += 1
+            logger.warning("Skipping job %s%s: previous run still in progress",
+                           job.name, f" for {store_id}" if store_id else "")
+            return
+        job.running.add(store_id)
+        job.stats.last_started_at = datetime.utcnow()
+        started = time.perf_counter()
+        error = None
+        try:
+            call = job.func(store_id) if store_id is not None else job.func()
+            await asyncio.wait_for(call, job.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"Job {job.name}{' for ' + store_id if store_id else ''} failed: {error}")
+        finally:
+            job.running.discard(store_id)
+        job.stats.record((time.perf_counter() - started) * 1000, error)
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "is_leader": self.is_leader,
+            "jobs": [
+                {
+                    "name": job.name,
+                    "trigger": str(job.trigger),
+                    "mode": job.mode,
+                    "next_run_at": job.next_run_at,
+                    "running": len(job.running),
+                    "runs": job.stats.runs,
+                    "failures": job.stats.failures,
+                    "skipped_overlap": job.stats.skipped_overlap,
+                    "last_started_at": job.stats.last_started_at,
+                    "last_duration_ms": job.stats.last_duration_ms,
+                    "avg_duration_ms": round(job.stats.total_duration_ms / job.stats.runs, 1) if job.stats.runs else None,
+                    "max_duration_ms": round(job.stats.max_duration_ms, 1),
+                    "last_error": job.stats.last_error,
+                }
+                for job in self.jobs.values()
+            ],
+        }
+
+
+# Process-wide scheduler
+scheduler = Scheduler()
+
+
+async def create_scheduler_indexes(db) -> None:
+    # Expired leases are removed by the TTL monitor
+    await db[LOCKS_COLLECTION].create_index("expires_at", expireAfterSeconds=0)
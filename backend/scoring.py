@@ -0,0 +1,35 @@
+"""
+Task urgency scoring, shared by task generation and the store simulator.
+
+Mirrors the rules the associate dashboard uses in generateTasksFromScan:
+stockout risk (up to 50 points), sales velocity (30 points at 15 units/hour)
+and revenue at stake (capped at 20 points).
+"""
+
+
+def urgency_score(current_stock: int, max_capacity: int, sales_velocity: float, revenue_impact: float) -> int:
+    """Urgency score of a replenishment task, roughly 0-100."""
+    stockout_risk = (max_capacity - current_stock) / max_capacity * 50 if max_capacity > 0 else 50
+    velocity_impact = sales_velocity / 15 * 30
+    revenue_weight = min(revenue_impact / 100 * 20, 20)
+    return round(stockout_risk + velocity_impact + revenue_weight)
+
+
+def task_priority(score: float, product_status: str = "low") -> str:
+    """Task priority: out-of-stock products and scores above 80 are high, above 50 medium."""
+    if product_status == "out" or score > 80:
+        return "high"
+    if score > 50:
+        return "medium"
+    return "low"
+
+
+def stock_status(current_stock: int, gap_detected: bool = True) -> str:
+    """Product status for a shelf count, as shown on the dashboards."""
+    if not gap_detected:
+        return "healthy"
+    if current_stock == 0:
+        return "out"
+    if current_stock < 3:
+        return "critical"
+    return "low"
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Discrete-event store simulator for benchmarking the replenishment pipeline.
+
+Generates seeded, reproducible sales, shelf scans, task creation and associate
+actions for any number of stores and SKUs. Events are processed in simulated
+time from a single heap. The simulator records end-to-end latency from stock
+depletion (a SKU dropping below its reorder point) to completion of the task
+that restocks it.
+
+Events can also be replayed against the backend: over HTTP (`--target http`)
+or in-process through the FastAPI app (`--target app`), in which case API call
+latency is reported as well.
+
+Usage:
+    python simulator.py --stores 300 --skus 30000 --hours 8 --sale-rate 120
+"""
+
+import argparse
+import contextlib
+import heapq
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scoring import urgency_score, task_priority, stock_status
+
+# Event kinds, in tie-break order for events at the same instant
+COMPLETE, SALE, SCAN, FLUSH = range(4)
+
+
+class SimulationConfig:
+    """Simulation parameters; all times are in minutes."""
+
+    def __init__(
+        self,
+        stores: int = 3,
+        skus: int = 2000,
+        associates: int = 4,
+        hours: float = 8.0,
+        sale_rate: float = 60.0,  # sales per store per minute
+        scan_interval: float = 15.0,  # minutes between aisle scans per store
+        aisles: int = 20,
+        reorder_fraction: float = 0.3,  # reorder point as a fraction of capacity
+        flush_interval: float = 5.0,  # minutes between stock-level batches sent to the target
+        seed: int = 42,
+    ):
+        self.stores = stores
+        self.skus = skus
+        self.associates = associates
+        self.hours = hours
+        self.sale_rate = sale_rate
+        self.scan_interval = scan_interval
+        self.aisles = aisles
+        self.reorder_fraction = reorder_fraction
+        self.flush_interval = flush_interval
+        self.seed = seed
+
+
+class NullTarget:
+    """Target that only simulates; measures the scheduling and scoring policy itself."""
+
+    calls: Dict[str, List[float]] = {}
+
+    def record_levels(self, store_id: str, readings: List[dict]) -> None:
+        pass
+
+    def create_task(self, store_id: str, task_id: str, task: dict) -> None:
+        pass
+
+    def start_task(self, store_id: str, task_id: str) -> None:
+        pass
+
+    def complete_task(self, store_id: str, task_id: str) -> None:
+        pass
+
+
+class ApiTarget(NullTarget):
+    """Replays simulated events against the ShelfMind API.
+
+    `session` is an `httpx.Client` for a running server, or a FastAPI
+    `TestClient`. Simulated tasks are created, started and completed through
+    the task API as the associate of their store.
+    """
+
+    def __init__(self, session, base_url: str = ""):
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.tokens: Dict[str, str] = {}
+        self.tasks: Dict[str, Tuple[str, int]] = {}  # simulated task id -> (API task id, version)
+        self.calls = {"levels": [], "create_task": [], "start_task": [], "complete_task": []}
+
+    def _headers(self, store_id: str) -> dict:
+        token = self.tokens.get(store_id)
+        if token is None:
+            token = self.tokens[store_id] = self._login(store_id)
+        return {"Authorization": f"Bearer {token}"}
+
+    def _login(self, store_id: str) -> str:
+        user = {
+            "email": f"sim-{store_id.lower()}@example.com",
+            "password": "simulator1",
+            "name": f"Simulator {store_id}",
+            "role": "associate",
+            "store_id": store_id,
+            "store_name": f"Simulated Store {store_id}",
+        }
+        response = self.session.post(f"{self.base_url}/api/auth/register", json=user)
+        if response.status_code != 201:
+            response = self.session.post(f"{self.base_url}/api/auth/login", json={
+                "email": user["email"], "password": user["password"], "role": user["role"]
+            })
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    def _timed(self, name: str, method, url: str, **kwargs):
+        start = time.perf_counter()
+        response = method(f"{self.base_url}{url}", **kwargs)
+        self.calls[name].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            print(f"[ERROR] {url} returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    def record_levels(self, store_id: str, readings: List[dict]) -> None:
+        for start in range(0, len(readings), 10000):
+            self._timed("levels", self.session.post, "/api/stock/levels",
+                        json={"readings": readings[start:start + 10000]}, headers=self._headers(store_id))
+
+    def create_task(self, store_id: str, task_id: str, task: dict) -> None:
+        response = self._timed("create_task", self.session.post, "/api/tasks", json=task,
+                               headers=self._headers(store_id))
+        if response.status_code < 400:
+            created = response.json()
+            self.tasks[task_id] = (created["id"], created["version"])
+
+    def _move(self, name: str, store_id: str, task_id: str, status: str) -> None:
+        if task_id not in self.tasks:
+            return  # its creation failed
+        api_id, version = self.tasks[task_id]
+        response = self._timed(name, self.session.patch, f"/api/tasks/{api_id}",
+                               json={"expected_version": version, "status": status}, headers=self._headers(store_id))
+        if response.status_code < 400:
+            self.tasks[task_id] = (api_id, response.json()["version"])
+
+    def start_task(self, store_id: str, task_id: str) -> None:
+        self._move("start_task", store_id, task_id, "in_progress")
+
+    def complete_task(self, store_id: str, task_id: str) -> None:
+        self._move("complete_task", store_id, task_id, "completed")
+        self.tasks.pop(task_id, None)
+
+
+class StoreSimulator:
+    """Seeded discrete-event simulation of sales, scans and restocking."""
+
+    def __init__(self, config: SimulationConfig, target: Optional[NullTarget] = None):
+        self.config = config
+        self.target = target or NullTarget()
+        self.rng = np.random.default_rng(config.seed)
+        cfg = config
+        n = cfg.stores * cfg.skus
+
+        # Per-SKU profile shared by all stores: skewed popularity, capacity and price
+        popularity = self.rng.pareto(1.5, cfg.skus) + 0.1
+        self.sku_weights = np.cumsum(popularity / popularity.sum())
+        self.velocity = popularity / popularity.sum() * cfg.sale_rate * 60  # units/hour per store
+        self.capacity = self.rng.integers(20, 60, cfg.skus)
+        self.price = np.round(self.rng.uniform(1.0, 20.0, cfg.skus), 2)
+        self.aisle_of = self.rng.integers(0, cfg.aisles, cfg.skus)
+        self.reorder_point = np.maximum((self.capacity * cfg.reorder_fraction).astype(np.int64), 1)
+
+        # Per store x SKU state, flattened as store * skus + sku
+        self.level = np.tile(self.capacity, cfg.stores).astype(np.int64)
+        self.depleted_at = np.full(n, np.nan)
+        self.empty_at = np.full(n, np.nan)
+        self.has_task = np.zeros(n, dtype=bool)
+        self.dirty: List[set] = [set() for _ in range(cfg.stores)]
+
+        # Task queues (max-heap on urgency) and idle associates per store
+        self.queues: List[list] = [[] for _ in range(cfg.stores)]
+        self.idle = [cfg.associates] * cfg.stores
+
+        self.events: list = []
+        self._seq = 0
+        self.latencies: List[float] = []
+        self.stockout_minutes = 0.0
+        self.counts = {"sales": 0, "lost_sales": 0, "scans": 0, "tasks_created": 0, "tasks_completed": 0}
+
+    def _push(self, at: float, kind: int, store: int, payload=None) -> None:
+        self._seq += 1
+        heapq.heappush(self.events, (at, kind, self._seq, store, payload))
+
+    @staticmethod
+    def store_id(store: int) -> str:
+        return f"SIM{store:04d}"
+
+    def run(self) -> dict:
+        cfg = self.config
+        horizon = cfg.hours * 60
+        for store in range(cfg.stores):
+            self._push(self.rng.exponential(1 / cfg.sale_rate), SALE, store)
+            self._push(self.rng.uniform(0, cfg.scan_interval), SCAN, store, 0)
+            self._push(cfg.flush_interval, FLUSH, store)
+
+        started = time.perf_counter()
+        processed = 0
+        while self.events and self.events[0][0] <= horizon:
+            at, kind, _, store, payload = heapq.heappop(self.events)
+            processed += 1
+            if kind == SALE:
+                self._sale(at, store)
+            elif kind == SCAN:
+                self._scan(at, store, payload)
+            elif kind == COMPLETE:
+                self._complete(at, store, payload)
+            else:
+                self._flush(at, store)
+        wall = time.perf_counter() - started
+
+        # SKUs still empty at the end count towards stockout time
+        self.stockout_minutes += float(np.nansum(horizon - self.empty_at))
+        return self._summary(processed, wall)
+
+    def _sale(self, at: float, store: int) -> None:
+        cfg = self.config
+        self._push(at + self.rng.exponential(1 / cfg.sale_rate), SALE, store)
+        sku = int(np.searchsorted(self.sku_weights, self.rng.random()))
+        sku = min(sku, cfg.skus - 1)
+        i = store * cfg.skus + sku
+        if self.level[i] == 0:
+            self.counts["lost_sales"] += 1
+            return
+        self.counts["sales"] += 1
+        self.level[i] -= 1
+        self.dirty[store].add(sku)
+        if self.level[i] < self.reorder_point[sku] and np.isnan(self.depleted_at[i]):
+            self.depleted_at[i] = at
+        if self.level[i] == 0:
+            self.empty_at[i] = at
+
+    def _scan(self, at: float, store: int, aisle: int) -> None:
+        """Scan one aisle and create tasks for SKUs below their reorder point."""
+        cfg = self.config
+        self._push(at + cfg.scan_interval, SCAN, store, (aisle + 1) % cfg.aisles)
+        self.counts["scans"] += 1
+
+        offset = store * cfg.skus
+        levels = self.level[offset:offset + cfg.skus]
+        needs = np.flatnonzero(
+            (self.aisle_of == aisle) & (levels < self.reorder_point) & ~self.has_task[offset:offset + cfg.skus]
+        )
+        for sku in needs:
+            self._create_task(at, store, int(sku))
+        self._dispatch(at, store)
+
+    def _create_task(self, at: float, store: int, sku: int) -> None:
+        cfg = self.config
+        i = store * cfg.skus + sku
+        level = int(self.level[i])
+        velocity = float(self.velocity[sku])
+        score = urgency_score(level, int(self.capacity[sku]), velocity, float(self.price[sku]) * velocity)
+        estimated = float(self.rng.uniform(5, 13))
+        task_id = f"task-{int(self.rng.integers(0, 2**63)):016x}"
+
+        self.has_task[i] = True
+        heapq.heappush(self.queues[store], (-score, at, task_id, sku, estimated))
+        self.counts["tasks_created"] += 1
+
+        status = stock_status(level)
+        self.target.create_task(self.store_id(store), task_id, {
+            "product": {
+                "id": f"{self.store_id(store)}-{sku}",
+                "name": f"Simulated Product {sku}",
+                "sku": f"SKU-{sku:06d}",
+                "current_stock": level,
+                "max_capacity": int(self.capacity[sku]),
+                "category": "General",
+                "aisle": f"A{self.aisle_of[sku] + 1}",
+                "shelf": "1",
+                "status": status,
+                "sales_velocity": round(velocity, 2),
+                "time_to_empty": round(level / velocity, 2) if velocity > 0 else 0,
+                "revenue_impact": round(float(self.price[sku]) * velocity, 2),
+            },
+            "type": "restock",
+            "priority": task_priority(score, status),
+            "estimated_time": round(estimated),
+            "urgency_score": score,
+        })
+
+    def _dispatch(self, at: float, store: int) -> None:
+        """Hand the most urgent queued tasks to idle associates."""
+        queue = self.queues[store]
+        while self.idle[store] and queue:
+            _, _, task_id, sku, estimated = heapq.heappop(queue)
+            self.idle[store] -= 1
+            self.target.start_task(self.store_id(store), task_id)
+            self._push(at + estimated, COMPLETE, store, (task_id, sku))
+
+    def _complete(self, at: float, store: int, payload) -> None:
+        task_id, sku = payload
+        cfg = self.config
+        i = store * cfg.skus + sku
+        if not np.isnan(self.empty_at[i]):
+            self.stockout_minutes += at - self.empty_at[i]
+        if not np.isnan(self.depleted_at[i]):
+            self.latencies.append(at - self.depleted_at[i])
+        self.level[i] = self.capacity[sku]
+        self.depleted_at[i] = np.nan
+        self.empty_at[i] = np.nan
+        self.has_task[i] = False
+        self.dirty[store].add(sku)
+        self.idle[store] += 1
+        self.counts["tasks_completed"] += 1
+        self.target.complete_task(self.store_id(store), task_id)
+        self._dispatch(at, store)
+
+    def _flush(self, at: float, store: int) -> None:
+        """Send changed stock levels of a store to the target as one batch."""
+        cfg = self.config
+        self._push(at + cfg.flush_interval, FLUSH, store)
+        if not self.dirty[store]:
+            return
+        offset = store * cfg.skus
+        readings = [{"sku": f"SKU-{sku:06d}", "level": int(self.level[offset + sku])} for sku in self.dirty[store]]
+        self.dirty[store] = set()
+        self.target.record_levels(self.store_id(store), readings)
+
+    def _summary(self, processed: int, wall: float) -> dict:
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        summary = {
+            "config": vars(self.config),
+            "events": processed,
+            "wall_seconds": round(wall, 3),
+            "events_per_second": round(processed / wall) if wall > 0 else None,
+            **self.counts,
+            "open_tasks": int(self.has_task.sum()),
+            "depletion_to_completion_minutes": {
+                "p50": round(float(np.percentile(latencies, 50)), 2),
+                "p95": round(float(np.percentile(latencies, 95)), 2),
+                "p99": round(float(np.percentile(latencies, 99)), 2),
+                "max": round(float(latencies.max()), 2),
+            },
+            "stockout_minutes": round(self.stockout_minutes, 1),
+        }
+        calls = {name: timings for name, timings in self.target.calls.items() if timings}
+        if calls:
+            summary["api_ms"] = {
+                name: {
+                    "count": len(timings),
+                    "p50": round(float(np.percentile(timings, 50)), 2),
+                    "p99": round(float(np.percentile(timings, 99)), 2),
+                }
+                for name, timings in calls.items()
+            }
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ShelfMind discrete-event store simulator")
+    parser.add_argument("--stores", type=int, default=3)
+    parser.add_argument("--skus", type=int, default=2000)
+    parser.add_argument("--associates", type=int, default=4, help="associates per store")
+    parser.add_argument("--hours", type=float, default=8.0, help="simulated hours")
+    parser.add_argument("--sale-rate", type=float, default=60.0, help="sales per store per minute")
+    parser.add_argument("--scan-interval", type=float, default=15.0, help="minutes between aisle scans")
+    parser.add_argument("--aisles", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--target", choices=["none", "http", "app"], default="none")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--max-p95", type=float, help="fail if p95 depletion-to-completion minutes exceeds this")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    config = SimulationConfig(
+        stores=args.stores, skus=args.skus, associates=args.associates, hours=args.hours,
+        sale_rate=args.sale_rate, scan_interval=args.scan_interval, aisles=args.aisles, seed=args.seed,
+    )
+
+    target = NullTarget()
+    with contextlib.ExitStack() as stack:
+        if args.target == "http":
+            import httpx
+            target = ApiTarget(stack.enter_context(httpx.Client(timeout=30.0)), args.base_url)
+        elif args.target == "app":
+            from fastapi.testclient import TestClient
+            from main import app
+            # Entering the client runs the app lifespan (database connection) for the whole simulation
+            target = ApiTarget(stack.enter_context(TestClient(app)))
+
+        summary = StoreSimulator(config, target).run()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        latency = summary["depletion_to_completion_minutes"]
+        print("ShelfMind Store Simulation")
+        print("=" * 50)
+        print(f"Stores: {config.stores}, SKUs/store: {config.skus:,}, associates/store: {config.associates}")
+        print(f"Simulated {config.hours} h: {summary['events']:,} events in {summary['wall_seconds']} s "
+              f"({summary['events_per_second']:,} events/s)")
+        print(f"Sales: {summary['sales']:,} (lost to empty shelves: {summary['lost_sales']:,})")
+        print(f"Tasks: {summary['tasks_created']:,} created, {summary['tasks_completed']:,} completed, "
+              f"{summary['open_tasks']:,} open")
+        print(f"Depletion to completion: p50 {latency['p50']} min, p95 {latency['p95']} min, "
+              f"p99 {latency['p99']} min")
+        for name, stats in summary.get("api_ms", {}).items():
+            print(f"API {name}: {stats['count']:,} calls, p50 {stats['p50']} ms, p99 {stats['p99']} ms")
+
+    if args.max_p95 is not None and summary["depletion_to_completion_minutes"]["p95"] > args.max_p95:
+        print(f"[ERROR] p95 depletion-to-completion exceeded {args.max_p95} minutes")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
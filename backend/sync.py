@@ -0,0 +1,144 @@
+"""
+Offline-first batched sync for associate devices.
+
+A device queues task mutations while offline, each with a client-generated
+idempotency key, and sends them in one request along with the highest change
+version it has seen. New mutations are applied in one bulk write. Every
+applied key gets a receipt, so retried batches are not applied twice. The
+response carries only the tasks changed since the device's version.
+
+Mutations follow the same rules as PATCH /api/tasks/{task_id} (see
+task_state): status changes must be legal moves of the state machine, and
+associates may not reassign tasks or change tasks assigned to someone else.
+Each task's write is conditional on the version read at the start of the
+sync, so a change made concurrently through the API is reported as a
+conflict rather than overwritten.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from conditional import delta_cursor
+from database import TaskDocument, causal_session, get_database, get_store_versions, reserve_store_versions
+from task_state import change_fields, change_filter, may_change
+from transitions import event_time, transition_log
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SYNC_RECEIPT_TTL_DAYS = int(os.getenv("SYNC_RECEIPT_TTL_DAYS", 7))
+SYNC_MAX_CHANGES = int(os.getenv("SYNC_MAX_CHANGES", 500))
+
+RECEIPTS_COLLECTION = "sync_receipts"
+MUTABLE_FIELDS = ("status", "priority", "assigned_to")
+
+
+async def apply_task_mutations(store_id: str, user: dict, mutations: List[dict]) -> List[dict]:
+    """Apply a batch of task mutations by `user` once each; returns a result per mutation."""
+    user_id = user["id"]
+    db = await get_database(store_id)
+    keys = [m["idempotency_key"] for m in mutations]
+    seen = {
+        doc["idempotency_key"]: doc
+        async for doc in db[RECEIPTS_COLLECTION].find({"store_id": store_id, "idempotency_key": {"$in": keys}})
+    }
+
+    task_ids = {m["task_id"] for m in mutations if m["idempotency_key"] not in seen}
+    tasks = {
+        doc["id"]: doc
+        async for doc in db.tasks.find({"store_id": store_id, "id": {"$in": list(task_ids)}},
+                                       {"id": 1, "status": 1, "version": 1, "assigned_to": 1, "started_at": 1,
+                                        "product.revenue_impact": 1})
+    }
+    states = dict(tasks)  # each task as it stands after the mutations folded so far
+
+    # Fold each task's new mutations, in order, into a single $set
+    results = []
+    updates: Dict[str, dict] = {}
+    pending: Dict[str, List[tuple]] = {}  # per task: (result, receipt, transition, change) applied if its write lands
+    now = datetime.utcnow()
+    for mutation in mutations:
+        key, task_id = mutation["idempotency_key"], mutation["task_id"]
+        if key in seen:
+            results.append({"idempotency_key": key, "task_id": task_id, "result": "duplicate"})
+            continue
+        if task_id not in states:
+            results.append({"idempotency_key": key, "task_id": task_id, "result": "not_found"})
+            continue
+        changes = {field: mutation[field] for field in MUTABLE_FIELDS if mutation.get(field) is not None}
+        transition = None
+        before = states[task_id]
+        if may_change(before, user, changes) is not None:
+            results.append({"idempotency_key": key, "task_id": task_id, "result": "rejected"})
+            continue
+        if "status" in changes and changes["status"] != before["status"]:
+            transition = (task_id, before["status"], changes["status"], mutation.get("occurred_at"))
+            changes = change_fields(user, changes, event_time(mutation.get("occurred_at")))
+        after = states[task_id] = {**before, **changes}
+        seen[key] = mutation
+        updates.setdefault(task_id, {}).update(changes)
+        result = {"idempotency_key": key, "task_id": task_id, "result": "applied"}
+        receipt = {"store_id": store_id, "idempotency_key": key, "task_id": task_id,
+                   "user_id": user_id, "created_at": now}
+        pending.setdefault(task_id, []).append((result, receipt, transition, (before, after, mutation.get("occurred_at"))))
+        results.append(result)
+
+    if updates:
+        async with reserve_store_versions(store_id, len(updates)) as version, causal_session(db) as session:
+            # Each write only lands if the task is unchanged since it was read above
+            operations = [
+                UpdateOne(
+                    {"store_id": store_id, "id": task_id, "version": tasks[task_id].get("version", 0),
+                     **change_filter(user)},
+                    {"$set": {**fields, "updated_at": now, "version": version - i}},
+                )
+                for i, (task_id, fields) in enumerate(updates.items())
+            ]
+            outcome = await db.tasks.bulk_write(operations, ordered=False, session=session)
+        landed = set(updates)
+        if outcome.matched_count < len(operations):
+            ours = {"$gt": version - len(updates), "$lte": version}
+            landed = {doc["id"] async for doc in db.tasks.find(
+                {"store_id": store_id, "id": {"$in": list(updates)}, "version": ours}, {"id": 1}
+            )}
+        receipts, transitions = [], []
+        for task_id, applied in pending.items():
+            for result, receipt, transition, (before, after, occurred_at) in applied:
+                if task_id not in landed:
+                    result["result"] = "conflict"
+                    continue
+                receipts.append(receipt)
+                if transition is not None:
+                    transitions.append(transition)
+                transition_log.count(store_id, before, after, user_id, occurred_at)
+        if receipts:
+            try:
+                await db[RECEIPTS_COLLECTION].insert_many(receipts, ordered=False)
+            except BulkWriteError as e:
+                # A concurrent retry of the same batch already recorded some keys
+                logger.info("Skipped %d duplicate sync receipts", len(e.details.get("writeErrors", [])))
+        for task_id, from_status, to_status, occurred_at in transitions:
+            await transition_log.record(store_id, task_id, from_status, to_status, user_id, occurred_at)
+    return results
+
+
+async def get_changes_since(store_id: str, last_version: int) -> dict:
+    """Tasks changed after `last_version`, oldest change first, up to SYNC_MAX_CHANGES."""
+    versions = await get_store_versions(store_id)
+    changes = await TaskDocument.get_task_changes(store_id, last_version, SYNC_MAX_CHANGES + 1)
+    has_more = len(changes) > SYNC_MAX_CHANGES
+    changes = changes[:SYNC_MAX_CHANGES]
+    version = delta_cursor(last_version, versions, changes[-1]["version"] if has_more else None)
+    return {"changes": changes, "version": version, "has_more": has_more}
+
+
+async def create_sync_indexes(db) -> None:
+    await db[RECEIPTS_COLLECTION].create_index([("store_id", 1), ("idempotency_key", 1)], unique=True)
+    await db[RECEIPTS_COLLECTION].create_index(
+        "created_at", expireAfterSeconds=int(timedelta(days=SYNC_RECEIPT_TTL_DAYS).total_seconds())
+    )
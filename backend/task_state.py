@@ -0,0 +1,123 @@
+"""
+Task status state machine with optimistic concurrency.
+
+A task's `version` (its store change version) changes on every write, so it
+doubles as an optimistic concurrency token. A change is one conditional
+find_one_and_update that matches the task only if it still has the version
+the client last saw, its status may legally move to the requested one, and,
+for associates, it is unassigned or assigned to them. There are no locks and
+no read before the write; only a failed write reads the task, to tell the
+client why it failed and what the task looks like now.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+
+from database import causal_session, get_database, reserve_store_versions
+from transitions import transition_log
+
+# Legal status moves; completed is final
+TRANSITIONS: Dict[str, Set[str]] = {
+    "pending": {"in_progress", "on_hold", "not_found"},
+    "in_progress": {"pending", "completed", "not_found", "on_hold"},
+    "on_hold": {"pending", "in_progress"},
+    "not_found": {"pending"},
+    "completed": set(),
+}
+
+
+def can_transition(from_status: str, to_status: str) -> bool:
+    return to_status in TRANSITIONS.get(from_status, set())
+
+
+def sources(to_status: str) -> List[str]:
+    """Statuses a task may move to `to_status` from."""
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def is_manager(user: dict) -> bool:
+    return user["role"] == "manager"
+
+
+def may_change(task: dict, user: dict, changes: dict) -> Optional[str]:
+    """Why `user` may not apply `changes` to `task` as it stands (transition or assignee), or None.
+
+    The in-memory form of change_filter, for callers that fold several changes before writing. Setting the
+    status a task already has is not a move, so it is allowed and implies nothing (see update_task).
+    """
+    status = changes.get("status")
+    if status is not None and status != task["status"] and not can_transition(task["status"], status):
+        return "transition"
+    if not is_manager(user) and ("assigned_to" in changes or task.get("assigned_to") not in (None, user["id"])):
+        return "assignee"
+    return None
+
+
+def change_filter(user: dict, status: Optional[str] = None) -> dict:
+    """Conditions a task must meet, besides its id and version, for `user` to move it to `status`."""
+    query = {}
+    if status is not None:
+        query["status"] = {"$in": sources(status)}
+    if not is_manager(user):
+        query["assigned_to"] = {"$in": [None, user["id"]]}  # associates only change their own or unassigned tasks
+    return query
+
+
+def change_fields(user: dict, changes: dict, at: datetime) -> dict:
+    """The fields to $set for `changes` made by `user` at `at`, including those implied by a status move."""
+    if changes.get("status") != "in_progress":
+        return dict(changes)
+    fields = {**changes, "started_at": at}  # completion time in the team counters runs from here
+    if not is_manager(user) and "assigned_to" not in changes:
+        fields["assigned_to"] = user["id"]  # an associate starting a task claims it
+    return fields
+
+
+class TaskConflict(Exception):
+    """The task was not changed; `task` is its current state and `reason` says why."""
+
+    def __init__(self, task: dict, reason: str, message: str):
+        super().__init__(message)
+        self.task = task
+        self.reason = reason  # version, transition or assignee
+
+
+async def update_task(store_id: str, task_id: str, user: dict, expected_version: int, changes: dict) -> Optional[dict]:
+    """Apply status, priority and assignee changes if the task is still at `expected_version`.
+
+    Returns the updated task, None when it does not exist, or raises TaskConflict.
+    """
+    db = await get_database(store_id)
+    requested = changes
+    status = changes.get("status")
+    query = {"store_id": store_id, "id": task_id, "version": expected_version, **change_filter(user, status)}
+    now = datetime.utcnow()
+    changes = change_fields(user, changes, now)
+    async with reserve_store_versions(store_id) as version, causal_session(db) as session:
+        before = await db.tasks.find_one_and_update(
+            query,
+            {"$set": {**changes, "updated_at": now, "version": version}},
+            return_document=ReturnDocument.BEFORE,
+            session=session,
+        )
+    if before is not None:
+        after = {**before, **changes, "updated_at": now, "version": version}
+        if status is not None:
+            await transition_log.record(store_id, task_id, before["status"], status, user["id"], now)
+        transition_log.count(store_id, before, after, user["id"], now)
+        return after
+
+    current = await db.tasks.find_one({"store_id": store_id, "id": task_id})
+    if current is None:
+        return None
+    if current.get("version", 0) != expected_version:
+        raise TaskConflict(current, "version", f"Task changed since version {expected_version}")
+    if status == current["status"] and may_change(current, user, requested) is None:
+        # Re-setting the current status is not a move, as in sync: apply only the other changes
+        others = {field: value for field, value in requested.items() if field != "status"}
+        return await update_task(store_id, task_id, user, expected_version, others) if others else current
+    if status is not None and status != current["status"] and not can_transition(current["status"], status):
+        raise TaskConflict(current, "transition", f"A {current['status']} task cannot become {status}")
+    raise TaskConflict(current, "assignee", f"Task is assigned to {current.get('assigned_to')}")
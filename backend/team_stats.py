@@ -0,0 +1,211 @@
+"""
+Per-associate task counters for the team leaderboard.
+
+The leaderboard is kept up to date as tasks change, rather than counted from
+the store's tasks on every dashboard load. Each task change becomes $inc
+deltas on two small documents per associate:
+- an hourly bucket (associate_counters): tasks completed, not found and put
+  on hold, completion time of completed tasks (from the task's `started_at`,
+  set when it moves to in_progress), and revenue protected, the hourly
+  revenue impact of each completed task's product;
+- a gauge (associate_active) of the tasks they have in progress.
+
+A change counts for the task's assignee, or for the user who made it when the
+task is unassigned. The gauge only follows assigned tasks, so the same
+associate is credited when their task later leaves in_progress.
+
+Deltas are buffered with the task transitions and written in the same flush
+(see TransitionLog). A leaderboard for a window sums the hourly buckets in
+it: O(associates x hours) small documents, however many tasks the store has.
+"""
+
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import UserDocument, causal_session, get_analytics_database
+from timeseries import to_utc_naive
+
+# Configuration
+TEAM_COUNTER_RETENTION_DAYS = int(os.getenv("TEAM_COUNTER_RETENTION_DAYS", 90))
+LEADERBOARD_DEFAULT_WINDOW = timedelta(hours=24)
+LEADERBOARD_MAX_WINDOW = timedelta(days=31)
+
+COUNTERS_COLLECTION = "associate_counters"
+ACTIVE_COLLECTION = "associate_active"
+COUNTED_STATUSES = ("completed", "not_found", "on_hold")
+
+
+def hour_bucket(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def leaderboard_window(start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """Whole hours covering [start, end); end defaults to now, start to LEADERBOARD_DEFAULT_WINDOW before it."""
+    end = to_utc_naive(end) if end is not None else datetime.utcnow()
+    end = hour_bucket(end) + timedelta(hours=1) if end != hour_bucket(end) else end
+    start = hour_bucket(to_utc_naive(start) if start is not None else end - LEADERBOARD_DEFAULT_WINDOW)
+    if start >= end:
+        raise ValueError("start must be before end")
+    if end - start > LEADERBOARD_MAX_WINDOW:
+        raise ValueError(f"The window is limited to {LEADERBOARD_MAX_WINDOW.days} days")
+    return start, end
+
+
+def _active_owner(task: dict) -> Optional[str]:
+    return task.get("assigned_to") if task.get("status") == "in_progress" else None
+
+
+class TeamCounters:
+    """Counter deltas not yet written: hourly buckets and in-progress gauges."""
+
+    def __init__(self):
+        self.buckets: Dict[Tuple[str, str, datetime], Counter] = {}  # (store, user, hour)
+        self.active: Counter = Counter()  # (store, user)
+
+    def add(self, store_id: str, before: dict, after: dict, user_id: Optional[str], at: datetime) -> None:
+        """Count one change of a task; `before` and `after` are its documents around the change."""
+        old_owner, new_owner = _active_owner(before), _active_owner(after)
+        if old_owner != new_owner:
+            if old_owner is not None:
+                self.active[(store_id, old_owner)] -= 1
+            if new_owner is not None:
+                self.active[(store_id, new_owner)] += 1
+
+        status = after.get("status")
+        if status == before.get("status") or status not in COUNTED_STATUSES:
+            return
+        key = (store_id, after.get("assigned_to") or user_id or "unknown", hour_bucket(at))
+        bucket = self.buckets.setdefault(key, Counter())
+        bucket[status] += 1
+        if status == "completed":
+            bucket["revenue_protected"] += (after.get("product") or {}).get("revenue_impact") or 0.0
+            started_at = before.get("started_at")
+            if started_at is not None:
+                bucket["timed"] += 1
+                bucket["completion_seconds"] += max((at - started_at).total_seconds(), 0.0)
+
+    def update(self, other: "TeamCounters") -> None:
+        """Fold another set of deltas into this one."""
+        for key, counts in other.buckets.items():
+            self.buckets.setdefault(key, Counter()).update(counts)
+        self.active.update(other.active)
+
+    def stores(self) -> Set[str]:
+        return {key[0] for key in self.buckets} | {key[0] for key, delta in self.active.items() if delta}
+
+    async def write(self, db, store_ids: Set[str], session=None) -> None:
+        """Apply the deltas of `store_ids` to db's counters, removing each one once it is written.
+
+        After a failed write, the deltas it did not apply are still here to retry.
+        """
+        buckets = [key for key in self.buckets if key[0] in store_ids]
+        await _apply(db[COUNTERS_COLLECTION], self.buckets, buckets, [
+            UpdateOne({"store_id": store_id, "user_id": user_id, "hour": hour},
+                      {"$inc": dict(self.buckets[(store_id, user_id, hour)])}, upsert=True)
+            for store_id, user_id, hour in buckets
+        ], session)
+        gauges = [key for key, delta in self.active.items() if delta and key[0] in store_ids]
+        await _apply(db[ACTIVE_COLLECTION], self.active, gauges, [
+            UpdateOne({"store_id": store_id, "user_id": user_id}, {"$inc": {"active": self.active[(store_id, user_id)]}},
+                      upsert=True)
+            for store_id, user_id in gauges
+        ], session)
+
+
+async def _apply(collection, deltas: dict, keys: list, operations: List[UpdateOne], session) -> None:
+    """Run one operation per key of `deltas` and remove the keys whose operation was applied."""
+    if not operations:
+        return
+    try:
+        await collection.bulk_write(operations, ordered=False, session=session)
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        for i, key in enumerate(keys):
+            if i not in failed:
+                del deltas[key]
+        raise
+    for key in keys:
+        del deltas[key]
+
+
+async def get_leaderboard(store_id: str, start: datetime, end: datetime) -> List[dict]:
+    """Per-associate totals over the hours in [start, end), best first, plus current in-progress counts.
+
+    Counter deltas still buffered in this worker are not included; flush the transition log first.
+    """
+    db = await get_analytics_database(store_id)
+    pipeline = [
+        {"$match": {"store_id": store_id, "hour": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": "$user_id",
+            **{field: {"$sum": f"${field}"} for field in
+               (*COUNTED_STATUSES, "timed", "completion_seconds", "revenue_protected")},
+        }},
+    ]
+    async with causal_session(db) as session:
+        totals = {row["_id"]: row async for row in db[COUNTERS_COLLECTION].aggregate(pipeline, session=session)}
+        active = {
+            doc["user_id"]: doc["active"]
+            async for doc in db[ACTIVE_COLLECTION].find({"store_id": store_id, "active": {"$gt": 0}}, session=session)
+        }
+    users = {user["id"]: user for user in await UserDocument.get_users_by_store(store_id)}
+    user_ids = set(totals) | set(active) | {user_id for user_id, user in users.items() if user.get("role") == "associate"}
+
+    leaderboard = []
+    for user_id in user_ids:
+        row = totals.get(user_id, {})
+        timed = row.get("timed", 0)
+        leaderboard.append({
+            "user_id": user_id,
+            "name": users.get(user_id, {}).get("name"),
+            "completed": row.get("completed", 0),
+            "active": active.get(user_id, 0),
+            "not_found": row.get("not_found", 0),
+            "on_hold": row.get("on_hold", 0),
+            "avg_completion_minutes": round(row["completion_seconds"] / timed / 60, 1) if timed else None,
+            "revenue_protected": round(row.get("revenue_protected", 0.0), 2),
+        })
+    leaderboard.sort(key=lambda entry: (-entry["completed"], -entry["revenue_protected"], entry["user_id"]))
+    return leaderboard
+
+
+async def reconcile_active_counts(db) -> int:
+    """Reset db's in-progress gauges to a count of the tasks; returns the associates counted.
+
+    Repairs drift from tasks that were in progress before the counters existed or were changed
+    outside the task APIs.
+    """
+    counts = {
+        (row["_id"]["store_id"], row["_id"]["user_id"]): row["active"]
+        async for row in db.tasks.aggregate([
+            {"$match": {"status": "in_progress", "assigned_to": {"$ne": None}}},
+            {"$group": {"_id": {"store_id": "$store_id", "user_id": "$assigned_to"}, "active": {"$sum": 1}}},
+        ])
+    }
+    operations = [
+        UpdateOne({"store_id": doc["store_id"], "user_id": doc["user_id"]}, {"$set": {"active": 0}})
+        async for doc in db[ACTIVE_COLLECTION].find({"active": {"$ne": 0}})
+        if (doc["store_id"], doc["user_id"]) not in counts
+    ]
+    operations += [
+        UpdateOne({"store_id": store_id, "user_id": user_id}, {"$set": {"active": active}}, upsert=True)
+        for (store_id, user_id), active in counts.items()
+    ]
+    if operations:
+        await db[ACTIVE_COLLECTION].bulk_write(operations, ordered=False)
+    return len(counts)
+
+
+async def create_team_stats_indexes(db) -> None:
+    await db[COUNTERS_COLLECTION].create_index(
+        [("store_id", ASCENDING), ("hour", ASCENDING), ("user_id", ASCENDING)], unique=True
+    )
+    await db[COUNTERS_COLLECTION].create_index(
+        "hour", expireAfterSeconds=int(timedelta(days=TEAM_COUNTER_RETENTION_DAYS).total_seconds())
+    )
+    await db[ACTIVE_COLLECTION].create_index([("store_id", ASCENDING), ("user_id", ASCENDING)], unique=True)
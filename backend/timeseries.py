@@ -0,0 +1,487 @@
+"""
+Per-SKU stock-level time series for ShelfMind.
+
+Raw readings are buffered in memory and written in batches. Every flush also
+folds the batch into 1-minute, 1-hour and 1-day rollup buckets, so history
+queries and trend classification never have to scan raw points. Readings a
+flush could not write go back into the buffer; each remembers whether it was
+stored and which rollups it was folded into, so a retry neither stores nor
+counts it twice.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure, PyMongoError
+
+from database import get_analytics_database, get_database, group_by_database
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+STOCK_BATCH_SIZE = int(os.getenv("STOCK_BATCH_SIZE", 500))
+STOCK_FLUSH_INTERVAL = float(os.getenv("STOCK_FLUSH_INTERVAL", 2.0))  # seconds
+STOCK_RAW_RETENTION_DAYS = int(os.getenv("STOCK_RAW_RETENTION_DAYS", 7))
+# Days of fine-grained rollups to keep; daily rollups are kept forever
+ROLLUP_RETENTION_DAYS = {
+    "1m": int(os.getenv("STOCK_MINUTE_RETENTION_DAYS", 30)),
+    "1h": int(os.getenv("STOCK_HOUR_RETENTION_DAYS", 400)),
+}
+
+RAW_COLLECTION = "stock_levels"
+LATEST_COLLECTION = "stock_latest"
+DUPLICATE_KEY = 11000
+
+# Rollup resolutions, finest first: name -> bucket width in seconds
+RESOLUTIONS: Dict[str, int] = {"1m": 60, "1h": 3600, "1d": 86400}
+ROLLUP_COLLECTIONS = {name: f"stock_rollups_{name}" for name in RESOLUTIONS}
+
+# Range queries pick the coarsest resolution that still yields this many buckets
+MIN_HISTORY_POINTS = 24
+
+# Trend classification: relative slope (fraction of mean level per hour)
+TREND_LOOKBACK_HOURS = 6
+TREND_THRESHOLD = 0.05
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_utc_naive(ts: datetime) -> datetime:
+    """Normalize timestamps to naive UTC, matching datetime.utcnow() elsewhere."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def bucket_start(ts: datetime, width: int) -> datetime:
+    """Floor a timestamp to the start of its rollup bucket."""
+    seconds = int((ts - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % width)
+
+
+def choose_resolution(start: datetime, end: datetime, min_points: int = MIN_HISTORY_POINTS) -> str:
+    """Return the coarsest resolution giving at least `min_points` buckets, or 'raw'."""
+    span = (end - start).total_seconds()
+    for name, width in sorted(RESOLUTIONS.items(), key=lambda item: -item[1]):
+        if span / width >= min_points:
+            return name
+    return "raw"
+
+
+async def create_stock_collections(db) -> None:
+    """Create the raw time-series collection and rollup indexes."""
+    try:
+        await db.create_collection(
+            RAW_COLLECTION,
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"},
+            expireAfterSeconds=STOCK_RAW_RETENTION_DAYS * 86400,
+        )
+        logger.info("Created time-series collection %s", RAW_COLLECTION)
+    except CollectionInvalid:
+        pass  # already exists
+    except OperationFailure as e:
+        # Older or restricted mongod: fall back to a plain bucketed collection
+        logger.warning(f"Time-series collections unavailable, using plain collection: {e}")
+        await db[RAW_COLLECTION].create_index([("meta.store_id", 1), ("meta.sku", 1), ("ts", 1)])
+        await db[RAW_COLLECTION].create_index("ts", expireAfterSeconds=STOCK_RAW_RETENTION_DAYS * 86400)
+
+    for collection in ROLLUP_COLLECTIONS.values():
+        await db[collection].create_index([("store_id", 1), ("sku", 1), ("bucket", 1)], unique=True)
+    for name in ROLLUP_RETENTION_DAYS:
+        await db[ROLLUP_COLLECTIONS[name]].create_index("bucket")  # retention sweeps
+    await db[LATEST_COLLECTION].create_index([("store_id", 1), ("sku", 1)], unique=True)
+
+
+async def sweep_rollups(db) -> Dict[str, int]:
+    """Delete rollup buckets older than their resolution's retention; returns deletions per resolution."""
+    deleted = {}
+    now = datetime.utcnow()
+    for name, days in ROLLUP_RETENTION_DAYS.items():
+        result = await db[ROLLUP_COLLECTIONS[name]].delete_many({"bucket": {"$lt": now - timedelta(days=days)}})
+        deleted[name] = result.deleted_count
+    return deleted
+
+
+def _fold_batch(points: List[dict], latest: Dict[Tuple[str, str], int]) -> Dict[str, Dict[tuple, dict]]:
+    """Aggregate sorted points into per-resolution bucket deltas.
+
+    `latest` maps (store_id, sku) to the last known level and is advanced in
+    place, so increases across batch boundaries are still seen as restocks.
+    A point is left out of the resolutions listed in its `folded` set, and
+    each bucket lists its points under "points".
+    """
+    rollups: Dict[str, Dict[tuple, dict]] = {name: {} for name in RESOLUTIONS}
+    for point in points:
+        key = (point["store_id"], point["sku"])
+        level, ts = point["level"], point["ts"]
+        previous = latest.get(key)
+        delta = 0 if previous is None else level - previous
+        latest[key] = level
+        if delta > 0:
+            point["restocked"] = True
+
+        for name, width in RESOLUTIONS.items():
+            if name in point.get("folded", ()):
+                continue
+            bucket_key = key + (bucket_start(ts, width),)
+            agg = rollups[name].get(bucket_key)
+            if agg is None:
+                agg = rollups[name][bucket_key] = {
+                    "count": 0, "sum": 0, "min": level, "max": level,
+                    "first": {"ts": ts, "level": level},
+                    "restock_units": 0, "depleted_units": 0, "last_restock": None, "points": [],
+                }
+            agg["points"].append(point)
+            agg["count"] += 1
+            agg["sum"] += level
+            agg["min"] = min(agg["min"], level)
+            agg["max"] = max(agg["max"], level)
+            agg["last"] = {"ts": ts, "level": level}
+            if delta > 0:
+                agg["restock_units"] += delta
+                agg["last_restock"] = ts
+            elif delta < 0:
+                agg["depleted_units"] -= delta
+    return rollups
+
+
+def _rollup_update(store_id: str, sku: str, bucket: datetime, agg: dict) -> UpdateOne:
+    update = {
+        "$inc": {
+            "count": agg["count"],
+            "sum": agg["sum"],
+            "restock_units": agg["restock_units"],
+            "depleted_units": agg["depleted_units"],
+        },
+        # Embedded documents compare field by field, so ts decides first/last
+        "$min": {"min": agg["min"], "first": agg["first"]},
+        "$max": {"max": agg["max"], "last": agg["last"]},
+    }
+    if agg["last_restock"] is not None:
+        update["$max"]["last_restock"] = agg["last_restock"]
+    return UpdateOne({"store_id": store_id, "sku": sku, "bucket": bucket}, update, upsert=True)
+
+
+class StockSeriesWriter:
+    """Buffers stock readings and writes them, with rollups, in batches."""
+
+    def __init__(self, batch_size: int = STOCK_BATCH_SIZE, flush_interval: float = STOCK_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[dict] = []
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start the periodic flush loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write anything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Stock series flush failed: {e}")
+
+    async def add(self, store_id: str, readings: List[dict]) -> int:
+        """Buffer readings of the form {"sku", "level", "timestamp"}."""
+        now = datetime.utcnow()
+        for reading in readings:
+            self._buffer.append({
+                "_id": ObjectId(),
+                "store_id": store_id,
+                "sku": reading["sku"],
+                "level": int(reading["level"]),
+                "ts": to_utc_naive(reading.get("timestamp") or now),
+            })
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+        return len(readings)
+
+    async def flush(self) -> int:
+        """Write buffered readings and fold them into every rollup."""
+        async with self._lock:
+            if not self._buffer:
+                return 0
+            points, self._buffer = self._buffer, []
+            if await get_database() is None:
+                self._buffer = points + self._buffer
+                return 0
+
+            points.sort(key=lambda p: p["ts"])
+            unwritten: List[dict] = []
+            for db, shard_points in await group_by_database(points, lambda p: p["store_id"]):
+                try:
+                    await _write_points(db, shard_points)
+                except PyMongoError as e:
+                    # Retried on the next flush; the points record what was already stored and folded
+                    logger.error(f"Writing {len(shard_points)} stock readings failed, will retry: {e}")
+                    unwritten += shard_points
+            self._buffer = unwritten + self._buffer
+            return len(points) - len(unwritten)
+
+
+async def _write_points(db, points: List[dict]) -> None:
+    """Insert time-ordered readings and fold them into the rollups of one database.
+
+    Marks each point `stored` once inserted and adds a resolution to its `folded`
+    set once its bucket there is updated, so a retry after a failure skips both.
+    """
+    await _insert_points(db[RAW_COLLECTION], [p for p in points if not p.get("stored")])
+
+    keys = {(p["store_id"], p["sku"]) for p in points}
+    latest = await _load_latest(db, keys)
+    rollups = _fold_batch(points, latest)
+    for name, buckets in rollups.items():
+        await _apply_rollups(db[ROLLUP_COLLECTIONS[name]], name, buckets)
+    last: Dict[Tuple[str, str], dict] = {}
+    restocked: Dict[Tuple[str, str], datetime] = {}
+    for p in points:  # time-ordered, so the last point of each SKU wins
+        last[(p["store_id"], p["sku"])] = p
+        if p.get("restocked"):
+            restocked[(p["store_id"], p["sku"])] = p["ts"]
+    await db[LATEST_COLLECTION].bulk_write(
+        [_latest_update(store_id, sku, p["level"], p["ts"], restocked.get((store_id, sku)))
+         for (store_id, sku), p in last.items()],
+        ordered=False,
+    )
+
+
+async def _insert_points(collection, points: List[dict]) -> None:
+    """Insert raw readings with their own _id, marking each one stored; duplicates count as stored."""
+    if not points:
+        return
+    failed: set = set()
+    try:
+        await collection.insert_many(
+            [{"_id": p["_id"], "ts": p["ts"], "meta": {"store_id": p["store_id"], "sku": p["sku"]}, "level": p["level"]}
+             for p in points],
+            ordered=False,
+        )
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY}
+        if failed:
+            for i, p in enumerate(points):
+                p["stored"] = i not in failed
+            raise
+    for p in points:
+        p["stored"] = True
+
+
+async def _apply_rollups(collection, name: str, buckets: Dict[tuple, dict]) -> None:
+    """Apply one resolution's bucket deltas, adding `name` to the `folded` set of each applied bucket's points."""
+    if not buckets:
+        return
+    aggs = list(buckets.values())
+    try:
+        await collection.bulk_write(
+            [_rollup_update(store_id, sku, bucket, agg) for (store_id, sku, bucket), agg in buckets.items()],
+            ordered=False,
+        )
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        _mark_folded([agg for i, agg in enumerate(aggs) if i not in failed], name)
+        raise
+    _mark_folded(aggs, name)
+
+
+def _mark_folded(aggs: List[dict], name: str) -> None:
+    for agg in aggs:
+        for point in agg["points"]:
+            point.setdefault("folded", set()).add(name)
+
+
+async def _load_latest(db, keys) -> Dict[Tuple[str, str], int]:
+    """Fetch the last known level for every (store_id, sku) in one query."""
+    if not keys:
+        return {}
+    query = {"$or": [{"store_id": store_id, "sku": sku} for store_id, sku in keys]}
+    cursor = db[LATEST_COLLECTION].find(query, {"store_id": 1, "sku": 1, "level": 1})
+    return {(doc["store_id"], doc["sku"]): doc["level"] async for doc in cursor}
+
+
+def _latest_update(store_id: str, sku: str, level: int, ts: datetime, last_restock: Optional[datetime]) -> UpdateOne:
+    """Set the latest level unless a newer reading is already stored; a late batch must not roll it back."""
+    newer = {"$gte": [ts, {"$ifNull": ["$ts", ts]}]}
+    update = {
+        "level": {"$cond": [newer, level, "$level"]},
+        "ts": {"$cond": [newer, ts, "$ts"]},
+    }
+    if last_restock is not None:
+        update["last_restocked"] = {"$max": ["$last_restocked", last_restock]}
+    return UpdateOne({"store_id": store_id, "sku": sku}, [{"$set": update}], upsert=True)
+
+
+# Process-wide writer, started and stopped from the app lifespan
+stock_writer = StockSeriesWriter()
+
+
+def _rollup_point(doc: dict) -> dict:
+    return {
+        "timestamp": doc["bucket"],
+        "count": doc["count"],
+        "mean": doc["sum"] / doc["count"] if doc["count"] else 0.0,
+        "min": doc["min"],
+        "max": doc["max"],
+        "last": doc["last"]["level"],
+    }
+
+
+async def get_history(
+    store_id: str,
+    sku: str,
+    start: datetime,
+    end: datetime,
+    resolution: Optional[str] = None,
+) -> Tuple[str, List[dict]]:
+    """Return (resolution, points) for a SKU, read from the coarsest fitting rollup."""
+    db = await get_analytics_database(store_id)
+    start, end = to_utc_naive(start), to_utc_naive(end)
+    resolution = resolution or choose_resolution(start, end)
+
+    if resolution == "raw":
+        cursor = db[RAW_COLLECTION].find(
+            {"meta.store_id": store_id, "meta.sku": sku, "ts": {"$gte": start, "$lt": end}}
+        ).sort("ts", 1)
+        points = [
+            {"timestamp": doc["ts"], "count": 1, "mean": float(doc["level"]),
+             "min": doc["level"], "max": doc["level"], "last": doc["level"]}
+            async for doc in cursor
+        ]
+        return resolution, points
+
+    width = RESOLUTIONS[resolution]
+    cursor = db[ROLLUP_COLLECTIONS[resolution]].find(
+        {"store_id": store_id, "sku": sku, "bucket": {"$gte": bucket_start(start, width), "$lt": end}}
+    ).sort("bucket", 1)
+    return resolution, [_rollup_point(doc) async for doc in cursor]
+
+
+def classify_trend(buckets: List[dict], threshold: float = TREND_THRESHOLD) -> Tuple[str, float]:
+    """Classify rollup buckets as 'up', 'down' or 'stable' from a least-squares slope.
+
+    Returns the trend and the slope in units per hour.
+    """
+    if len(buckets) < 2:
+        return "stable", 0.0
+    t0 = buckets[0]["bucket"]
+    xs = [(b["bucket"] - t0).total_seconds() / 3600 for b in buckets]
+    ys = [b["sum"] / b["count"] for b in buckets]
+    n = len(xs)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return "stable", 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+
+    relative = slope / mean_y if mean_y else slope
+    if relative > threshold:
+        return "up", slope
+    if relative < -threshold:
+        return "down", slope
+    return "stable", slope
+
+
+async def get_trend(store_id: str, sku: str, lookback_hours: int = TREND_LOOKBACK_HOURS) -> dict:
+    """Trend, sales velocity and last restock time for a SKU, computed from rollups."""
+    db = await get_analytics_database(store_id)
+    now = datetime.utcnow()
+    since = now - timedelta(hours=lookback_hours)
+
+    # Hourly buckets give a stable slope; fall back to minutes for young series
+    buckets = []
+    for resolution in ("1h", "1m"):
+        cursor = db[ROLLUP_COLLECTIONS[resolution]].find(
+            {"store_id": store_id, "sku": sku, "bucket": {"$gte": bucket_start(since, RESOLUTIONS[resolution])}}
+        ).sort("bucket", 1)
+        buckets = await cursor.to_list(length=None)
+        if len(buckets) >= 3:
+            break
+
+    trend, slope = classify_trend(buckets)
+    depleted = sum(b.get("depleted_units", 0) for b in buckets)
+    span_hours = 0.0
+    if buckets:
+        span_hours = max((buckets[-1]["last"]["ts"] - buckets[0]["first"]["ts"]).total_seconds() / 3600, 0.0)
+
+    latest = await db[LATEST_COLLECTION].find_one({"store_id": store_id, "sku": sku})
+    return {
+        "sku": sku,
+        "trend": trend,
+        "slope_per_hour": slope,
+        "velocity": depleted / span_hours if span_hours > 0 else 0.0,
+        "current_level": latest["level"] if latest else None,
+        "last_restocked": latest.get("last_restocked") if latest else None,
+    }
+
+
+async def get_store_velocities(store_id: str, lookback_hours: int = TREND_LOOKBACK_HOURS) -> Dict[str, float]:
+    """Sales velocity (units/hour) of every SKU in a store, from hourly rollups in one aggregation."""
+    db = await get_analytics_database(store_id)
+    since = bucket_start(datetime.utcnow() - timedelta(hours=lookback_hours), RESOLUTIONS["1h"])
+    pipeline = [
+        {"$match": {"store_id": store_id, "bucket": {"$gte": since}}},
+        {"$group": {
+            "_id": "$sku",
+            "depleted": {"$sum": "$depleted_units"},
+            "first": {"$min": "$first.ts"},
+            "last": {"$max": "$last.ts"},
+        }},
+    ]
+    velocities = {}
+    async for row in db[ROLLUP_COLLECTIONS["1h"]].aggregate(pipeline):
+        span_hours = (row["last"] - row["first"]).total_seconds() / 3600
+        velocities[row["_id"]] = row["depleted"] / span_hours if span_hours > 0 else 0.0
+    return velocities
+
+
+async def get_store_levels(store_id: str) -> Dict[str, dict]:
+    """Latest level document of every SKU in a store, keyed by SKU."""
+    db = await get_analytics_database(store_id)
+    cursor = db[LATEST_COLLECTION].find({"store_id": store_id}, {"_id": 0})
+    return {doc["sku"]: doc async for doc in cursor}
+
+
+async def get_latest_level(store_id: str, sku: str) -> Optional[dict]:
+    """Latest level document of one SKU."""
+    db = await get_analytics_database(store_id)
+    return await db[LATEST_COLLECTION].find_one({"store_id": store_id, "sku": sku}, {"_id": 0})
+
+
+async def get_store_velocity_stats(store_id: str, lookback_hours: int = 24) -> Dict[str, Tuple[float, float]]:
+    """Mean and standard deviation of hourly units sold for every SKU in a store."""
+    db = await get_analytics_database(store_id)
+    since = bucket_start(datetime.utcnow() - timedelta(hours=lookback_hours), RESOLUTIONS["1h"])
+    pipeline = [
+        {"$match": {"store_id": store_id, "bucket": {"$gte": since}}},
+        {"$group": {
+            "_id": "$sku",
+            "hours": {"$sum": 1},
+            "depleted": {"$sum": "$depleted_units"},
+            "depleted_sq": {"$sum": {"$multiply": ["$depleted_units", "$depleted_units"]}},
+        }},
+    ]
+    stats = {}
+    async for row in db[ROLLUP_COLLECTIONS["1h"]].aggregate(pipeline):
+        mean = row["depleted"] / row["hours"]
+        variance = max(row["depleted_sq"] / row["hours"] - mean * mean, 0.0)
+        stats[row["_id"]] = (mean, variance ** 0.5)
+    return stats
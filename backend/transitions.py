@@ -0,0 +1,333 @@
+"""
+Append-only log of task status transitions.
+
+Every status change (including creation as `pending`) is appended as a
+compact record: {k: task id, s: store id, f: from status, t: to status,
+u: user id, ts: time}, with statuses stored as small integer codes. Records
+are buffered and inserted in batches into one collection per month
+(task_transitions_YYYYMM), so a month of history can be dropped without
+touching the rest.
+
+Replaying a store's records in time order rebuilds the current status of its
+tasks and per-associate timings: time from creation to pick-up, time from
+pick-up to completion, and completed / not-found / on-hold counts.
+
+The same flush writes the per-associate leaderboard counters (team_stats)
+buffered alongside the records. Whatever a failed flush did not write stays
+buffered for the next one. Records get their _id when buffered, so a record
+whose insert was applied but not acknowledged is not stored twice.
+
+A nightly compaction job folds months older than TRANSITION_RAW_RETENTION_DAYS
+into a per-store snapshot of the replay state and drops their collection.
+Snapshots keep open tasks only; closed tasks live on in the associate totals.
+Replay starts from the snapshot and reads only the months after it.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from database import causal_session, fan_out, get_analytics_database, get_database, group_by_database
+from team_stats import TeamCounters
+from timeseries import DUPLICATE_KEY, to_utc_naive
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+TRANSITION_BATCH_SIZE = int(os.getenv("TRANSITION_BATCH_SIZE", 200))
+TRANSITION_FLUSH_INTERVAL = float(os.getenv("TRANSITION_FLUSH_INTERVAL", 1.0))  # seconds
+TRANSITION_RAW_RETENTION_DAYS = int(os.getenv("TRANSITION_RAW_RETENTION_DAYS", 35))
+MAX_DEVICE_DELAY = timedelta(days=1)  # device-reported transition times are clamped to this window
+
+PARTITION_PREFIX = "task_transitions_"
+SNAPSHOTS_COLLECTION = "task_replay_snapshots"
+
+STATUSES = ["pending", "in_progress", "completed", "not_found", "on_hold"]
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+PENDING, IN_PROGRESS, COMPLETED, NOT_FOUND, ON_HOLD = range(len(STATUSES))
+CLOSED = {COMPLETED, NOT_FOUND}
+
+
+def event_time(at: Optional[datetime] = None) -> datetime:
+    """When a change happened: `at` (e.g. a device's offline timestamp) clamped to the last day, else now."""
+    now = datetime.utcnow()
+    return now if at is None else min(max(to_utc_naive(at), now - MAX_DEVICE_DELAY), now)
+
+
+def partition_name(ts: datetime) -> str:
+    return f"{PARTITION_PREFIX}{ts:%Y%m}"
+
+
+def partition_end(name: str) -> datetime:
+    """First instant after the month held by a partition."""
+    start = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m")
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+class TaskReplay:
+    """Task states and per-associate timings rebuilt from transition records."""
+
+    def __init__(self, snapshot: Optional[dict] = None):
+        snapshot = snapshot or {}
+        self.through: Optional[datetime] = snapshot.get("through")
+        self.tasks: Dict[str, dict] = snapshot.get("tasks", {})
+        self.associates: Dict[str, dict] = snapshot.get("associates", {})
+
+    def _associate(self, user_id: Optional[str]) -> dict:
+        return self.associates.setdefault(user_id or "unknown", {
+            "picked_up": 0, "pickup_seconds": 0.0,
+            "worked": 0, "work_seconds": 0.0,
+            "completed": 0, "not_found": 0, "on_hold": 0,
+        })
+
+    def apply(self, record: dict) -> None:
+        to, ts = record["t"], record["ts"]
+        task = self.tasks.get(record["k"])
+        if task is None:
+            task = self.tasks[record["k"]] = {"status": record["f"], "since": ts}
+            if to == PENDING and record["f"] is None:
+                task["created_at"] = ts
+
+        if to == IN_PROGRESS:
+            associate = self._associate(record["u"])
+            if task.get("created_at") is not None and task["status"] == PENDING:
+                associate["picked_up"] += 1
+                associate["pickup_seconds"] += (ts - task["created_at"]).total_seconds()
+            task["started_at"] = ts
+            task["worker"] = record["u"]
+        elif to in CLOSED or to == ON_HOLD:
+            associate = self._associate(record["u"])
+            associate[STATUSES[to]] += 1
+            if to in CLOSED and task.get("started_at") is not None:
+                associate["worked"] += 1
+                associate["work_seconds"] += (ts - task["started_at"]).total_seconds()
+            task.pop("started_at", None)
+        task["status"] = to
+        task["since"] = ts
+
+    def snapshot(self, through: datetime) -> dict:
+        """Replay state to persist; closed tasks are dropped, their timings are already in the totals."""
+        return {
+            "through": through,
+            "tasks": {task_id: task for task_id, task in self.tasks.items() if task["status"] not in CLOSED},
+            "associates": self.associates,
+        }
+
+    def task_statuses(self) -> Dict[str, str]:
+        return {task_id: STATUSES[task["status"]] for task_id, task in self.tasks.items() if task["status"] is not None}
+
+    def timings(self) -> List[dict]:
+        def minutes(total: float, n: int) -> Optional[float]:
+            return round(total / n / 60, 1) if n else None
+
+        return [
+            {
+                "user_id": user_id,
+                "completed": a["completed"],
+                "not_found": a["not_found"],
+                "on_hold": a["on_hold"],
+                "avg_pickup_minutes": minutes(a["pickup_seconds"], a["picked_up"]),
+                "avg_work_minutes": minutes(a["work_seconds"], a["worked"]),
+            }
+            for user_id, a in sorted(self.associates.items())
+        ]
+
+
+class TransitionLog:
+    """Buffers transition records and appends them to the monthly collections in batches, with the team counters."""
+
+    def __init__(self, batch_size: int = TRANSITION_BATCH_SIZE, flush_interval: float = TRANSITION_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[dict] = []
+        self._counters = TeamCounters()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._indexed: Set[Tuple[str, str]] = set()  # (database, partition)
+
+    async def start(self) -> None:
+        """Start the periodic flush loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write anything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Task transition flush failed: {e}")
+
+    async def record(self, store_id: str, task_id: str, from_status: Optional[str], to_status: str,
+                     user_id: Optional[str] = None, at: Optional[datetime] = None) -> None:
+        """Append a transition; `at` (e.g. a device's offline timestamp) is clamped to the last day."""
+        ts = event_time(at)
+        self._buffer.append({
+            "_id": ObjectId(),  # set here so a retried insert of the record is recognized as a duplicate
+            "k": task_id,
+            "s": store_id,
+            "f": None if from_status is None else STATUS_CODES[from_status],
+            "t": STATUS_CODES[to_status],
+            "u": user_id,
+            "ts": ts,
+        })
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    def count(self, store_id: str, before: dict, after: dict, user_id: Optional[str] = None,
+              at: Optional[datetime] = None) -> None:
+        """Update the team counters for a task change, from its documents before and after it."""
+        self._counters.add(store_id, before, after, user_id, event_time(at))
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._buffer and not self._counters.stores():
+                return 0
+            records, self._buffer = self._buffer, []
+            counters, self._counters = self._counters, TeamCounters()
+            if await get_database() is None:
+                self._buffer = records + self._buffer
+                counters.update(self._counters)
+                self._counters = counters
+                return 0
+            stores = sorted({record["s"] for record in records} | counters.stores())
+            unwritten: List[dict] = []
+            for db, shard_stores in await group_by_database(stores, lambda store_id: store_id):
+                shard_stores = set(shard_stores)
+                partitions: Dict[str, List[dict]] = {}
+                for record in records:
+                    if record["s"] in shard_stores:
+                        partitions.setdefault(partition_name(record["ts"]), []).append(record)
+                try:
+                    async with causal_session(db) as session:
+                        for name, batch in list(partitions.items()):
+                            if (db.name, name) not in self._indexed:
+                                await db[name].create_index([("s", ASCENDING), ("ts", ASCENDING)])
+                                await db[name].create_index([("k", ASCENDING), ("ts", ASCENDING)])
+                                self._indexed.add((db.name, name))
+                            await _insert_records(db[name], batch, session)
+                            del partitions[name]
+                        await counters.write(db, shard_stores, session)
+                except PyMongoError as e:
+                    # Keep what was not acknowledged for the next flush; written records and counters are gone
+                    # from `partitions` and `counters`, so the retry does not count them twice
+                    logger.error(f"Writing task transitions of {sorted(shard_stores)} failed, will retry: {e}")
+                    unwritten += [record for batch in partitions.values() for record in batch]
+            self._buffer = unwritten + self._buffer
+            counters.update(self._counters)
+            self._counters = counters
+            return len(records) - len(unwritten)
+
+
+async def _insert_records(collection, batch: List[dict], session) -> None:
+    """Insert transition records, leaving in `batch` only those that failed; already stored ones count as written."""
+    try:
+        await collection.insert_many(batch, ordered=False, session=session)
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY}
+        batch[:] = [record for i, record in enumerate(batch) if i in failed]
+        if batch:
+            raise
+
+
+# Process-wide transition log
+transition_log = TransitionLog()
+
+
+async def _partitions(db, session=None) -> List[str]:
+    names = await db.list_collection_names(filter={"name": {"$regex": f"^{PARTITION_PREFIX}"}}, session=session)
+    return sorted(names)
+
+
+async def _replay_partition(db, name: str, store_id: str, replay: TaskReplay, since: Optional[datetime],
+                            session=None) -> None:
+    query = {"s": store_id}
+    if since is not None:
+        query["ts"] = {"$gte": since}
+    cursor = db[name].find(query, {"_id": 0, "s": 0}, session=session).sort([("ts", ASCENDING), ("_id", ASCENDING)])
+    async for record in cursor:
+        replay.apply(record)
+
+
+async def replay_store(store_id: str) -> TaskReplay:
+    """Rebuild a store's task states and associate timings from its snapshot and the months after it.
+
+    Reads may go to a secondary; the causal session makes them include every transition logged so far.
+    """
+    db = await get_analytics_database(store_id)
+    await transition_log.flush()
+    async with causal_session(db) as session:
+        replay = TaskReplay(await db[SNAPSHOTS_COLLECTION].find_one({"store_id": store_id}, session=session))
+        for name in await _partitions(db, session):
+            if replay.through is None or partition_end(name) > replay.through:
+                await _replay_partition(db, name, store_id, replay, replay.through, session)
+    return replay
+
+
+async def get_task_transitions(store_id: str, task_id: str) -> List[dict]:
+    """Logged transitions of one task still in the raw log, oldest first."""
+    db = await get_analytics_database(store_id)
+    await transition_log.flush()
+    transitions = []
+    async with causal_session(db) as session:
+        for name in await _partitions(db, session):
+            cursor = db[name].find({"k": task_id, "s": store_id}, session=session)
+            cursor = cursor.sort([("ts", ASCENDING), ("_id", ASCENDING)])
+            transitions.extend([
+                {
+                    "from_status": None if record["f"] is None else STATUSES[record["f"]],
+                    "to_status": STATUSES[record["t"]],
+                    "user_id": record["u"],
+                    "timestamp": record["ts"],
+                }
+                async for record in cursor
+            ])
+    return transitions
+
+
+async def compact_transitions(now: Optional[datetime] = None) -> int:
+    """Fold months past the raw retention into per-store snapshots and drop them; returns months compacted."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=TRANSITION_RAW_RETENTION_DAYS)
+    return sum(await fan_out(lambda db: _compact_database(db, cutoff)))
+
+
+async def _compact_database(db, cutoff: datetime) -> int:
+    compacted = 0
+    for name in await _partitions(db):
+        through = partition_end(name)
+        if through > cutoff:
+            break
+        for store_id in await db[name].distinct("s"):
+            snapshot = await db[SNAPSHOTS_COLLECTION].find_one({"store_id": store_id})
+            replay = TaskReplay(snapshot)
+            if replay.through is not None and replay.through >= through:
+                continue  # this month was folded in by an earlier, interrupted run
+            await _replay_partition(db, name, store_id, replay, replay.through)
+            await db[SNAPSHOTS_COLLECTION].replace_one(
+                {"store_id": store_id}, {"store_id": store_id, **replay.snapshot(through)}, upsert=True
+            )
+        await db.drop_collection(name)
+        compacted += 1
+        logger.info("Compacted task transitions of %s in %s", name[len(PARTITION_PREFIX):], db.name)
+    return compacted
+
+
+async def create_transition_indexes(db) -> None:
+    await db[SNAPSHOTS_COLLECTION].create_index("store_id", unique=True)